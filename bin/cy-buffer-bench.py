@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark per-transfer overhead of CySPI/CyI2C buffer handling.
+
+Runs transfers against a stub library which just loops back data,
+so only Python-side cost is measured. Compares allocating cffi
+buffers on every transfer (as done previously) against pooled
+buffers and the zero-copy send_into/read_into API, and cost of
+transfer tracing when enabled.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from cffi import FFI
+
+from ucdev.cy7c65211.header import src as cdef_src
+from ucdev.cy7c65211 import CyUSBSerialDevice, CySPI, CyI2C
+from ucdev.cy7c65211.device import load_api
+from ucdev.trace import Tracer
+
+import logging
+log = logging.getLogger(__name__)
+
+class CountingFFI(FFI):
+    nr_new = 0
+
+    def new(self, *args, **kwargs):
+        self.nr_new += 1
+        return FFI.new(self, *args, **kwargs)
+
+class StubAPI(object):
+    def __init__(self, ffi):
+        self.ffi = ffi
+
+        # take enum constants from header
+        const = ffi.dlopen(None)
+        for k in ('CY_SUCCESS', 'CY_SPI_MOTOROLA', 'CY_SPI_TI', 'CY_SPI_NS'):
+            setattr(self, k, getattr(const, k))
+
+    def CyOpen(self, devno, ifnum, handle):
+        handle[0] = self.ffi.cast("CY_HANDLE", 1)
+        return self.CY_SUCCESS
+
+    def CyClose(self, handle):
+        return self.CY_SUCCESS
+
+    def CySpiReadWrite(self, handle, rcdb, wcdb, timeout):
+        self.ffi.memmove(rcdb.buffer, wcdb.buffer, wcdb.length)
+        rcdb.transferCount = wcdb.length
+        return self.CY_SUCCESS
+
+    def CyI2cRead(self, handle, cfg, rcdb, timeout):
+        rcdb.transferCount = rcdb.length
+        return self.CY_SUCCESS
+
+    def CyI2cWrite(self, handle, cfg, wcdb, timeout):
+        wcdb.transferCount = wcdb.length
+        return self.CY_SUCCESS
+
+class StubLib(object):
+    def __init__(self):
+        self.ffi = CountingFFI()
+        self.ffi.cdef(cdef_src)
+        self.api = StubAPI(self.ffi)
+        self.funcs, self.errors = load_api(self.ffi, self.api)
+
+# transfer code as used before buffer pooling
+def legacy_send(spi, data, timeout=1000):
+    dev = spi.dev
+    ffi = dev.lib.ffi
+
+    wlen = len(data)
+    wbuf = ffi.new("UCHAR[%d]" % wlen, bytes(data))
+    wcdb = ffi.new("CY_DATA_BUFFER *", (wbuf, wlen, 0))
+
+    rlen = len(data)
+    rbuf = ffi.new("UCHAR[%d]" % rlen)
+    rcdb = ffi.new("CY_DATA_BUFFER *", (rbuf, rlen, 0))
+
+    log.debug("w:" + " ".join(["{:08b}".format(i) for i in wbuf]))
+    rc = dev.CySpiReadWrite(rcdb, wcdb, timeout)
+    log.debug("r:" + " ".join(["{:08b}".format(i) for i in rbuf]))
+    return bytearray(ffi.buffer(rcdb.buffer, rcdb.transferCount)[0:])
+
+def legacy_read(i2c, cfg, data, timeout=1000):
+    dev = i2c.dev
+    ffi = dev.lib.ffi
+
+    rlen = len(data)
+    rbuf = ffi.new("UCHAR[%d]" % rlen)
+    rcdb = ffi.new("CY_DATA_BUFFER *", (rbuf, rlen, 0))
+
+    rc = dev.CyI2cRead(cfg, rcdb, timeout)
+    log.debug("r:" + " ".join(["{:08b}".format(i) for i in rbuf]))
+    return bytearray(ffi.buffer(rcdb.buffer, rcdb.transferCount)[0:])
+
+def run(ctx, lib, name, func):
+    nr = ctx.opt.number
+    lib.ffi.nr_new = 0
+    t0 = time.time()
+    for i in range(nr):
+        func()
+    dt = time.time() - t0
+    print("{0:24s} {1:10.3f} {2:10.2f}".format(
+        name, dt / nr * 1e6, float(lib.ffi.nr_new) / nr))
+
+def main(ctx):
+    lib = StubLib()
+    dev = CyUSBSerialDevice(lib, 0, 0)
+    spi = CySPI(dev)
+    i2c = CyI2C(dev)
+    cfg = i2c.prepare(slaveAddress=0x68)
+
+    data = bytearray(b"X" * ctx.opt.size)
+    out = bytearray(ctx.opt.size)
+
+    print("{0:24s} {1:>10s} {2:>10s}".format("", "usec/xfer", "new/xfer"))
+    run(ctx, lib, "spi: legacy send",  lambda: legacy_send(spi, data))
+    run(ctx, lib, "spi: send",         lambda: spi.send(data))
+    run(ctx, lib, "spi: send_into",    lambda: spi.send_into(data, out))
+    run(ctx, lib, "spi: send_into(view)", lambda: spi.send_into(data))
+    run(ctx, lib, "i2c: legacy read",  lambda: legacy_read(i2c, cfg, data))
+    run(ctx, lib, "i2c: read",         lambda: i2c.read(cfg, data))
+    run(ctx, lib, "i2c: read_into",    lambda: i2c.read_into(cfg, out))
+    run(ctx, lib, "i2c: write",        lambda: i2c.write(cfg, data))
+
+    dev.trace = Tracer()
+    run(ctx, lib, "spi: send (traced)", lambda: spi.send(data))
+    run(ctx, lib, "i2c: read (traced)", lambda: i2c.read(cfg, data))
+    if ctx.opt.output:
+        dev.trace.dump(ctx.opt.output)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=100000)
+    ap.add_argument('-s', '--size', type=int, default=33)
+    ap.add_argument('-o', '--output', default=None)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark per-call overhead of CyUSBSerialDevice API dispatch.
+
+Builds a stub libcyusbserial shared library with a C compiler, loads
+it through CyUSBSerial, and compares calling API functions:
+
+- directly on the library (lower bound)
+- through lazily generated wrappers (as done previously)
+- through the precompiled dispatch table
+- through the raw fast path (dev.raw)
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from argparse import ArgumentParser
+
+from ucdev.cy7c65211 import CyUSBSerial, CyUSBSerialDevice
+
+import logging
+log = logging.getLogger(__name__)
+
+STUB_SRC = r"""
+typedef void *CY_HANDLE;
+typedef struct { unsigned char *buffer; unsigned int length; unsigned int transferCount; } CY_DATA_BUFFER;
+static int dummy;
+
+int CyLibraryInit(void) { return 0; }
+int CyLibraryExit(void) { return 0; }
+int CyGetListofDevices(unsigned char *nr) { *nr = 1; return 0; }
+int CyGetDeviceInfo(unsigned char devno, void *info) { return 0; }
+int CyOpen(unsigned char devno, unsigned char ifnum, CY_HANDLE *handle) { *handle = &dummy; return 0; }
+int CyClose(CY_HANDLE handle) { return 0; }
+int CySetGpioValue(CY_HANDLE handle, unsigned char pin, unsigned char val) { return 0; }
+int CyGetGpioValue(CY_HANDLE handle, unsigned char pin, unsigned char *val) { *val = 1; return 0; }
+int CySpiReadWrite(CY_HANDLE handle, CY_DATA_BUFFER *r, CY_DATA_BUFFER *w, unsigned int timeout) {
+    unsigned int i;
+    for (i = 0; i < w->length && i < r->length; i++) r->buffer[i] = w->buffer[i];
+    r->transferCount = i;
+    return 0;
+}
+"""
+
+def build_stub(tmpdir):
+    src = os.path.join(tmpdir, "stub.c")
+    lib = os.path.join(tmpdir, "libcyusbserial-stub.so")
+    with open(src, "w") as f:
+        f.write(STUB_SRC)
+    cc = os.getenv("CC") or "cc"
+    subprocess.check_call([cc, "-shared", "-fPIC", "-O2", "-o", lib, src])
+    return lib
+
+# wrapper as generated by CyUSBSerialDevice.__getattr__ previously
+def legacy_wrap(dev, name):
+    api = dev.lib.api
+    func = getattr(api, name)
+    def wrapper(*args, **kwargs):
+        if not dev.dev:
+            dev.open()
+        rc = func(dev.dev, *args, **kwargs)
+        if dev.raise_on_error and rc != api.CY_SUCCESS:
+            for k, v in vars(api).items():
+                if k.startswith("CY_ERROR") and v == rc:
+                    break
+            raise Exception("ERROR: {0}={1}".format(name, rc))
+        elif name in ('CyCyclePort', 'CyResetDevice'):
+            dev.dev = None
+        return rc
+    return wrapper
+
+def run(ctx, name, func, *args):
+    nr = ctx.opt.number
+    t0 = time.time()
+    for i in range(nr):
+        func(*args)
+    dt = time.time() - t0
+    print("{0:24s} {1:10.3f}".format(name, dt / nr * 1e6))
+
+def main(ctx):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        lib = CyUSBSerial(lib=build_stub(tmpdir))
+        dev = CyUSBSerialDevice(lib, 0, 0)
+        ffi, api = lib.ffi, lib.api
+
+        dev.open()
+        val = ffi.new("UINT8 *")
+        buf = ffi.new("UCHAR[]", 33)
+        wcdb = ffi.new("CY_DATA_BUFFER *", (buf, 33, 0))
+        rcdb = ffi.new("CY_DATA_BUFFER *", (buf, 33, 0))
+
+        print("{0:24s} {1:>10s}".format("", "usec/call"))
+        for name, args in (("CyGetGpioValue", (0, val)),
+                           ("CySpiReadWrite", (rcdb, wcdb, 1000))):
+            print("--- " + name)
+            run(ctx, "direct", getattr(api, name), dev.dev, *args)
+            run(ctx, "legacy wrapper", legacy_wrap(dev, name), *args)
+            run(ctx, "dispatch table", getattr(dev, name), *args)
+            run(ctx, "raw", getattr(dev.raw, name), *args)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=200000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
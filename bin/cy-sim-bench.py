@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark throughput and latency of CySPI/CyI2C on simulated bridge.
+
+Runs transfers of various sizes through the full driver stack against
+ucdev.cy7c65211.sim, and reports virtual time (as modeled for USB and
+serial bus, deterministic) and wall time (Python-side overhead) per
+transfer, and resulting virtual throughput.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+from ucdev.cy7c65211 import CyUSBSerial, CySPI, CyI2C
+from ucdev.cy7c65211.sim import CySim, USBModel, LoopbackSPI, I2CRegisterSlave
+
+import logging
+log = logging.getLogger(__name__)
+
+def run(ctx, sim, name, func, size):
+    nr = ctx.opt.number
+    v0, t0 = sim.clock.now, time.time()
+    for i in range(nr):
+        func()
+    vt, dt = (sim.clock.now - v0) / nr, (time.time() - t0) / nr
+    print("{0:16s} {1:6d} {2:12.3f} {3:12.3f} {4:12.1f}".format(
+        name, size, vt * 1e3, dt * 1e6, size / vt / 1e3))
+
+def main(ctx):
+    sim = CySim(usb=USBModel(latency=ctx.opt.latency, bandwidth=ctx.opt.bandwidth))
+    sdev = sim.add_device()
+    sdev.spi = LoopbackSPI()
+    sdev.attach_i2c(0x68, I2CRegisterSlave())
+
+    dev = next(CyUSBSerial(lib=sim).find())
+    spi = CySPI(dev)
+    i2c = CyI2C(dev)
+    cfg = i2c.prepare(0x68)
+
+    print("{0:16s} {1:>6s} {2:>12s} {3:>12s} {4:>12s}".format(
+        "", "size", "virt[ms]", "wall[us]", "virt[KB/s]"))
+    for size in ctx.opt.args or [1, 8, 32, 64, 256, 1024]:
+        size = int(size)
+        data = bytearray(size)
+        out = bytearray(size)
+        run(ctx, sim, "spi: send_into", lambda: spi.send_into(data, out), size)
+        run(ctx, sim, "i2c: read_into", lambda: i2c.read_into(cfg, out), size)
+        run(ctx, sim, "i2c: write+read", lambda: (i2c.write(cfg, b"\x00"),
+                                                  i2c.read_into(cfg, out)), size)
+        run(ctx, sim, "i2c: transfer", lambda: i2c.transfer(cfg, b"\x00", out), size)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=1000)
+    ap.add_argument('-l', '--latency', type=float, default=1e-3)
+    ap.add_argument('-b', '--bandwidth', type=float, default=1.0e6)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark startup time of ucdev.cy7c65211 in fresh processes.
+
+Compares time-to-first-transfer with the header parsed at runtime
+(cdef) and with the prebuilt out-of-line cffi module (prebuilt).
+Prebuilt module is generated at install time, or by running
+
+  python ucdev/cy7c65211/build.py
+
+from the top of the source tree.
+
+One SPI transfer is done on the first device found, through
+simulated backend (ucdev.cy7c65211.sim), or through library given by
+-L on real hardware. Time of simulated backend includes import of the
+simulator itself, which is the same for both.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import subprocess
+
+from argparse import ArgumentParser
+
+import logging
+log = logging.getLogger(__name__)
+
+CHILD = """
+import time
+t0 = time.time()
+from ucdev.cy7c65211 import CyUSBSerial, CySPI, device
+if {mode!r} == 'cdef':
+    from cffi import FFI
+    ffi = FFI()
+else:
+    ffi = None
+if {lib!r}:
+    lib = CyUSBSerial(lib={lib!r}, ffi=ffi)
+else:
+    from ucdev.cy7c65211.sim import CySim
+    sim = CySim()
+    sim.add_device()
+    lib = CyUSBSerial(lib=sim, ffi=ffi)
+dev = next(lib.find())
+CySPI(dev).send(b"\\xff")
+print(time.time() - t0)
+"""
+
+def main(ctx):
+    try:
+        from ucdev.cy7c65211 import _cyusbserial
+    except ImportError:
+        log.warning("prebuilt module not found, 'prebuilt' falls back to cdef")
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+
+    print("{0:10s} {1:>12s} {2:>12s}".format("", "first[ms]", "process[ms]"))
+    for mode in ('cdef', 'prebuilt'):
+        src = CHILD.format(mode=mode, lib=ctx.opt.lib)
+        t_first, t_proc = [], []
+        for i in range(ctx.opt.number):
+            t0 = time.time()
+            ret = subprocess.check_output([sys.executable, "-c", src], env=env)
+            t_proc.append(time.time() - t0)
+            t_first.append(float(ret.strip().splitlines()[-1]))
+        print("{0:10s} {1:12.2f} {2:12.2f}".format(
+            mode, min(t_first) * 1e3, min(t_proc) * 1e3))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-L', '--lib', default=None)
+    ap.add_argument('-n', '--number', type=int, default=10)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
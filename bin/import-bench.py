@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Import-time regression benchmark for ucdev driver modules.
+
+Imports given modules (default: ucdev.nrf24) in fresh processes, and
+reports cumulative import time of each. With Python 3.7 or later,
+numbers are taken from "python -X importtime" output, which also
+gives per-module breakdown shown with -v. Otherwise, wall time of
+import statement in child process is used.
+
+Exits with non-zero status if any module exceeds the budget (-b, in
+msec), so this can be used as a startup-time regression check:
+
+  $ python bin/import-bench.py -b 30 ucdev.nrf24 ucdev.mpu6050
+
+Child processes are run with bytecode writing enabled, and first run
+of each module is discarded, so compile time is not counted.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import subprocess
+
+from argparse import ArgumentParser
+
+import logging
+log = logging.getLogger(__name__)
+
+CHILD = """
+import time
+t0 = time.time()
+import {mod}
+print(time.time() - t0)
+"""
+
+def has_importtime():
+    return sys.version_info >= (3, 7)
+
+def run_child(ctx, mod):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    cmd = [sys.executable]
+    if has_importtime():
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD.format(mod=mod)]
+
+    proc = subprocess.Popen(cmd, env=env, universal_newlines=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    if proc.returncode:
+        raise Exception("ERROR: failed to import {0}:\n{1}".format(mod, err))
+
+    # returns total time and {module: (self, cumulative)} in usec
+    stat = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        t_self, t_cum, name = line[12:].split("|")
+        try:
+            stat[name.strip()] = (int(t_self), int(t_cum))
+        except ValueError:
+            pass
+    if mod in stat:
+        return stat[mod][1], stat
+    return int(float(out.strip().splitlines()[-1]) * 1e6), stat
+
+def main(ctx):
+    ret = 0
+    mods = ctx.opt.args or ['ucdev.nrf24']
+
+    print("{0:24s} {1:>10s} {2:>10s}".format("", "import[ms]", "budget[ms]"))
+    for mod in mods:
+        run_child(ctx, mod)
+
+        # take best of runs to filter out noise
+        best = None
+        for i in range(ctx.opt.number):
+            t, stat = run_child(ctx, mod)
+            if best is None or t < best[0]:
+                best = (t, stat)
+
+        t, stat = best
+        mark = ""
+        if t > ctx.opt.budget * 1e3:
+            mark = " OVER"
+            ret = 1
+        print("{0:24s} {1:10.2f} {2:10.2f}{3}".format(
+            mod, t / 1e3, ctx.opt.budget, mark))
+
+        if ctx.opt.verbose or mark:
+            top = sorted(stat.items(), key=lambda kv: -kv[1][0])
+            for name, (t_self, t_cum) in top[:ctx.opt.top]:
+                print("  {0:22s} {1:10.2f} {2:10.2f}".format(
+                    name, t_self / 1e3, t_cum / 1e3))
+
+    if ret:
+        log.error("import time exceeded budget of {0}[ms]".format(ctx.opt.budget))
+    return ret
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-b', '--budget', type=float, default=30.0)
+    ap.add_argument('-n', '--number', type=int, default=5)
+    ap.add_argument('-t', '--top', type=int, default=10)
+    ap.add_argument('-v', '--verbose', action='store_true')
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    sys.exit(main(ctx))
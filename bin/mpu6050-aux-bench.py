@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark reading 9-axis (MPU-6050 + HMC5883L) sample over simulated
+CY7C6521x bridge.
+
+Reads -n samples from MPU-6050 model (ucdev.mpu6050sim), with HMC5883L
+model below, in two ways:
+
+- separate: HMC5883L on bridge bus, read by HMC5883.read_from() after
+  MPU6050.read_sample()
+- aux: HMC5883L on auxiliary bus of MPU-6050, read by its I2C master
+  on each sample (see hmc5883.attach_mpu6050()), and returned with
+  sensor data by single MPU6050.read_sample()
+
+Reports I2C transactions on bridge (counted by ucdev.trace, where
+each register read is a write and a read), virtual time (USB link
+model, -l latency) per sample, and samples per second in virtual
+time. Then streams -t seconds through FIFO with magnetometer data in
+frames, and checks its sequence for gaps.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from argparse import ArgumentParser
+from struct import pack
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C
+from ucdev.cy7c65211.sim import CySim, USBModel, I2CRegisterSlave
+from ucdev.mpu6050 import *
+from ucdev.mpu6050sim import *
+from ucdev.mpu6050stream import *
+from ucdev.trace import Tracer
+from ucdev import hmc5883
+from ucdev.hmc5883 import HMC5883, DXRA
+
+import logging
+log = logging.getLogger(__name__)
+
+class HMC5883Sim(I2CRegisterSlave):
+    """HMC5883L with new data (X counting up) on each read of DXRA."""
+
+    def __init__(self):
+        I2CRegisterSlave.__init__(self, 13, b"\x10\x20\x01" + b"\x00" * 7 + b"H43")
+        self.nr = 0
+
+    def write(self, data):
+        I2CRegisterSlave.write(self, data)
+        if self.ptr == DXRA and len(data) == 1:
+            # X, Z, Y
+            self.regs[DXRA:DXRA + 6] = pack(">3h", self.nr, -self.nr, 2 * self.nr)
+            self.nr = (self.nr + 1) & 0x7FFF
+
+def setup(ctx, aux):
+    sim = CySim(usb=USBModel(latency=ctx.opt.latency))
+    sdev = sim.add_device()
+    chip = sdev.attach_i2c(0x68, MPU6050Sim(sim.clock))
+    if aux:
+        chip.attach_aux(0x1E, HMC5883Sim())
+    else:
+        sdev.attach_i2c(0x1E, HMC5883Sim())
+
+    i2c = CyI2C(next(CyUSBSerial(lib=sim).find()))
+    i2c.set_config(dict(frequency=ctx.opt.i2c_freq, slaveAddress=0x1e,
+                        isMaster=True, isClockStretch=False))
+    i2c.dev.trace = Tracer(slots=16)
+    mpu = MPU6050(i2c)
+    mpu.clock = sim.clock.time
+    mpu.PWR_MGMT_1 = PWR_MGMT_1(CLKSEL=1)
+    mpu.CONFIG = CONFIG(DLPF_CFG=1)
+    return sim, chip, mpu, i2c
+
+def separate(ctx):
+    sim, chip, mpu, i2c = setup(ctx, False)
+    hmc = HMC5883(i2c)
+    def read():
+        return mpu.read_sample() + struct_mag(hmc.read_from(DXRA, 6))
+    return sim, read, i2c.dev.trace
+
+def aux(ctx):
+    sim, chip, mpu, i2c = setup(ctx, True)
+    hmc5883.attach_mpu6050(mpu)
+    return sim, mpu.read_sample, i2c.dev.trace
+
+def struct_mag(raw):
+    return tuple(np.frombuffer(bytes(raw), '>i2').tolist())
+
+def stream(ctx):
+    sim, chip, mpu, i2c = setup(ctx, True)
+    hmc5883.attach_mpu6050(mpu, fifo=True)
+    st = MPU6050Stream(mpu, rate=ctx.opt.rate)
+    st.clock = sim.clock.time
+    st.sleep = sim.clock.advance
+    st.start()
+
+    seq = []
+    tr = i2c.dev.trace
+    c0 = tr.count
+    t0 = sim.clock.now
+    for ts, frames in st.run():
+        seq.append(frames['ext'][:, 0])
+        if ts - t0 >= ctx.opt.time:
+            break
+    st.stop()
+
+    seq = np.concatenate(seq) if seq else np.empty(0, np.int64)
+    gaps = int(np.count_nonzero(np.diff(seq.astype(np.int64)) % 0x8000 != 1))
+    print("stream: {0} frames of {1} bytes, {2} gaps in magnetometer X, "
+          "{3:.3f} I2C xfers per frame".format(
+              len(seq), st.size, gaps, (tr.count - c0) / float(max(len(seq), 1))))
+
+def main(ctx):
+    nr = ctx.opt.number
+    for name, func in (("separate", separate), ("aux", aux)):
+        sim, read, tr = func(ctx)
+        log.debug("{0}: {1}".format(name, read()))
+        c0, v0, t0 = tr.count, sim.clock.now, time.time()
+        for i in range(nr):
+            ret = read()
+        xfer = (tr.count - c0) / float(nr)
+        vt, dt = (sim.clock.now - v0) / nr, (time.time() - t0) / nr
+        print("{0:>8}: {1:.0f} I2C xfers, {2:7.3f}[ms] virtual, {3:6.1f}[us] "
+              "wall per sample, {4:7.1f} samples/s, {5} values".format(
+                  name, xfer, vt * 1e3, dt * 1e6, 1 / vt, len(ret)))
+    stream(ctx)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=1000)
+    ap.add_argument('-r', '--rate', type=int, default=100)
+    ap.add_argument('-t', '--time', type=float, default=5)
+    ap.add_argument('-l', '--latency', type=float, default=1e-3)
+    ap.add_argument('-f', '--i2c-freq', type=int, default=400000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
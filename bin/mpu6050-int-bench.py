@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark data-ready interrupt driven sampling of MPU-6050 over
+simulated CY7C6521x bridge.
+
+MPU-6050 model (ucdev.mpu6050sim) samples at -r rate on virtual clock,
+with its INT pin on bridge GPIO, USB link model of
+ucdev.cy7c65211.sim (-l latency per call) and I2C at -f frequency.
+Sensor clock runs -d ppm fast against host. For -t seconds of virtual
+time, samples are read in two ways:
+
+- sleep: read_sample() and sleep for sample period, as
+  bin/mpu6050-test.py does
+- int: MPU6050Sampler (ucdev.mpu6050sampler), reading on INT
+
+Reports samples read against samples taken by sensor, samples read
+twice and missed (as accel X of model counts up), bridge calls per
+sample, and error of host timestamp against time each sample was
+taken (mean and standard deviation as jitter).
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import math
+
+from argparse import ArgumentParser
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C, CyGPIO
+from ucdev.cy7c65211.sim import CySim, USBModel
+from ucdev.mpu6050 import *
+from ucdev.mpu6050sim import *
+from ucdev.mpu6050sampler import *
+
+import logging
+log = logging.getLogger(__name__)
+
+PIN_INT = 2
+
+class MPU6050TimedSim(MPU6050Sim):
+    """Records time each sample is taken, with clock off by ppm."""
+
+    def __init__(self, clock, ppm=0):
+        self.ppm = ppm
+        self.times = []
+        MPU6050Sim.__init__(self, clock)
+
+    @property
+    def period(self):
+        return MPU6050Sim.period.fget(self) / (1 + self.ppm * 1e-6)
+
+    def take_sample(self):
+        self.times.append(self.t_int)
+        MPU6050Sim.take_sample(self)
+
+def setup(ctx):
+    sim = CySim(usb=USBModel(latency=ctx.opt.latency))
+    sdev = sim.add_device()
+    chip = sdev.attach_i2c(0x68, MPU6050TimedSim(sim.clock, ctx.opt.drift))
+    sdev.attach_gpio(PIN_INT, chip.int_pin)
+
+    dev = next(CyUSBSerial(lib=sim).find())
+    i2c = CyI2C(dev)
+    i2c.set_config(dict(frequency=ctx.opt.i2c_freq, slaveAddress=0x1e,
+                        isMaster=True, isClockStretch=False))
+    return sim, chip, MPU6050(i2c), CyGPIO(dev).pin(PIN_INT)
+
+def sleep_paced(ctx):
+    sim, chip, mpu, pin = setup(ctx)
+    mpu.PWR_MGMT_1 = PWR_MGMT_1(CLKSEL=1)
+    mpu.CONFIG = CONFIG(DLPF_CFG=1)
+    mpu.SMPLRT_DIV = int(1000 / ctx.opt.rate) - 1
+
+    got = []
+    n0 = len(chip.times)
+    t0 = sim.clock.now
+    while sim.clock.now - t0 < ctx.opt.time:
+        ax = mpu.read_sample()[0]
+        got.append((sim.clock.now, ax))
+        sim.clock.advance(1.0 / ctx.opt.rate)
+    return chip, got, n0, len(got)
+
+def int_driven(ctx):
+    sim, chip, mpu, pin = setup(ctx)
+    sampler = MPU6050Sampler(mpu, pin, rate=ctx.opt.rate)
+    sampler.clock = sim.clock.time
+    sampler.sleep = sim.clock.advance
+    sampler.start()
+
+    got = []
+    n0 = len(chip.times)
+    t0 = sim.clock.now
+    for ts, sample in sampler.run(timeout=1.0):
+        got.append((ts, sample[0]))
+        if ts - t0 >= ctx.opt.time:
+            break
+    sampler.stop()
+
+    log.info("int: {0}".format(sampler.summary()))
+    return chip, got, n0, sampler.stat['samples'] + sampler.stat['polls']
+
+def main(ctx):
+    for name, func in (("sleep", sleep_paced), ("int", int_driven)):
+        chip, got, n0, calls = func(ctx)
+        seen = set(ax for ts, ax in got)
+        taken = len(chip.times) - n0
+        first, last = got[0][1], got[-1][1]
+        missed = (last - first + 1) - len(seen)
+
+        err = [ts - chip.times[ax] for ts, ax in got]
+        mean = sum(err) / len(err)
+        sd = math.sqrt(sum((e - mean) ** 2 for e in err) / len(err))
+        print("{0:>6}: {1}/{2} samples, {3} read twice, {4} missed, "
+              "{5:.2f} bridge calls per sample, timestamp error "
+              "{6:.3f}[ms] jitter {7:.3f}[ms]".format(
+                  name, len(seen), taken, len(got) - len(seen), missed,
+                  calls / float(len(got)), mean * 1e3, sd * 1e3))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-r', '--rate', type=int, default=100)
+    ap.add_argument('-t', '--time', type=float, default=10)
+    ap.add_argument('-d', '--drift', type=float, default=100)
+    ap.add_argument('-l', '--latency', type=float, default=1e-3)
+    ap.add_argument('-f', '--i2c-freq', type=int, default=400000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark reading one MPU-6050 sample over simulated CY7C6521x bridge.
+
+Reads -n samples from MPU-6050 model (ucdev.mpu6050sim) in two ways:
+
+- per-register: each of 14 _H/_L output registers by get_reg(), as
+  register properties do (pointer write and read each)
+- burst: MPU6050.read_sample(), all 14 registers in one read
+
+Reports I2C transactions, virtual time (USB link model, -l latency)
+and wall time per sample, with samples per second in virtual time,
+and checks both give same values.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C
+from ucdev.cy7c65211.sim import CySim, USBModel
+from ucdev.mpu6050 import *
+from ucdev.mpu6050sim import *
+
+import logging
+log = logging.getLogger(__name__)
+
+REGS = (ACCEL_XOUT_H, ACCEL_XOUT_L, ACCEL_YOUT_H, ACCEL_YOUT_L,
+        ACCEL_ZOUT_H, ACCEL_ZOUT_L, TEMP_OUT_H, TEMP_OUT_L,
+        GYRO_XOUT_H, GYRO_XOUT_L, GYRO_YOUT_H, GYRO_YOUT_L,
+        GYRO_ZOUT_H, GYRO_ZOUT_L)
+
+def per_register(mpu):
+    raw = bytearray(mpu.get_reg(reg).uint for reg in REGS)
+    return SAMPLE.unpack(bytes(raw))
+
+def burst(mpu):
+    return mpu.read_sample()
+
+def main(ctx):
+    sim = CySim(usb=USBModel(latency=ctx.opt.latency))
+    sdev = sim.add_device()
+    sdev.attach_i2c(0x68, MPU6050Sim(sim.clock))
+    i2c = CyI2C(next(CyUSBSerial(lib=sim).find()))
+    i2c.set_config(dict(frequency=ctx.opt.i2c_freq, slaveAddress=0x1e,
+                        isMaster=True, isClockStretch=False))
+    mpu = MPU6050(i2c)
+    mpu.PWR_MGMT_1 = PWR_MGMT_1(CLKSEL=1)
+
+    # both paths give same value for same sample
+    mpu.PWR_MGMT_1.SLEEP = 1
+    if per_register(mpu) != burst(mpu):
+        log.error("per-register and burst read differ")
+    mpu.PWR_MGMT_1.SLEEP = 0
+
+    nr = ctx.opt.number
+    for name, func, xfer in (("per-register", per_register, 2 * len(REGS)),
+                             ("burst", burst, 2)):
+        v0, t0 = sim.clock.now, time.time()
+        for i in range(nr):
+            func(mpu)
+        vt, dt = (sim.clock.now - v0) / nr, (time.time() - t0) / nr
+        print("{0:>12}: {1:2d} I2C xfers, {2:7.3f}[ms] virtual, {3:6.1f}[us] "
+              "wall per sample, {4:7.1f} samples/s".format(
+                  name, xfer, vt * 1e3, dt * 1e6, 1 / vt))
+
+    print("scaled: {0}".format(
+        " ".join("%.3f" % v for v in mpu.read_sample(scale=True))))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=1000)
+    ap.add_argument('-l', '--latency', type=float, default=1e-3)
+    ap.add_argument('-f', '--i2c-freq', type=int, default=400000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark MPU-6050 sampling over simulated CY7C6521x bridge.
+
+MPU-6050 model (ucdev.mpu6050sim) samples at -r rate on virtual clock,
+with USB link model of ucdev.cy7c65211.sim (-l latency per transfer)
+and I2C at -f frequency. For -t seconds of virtual time, samples are
+read in two ways:
+
+- poll: read all output registers (ACCEL_XOUT_H to GYRO_ZOUT_L) in one
+  burst, as fast as possible, one sample per read
+- stream: drain FIFO with MPU6050Stream (ucdev.mpu6050stream)
+
+Reports samples received against samples taken by sensor, gaps in
+sample sequence (as accel X of model counts up), I2C transactions and
+wall time per sample.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from argparse import ArgumentParser
+from struct import unpack
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C
+from ucdev.cy7c65211.sim import CySim, USBModel
+from ucdev.mpu6050 import *
+from ucdev.mpu6050sim import *
+from ucdev.mpu6050stream import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def setup(ctx):
+    sim = CySim(usb=USBModel(latency=ctx.opt.latency))
+    sdev = sim.add_device()
+    chip = sdev.attach_i2c(0x68, MPU6050Sim(sim.clock))
+
+    i2c = CyI2C(next(CyUSBSerial(lib=sim).find()))
+    i2c.set_config(dict(frequency=ctx.opt.i2c_freq, slaveAddress=0x1e,
+                        isMaster=True, isClockStretch=False))
+    return sim, chip, MPU6050(i2c)
+
+def gaps(seq):
+    seq = np.asarray(seq, dtype=np.int64)
+    return int(np.count_nonzero(np.diff(seq) % 0x10000 != 1))
+
+def poll(ctx):
+    sim, chip, mpu = setup(ctx)
+    mpu.PWR_MGMT_1 = PWR_MGMT_1(CLKSEL=1)
+    mpu.CONFIG = CONFIG(DLPF_CFG=1)
+    mpu.SMPLRT_DIV = int(1000 / ctx.opt.rate) - 1
+
+    seq = []
+    xfer, n0 = 0, chip.stat['samples']
+    t0, w0 = sim.clock.now, time.time()
+    while sim.clock.now - t0 < ctx.opt.time:
+        raw = mpu.get_reg(int(ACCEL_XOUT_H), 14)
+        xfer += 2
+        ax = unpack(">7h", bytes(raw))[0]
+        if not seq or ax != seq[-1]:
+            seq.append(ax)
+    return seq, chip.stat['samples'] - n0, xfer, time.time() - w0
+
+def stream(ctx):
+    sim, chip, mpu = setup(ctx)
+    st = MPU6050Stream(mpu, rate=ctx.opt.rate)
+    st.clock = sim.clock.time
+    st.sleep = sim.clock.advance
+    st.start()
+
+    seq = []
+    n0 = chip.stat['samples']
+    t0, w0 = sim.clock.now, time.time()
+    for ts, frames in st.run():
+        seq.append(frames['accel'][:, 0])
+        if ts - t0 >= ctx.opt.time:
+            break
+    dt = time.time() - w0
+    st.stop()
+
+    seq = np.concatenate(seq) if seq else []
+    log.debug("stream: {0}".format(st.stat))
+    xfer = st.stat['reads'] * 2 + (st.stat['reads'] - st.stat['polls']) * 2
+    return seq, chip.stat['samples'] - n0, xfer, dt
+
+def main(ctx):
+    for name, func in (("poll", poll), ("stream", stream)):
+        seq, taken, xfer, dt = func(ctx)
+        nr = max(len(seq), 1)
+        print("{0:>6}: {1}/{2} samples, {3} gaps, {4:.3f} I2C xfers and "
+              "{5:.1f}[us] wall per sample".format(
+                  name, len(seq), taken, gaps(seq), xfer / float(nr),
+                  dt / nr * 1e6))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-r', '--rate', type=int, default=1000)
+    ap.add_argument('-t', '--time', type=float, default=5)
+    ap.add_argument('-l', '--latency', type=float, default=1e-3)
+    ap.add_argument('-f', '--i2c-freq', type=int, default=400000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streams MPU-6050 samples through its FIFO (see ucdev.mpu6050stream),
+and prints average of samples received in each -i interval, with
+sample rate achieved. With -w, all samples are saved to .npy file.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from argparse import ArgumentParser
+
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C
+from ucdev.mpu6050 import *
+from ucdev.mpu6050stream import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def find_dev(ctx):
+    dll = os.getenv("CYUSBSERIAL_DLL") or "cyusbserial"
+    lib = CyUSBSerial(lib=dll)
+    found = list(lib.find(vid=ctx.opt.vid, pid=ctx.opt.pid))
+    return found[ctx.opt.nth]
+
+def main(ctx):
+    dev = find_dev(ctx)
+    i2c = CyI2C(dev)
+    cfg = i2c.get_config()
+    cfg['frequency'] = ctx.opt.i2c_freq
+    i2c.set_config(cfg)
+
+    mpu = MPU6050(i2c, address=ctx.opt.addr)
+    stream = MPU6050Stream(mpu, rate=ctx.opt.rate)
+    stream.start()
+
+    saved = []
+    got = []
+    t0 = time.time()
+    try:
+        for ts, frames in stream.run(timeout=1.0):
+            got.append(frames)
+            if ctx.opt.write:
+                saved.append(frames)
+            if ts - t0 < ctx.opt.interval:
+                continue
+
+            tmp = np.concatenate(got)
+            print("{0:.3f} {1:7.1f}[Hz] accel {2} temp {3:.0f} gyro {4}".format(
+                ts, len(tmp) / (ts - t0), tmp['accel'].mean(axis=0).round(),
+                tmp['temp'].mean(), tmp['gyro'].mean(axis=0).round()))
+            sys.stdout.flush()
+            got, t0 = [], ts
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop()
+
+    if ctx.opt.write and saved:
+        np.save(ctx.opt.write, np.concatenate(saved))
+    log.info("stat: {0}".format(stream.stat))
+
+def to_int(v):
+    return int(v, 0)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-V', '--vid', type=to_int, default=0x04b4)
+    ap.add_argument('-P', '--pid', type=to_int, default=0x0004)
+    ap.add_argument('-A', '--addr', type=to_int, default=0x68)
+    ap.add_argument('-n', '--nth', type=int, default=0)
+    ap.add_argument('-r', '--rate', type=int, default=1000)
+    ap.add_argument('-f', '--i2c-freq', type=int, default=400000)
+    ap.add_argument('-i', '--interval', type=float, default=1.0)
+    ap.add_argument('-w', '--write')
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -10,8 +10,9 @@ import time
 from struct import pack, unpack
 from argparse import ArgumentParser
 
-from ucdev.cy7c65211 import CyUSBSerial, CyI2C
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C, CyGPIO
 from ucdev.mpu6050 import *
+from ucdev.mpu6050sampler import *
 
 from IPython import embed
 
@@ -36,10 +37,20 @@ def main(ctx):
     # powerup
     mpu.PWR_MGMT_1.SLEEP = 0
 
-    # dump accel data for some time
-    for i in range(ctx.opt.time * 10):
-        print(mpu.ACCEL_XOUT_H)
-        time.sleep(0.1)
+    # dump accel[g]/temp[degC]/gyro[deg/s] data for some time
+    if ctx.opt.int_pin is None:
+        for i in range(ctx.opt.time * 10):
+            print(" ".join("%8.3f" % v for v in mpu.read_sample(scale=True)))
+            time.sleep(0.1)
+    else:
+        # read on data ready interrupt
+        pin = CyGPIO(dev).pin(ctx.opt.int_pin)
+        sampler = MPU6050Sampler(mpu, pin, rate=10, scale=True)
+        sampler.start()
+        for ts, sample in sampler.run(timeout=1.0, count=ctx.opt.time * 10):
+            print("%.4f" % ts, " ".join("%8.3f" % v for v in sample))
+        sampler.stop()
+        log.info("stat: {0}".format(sampler.summary()))
     print("=== Data dump done. Entering IPython ===")
 
     embed()
@@ -55,6 +66,7 @@ if __name__ == '__main__' and '__file__' in globals():
     ap.add_argument('-A', '--addr', type=to_int, default=0x68)
     ap.add_argument('-n', '--nth', type=int, default=0)
     ap.add_argument('-t', '--time', type=int, default=1)
+    ap.add_argument('-I', '--int-pin', type=int)
     ap.add_argument('args', nargs='*')
 
     # parse args
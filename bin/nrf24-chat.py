@@ -39,7 +39,7 @@ def find_dev(ctx):
 def main(ctx):
     dev = find_dev(ctx)
     io = CyGPIO(dev)
-    rf = nRF24(CySPI(dev), CE=io.pin(0), IRQ=io.pin(1))
+    rf = nRF24(CySPI(dev), CE=io.pin(0), IRQ=io.pin(1), cache=True)
 
     # set basic mode
     mode  = DIR_RECV
@@ -61,15 +61,16 @@ def main(ctx):
     #rf.CONFIG.EN_CRC = 0
 
     # send/recv loop
+    rf.set_mode(DIR_RECV)
     while True:
         fd = select.select([sys.stdin], [], [], 0.0)
 
         if fd[0]:
             input = fd[0][0].readline().strip()
             log.info("send: %s" % input)
-            rf.set_mode(DIR_SEND)
-            rf.send(input.ljust(32)[:32])
-            rf.set_mode(DIR_RECV)
+            ret = rf.send_then_listen(input.ljust(32)[:32], timeout=0)
+            if ret:
+                log.info("recv: %s" % ret[1])
 
         rc, buf = rf.recv()
         if rc and rc.RX_DR and buf:
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark scaling of nRF24Group (ucdev.nrf24group) with radio count.
+
+For each given number of pairs (-N), sets up that many sender and
+receiver radios on modeled air (ucdev.nrf24sim), each pair on its own
+channel, and runs them all in an nRF24Group, one thread per radio.
+Every sender sends -n payloads, and merged stream of receivers is read
+with recv() until all payloads arrive, or none arrives for -t seconds
+(as payloads are dropped on MAX_RT under -l loss).
+
+Air runs on WallClock, so each SPI/GPIO access sleeps for -L latency
+without holding GIL, as libcyusbserial does for USB round trip. Reports
+aggregate payloads per second (wall time), and speedup against single
+pair. Merged stream is checked to be in timestamp order, with payloads
+of each sender in order sent.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.common import WallClock
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+from ucdev.nrf24group import *
+
+import logging
+log = logging.getLogger(__name__)
+
+ADDR = 0xE7E7E7E7E7
+
+def make_radio(ctx, air, mode):
+    chip = nRF24Sim(air, latency=ctx.opt.latency, gpio_latency=ctx.opt.latency)
+    rf = nRF24(chip, CE=chip.pin(PIN_CE), IRQ=chip.pin(PIN_IRQ), cache=True)
+    rf.clock = air.clock.time
+    rf.sleep = air.clock.advance
+    rf.reset(mode | MODE_ESB, freq=ctx.opt.spi_freq)
+    return rf
+
+def run(ctx, pairs):
+    air = nRF24Air(clock=WallClock(), loss=ctx.opt.loss, seed=ctx.opt.seed)
+    group = nRF24Group()
+    for i in range(pairs):
+        ch = 10 + i * 10
+        tx = make_radio(ctx, air, DIR_SEND)
+        tx.TX_ADDR = tx.RX_ADDR_P0 = ADDR
+        rx = make_radio(ctx, air, DIR_RECV)
+        rx.RX_ADDR_P0 = 0
+        rx.RX_ADDR_P1 = ADDR
+        group.add(tx, DIR_SEND, ch, "tx%d" % i)
+        group.add(rx, DIR_RECV, ch, "rx%d" % i)
+
+    nr = ctx.opt.number
+    t0 = time.time()
+    group.start()
+    for j in range(nr):
+        for i in range(pairs):
+            group.send(("%02d%06d" % (i, j)).ljust(32, "X"), "tx%d" % i)
+
+    got = []
+    t1 = t0
+    while len(got) < pairs * nr:
+        ret = group.recv(timeout=ctx.opt.timeout)
+        if ret is None:
+            break
+        got.append(ret)
+        t1 = time.time()
+    dt = t1 - t0
+    group.stop()
+
+    # check order of merged stream, and of each sender
+    ts = [i[0] for i in got]
+    if ts != sorted(ts):
+        log.error("merged stream is not in timestamp order")
+    seqs = {}
+    for i in got:
+        data = bytearray(i[3])
+        src, seq = int(data[:2]), int(data[2:8])
+        if seq <= seqs.get(src, -1):
+            log.error("payload %d of tx%d is out of order", seq, src)
+        seqs[src] = seq
+
+    log.debug("stats: {0}".format(group.stats()))
+    return len(got), dt
+
+def main(ctx):
+    base = None
+    for pairs in ctx.opt.pairs:
+        got, dt = run(ctx, pairs)
+        pps = got / dt
+        base = base or pps
+        print("{0} pairs: {1}/{2} payloads in {3:.3f}[s], {4:.1f} payloads/s, "
+              "x{5:.2f}".format(pairs, got, pairs * ctx.opt.number, dt, pps,
+                                pps / base))
+
+def to_list(v):
+    return [int(i) for i in v.split(",") if i]
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-N', '--pairs', type=to_list, default=[1, 2, 4])
+    ap.add_argument('-n', '--number', type=int, default=300)
+    ap.add_argument('-l', '--loss', type=float, default=0.0)
+    ap.add_argument('-L', '--latency', type=float, default=1e-3)
+    ap.add_argument('-F', '--spi-freq', type=int, default=1000000)
+    ap.add_argument('-t', '--timeout', type=float, default=1)
+    ap.add_argument('-S', '--seed', type=int, default=0)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
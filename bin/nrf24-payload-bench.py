@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark per-packet CPU cost of nRF24 payload commands.
+
+Runs W_TX_PAYLOAD and R_RX_PAYLOAD over SPI that costs nothing, so
+only the time spent in Python for building and decoding command
+frames is measured. SPI is one of:
+
+- null: clocks in zeros, supports send_into() (copy-free path)
+- send: same, but supports send() only
+- cysim: CySPI on simulated bridge (ucdev.cy7c65211.sim), which
+  includes cffi and simulator overhead (needs cffi)
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.common import SPI
+from ucdev.nrf24 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+class SendSPI(SPI):
+    def send(self, data):
+        return bytearray(len(data))
+
+class NullSPI(SendSPI):
+    def send_into(self, data, out=None):
+        return out if out is not None else bytearray(len(data))
+
+def cysim_spi():
+    from ucdev.cy7c65211 import CyUSBSerial, CySPI
+    from ucdev.cy7c65211.sim import CySim, LoopbackSPI
+
+    sim = CySim()
+    sim.add_device().spi = LoopbackSPI()
+    return CySPI(next(CyUSBSerial(lib=sim).find()))
+
+# best of repeated runs, as other load only adds to it
+def run(ctx, name, func, size):
+    nr = ctx.opt.number
+    best = None
+    for r in range(ctx.opt.repeat):
+        t0 = time.time()
+        for i in range(nr):
+            func()
+        dt = (time.time() - t0) / nr
+        best = dt if best is None else min(best, dt)
+    print("{0:24s} {1:6d} {2:12.3f}".format(name, size, best * 1e6))
+
+def main(ctx):
+    print("{0:24s} {1:>6s} {2:>12s}".format("", "size", "cpu[us]"))
+    for kind in ctx.opt.spi.split(","):
+        spi = {'null': NullSPI, 'send': SendSPI, 'cysim': cysim_spi}[kind]()
+        api = nRF24API(spi)
+
+        for size in ctx.opt.args or [8, 32]:
+            size = int(size)
+            data = bytearray(b"\x55" * size)
+            out = bytearray(size)
+            run(ctx, kind + ": W_TX_PAYLOAD",
+                lambda: api.W_TX_PAYLOAD(data), size)
+            run(ctx, kind + ": R_RX_PAYLOAD",
+                lambda: api.R_RX_PAYLOAD(size), size)
+            run(ctx, kind + ": R_RX_PAYLOAD(out)",
+                lambda: api.R_RX_PAYLOAD(size, out), size)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=10000)
+    ap.add_argument('-r', '--repeat', type=int, default=5)
+    ap.add_argument('-s', '--spi', default='null,send')
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -57,10 +57,8 @@ def main(ctx):
     rf.RF_CH   = ctx.opt.freq - 2400
 
     # recv loop
-    while True:
-        rc, buf = rf.recv()
-        if rc and rc.RX_DR and buf:
-            sys.stdout.write(buf)
+    for pipe, buf, ts in rf.recv_stream(max_wait=ctx.opt.wait):
+        sys.stdout.write(buf)
 
 def to_int(v):
     return int(v, 0)
@@ -76,6 +74,7 @@ if __name__ == '__main__' and '__file__' in globals():
     ap.add_argument('-f', '--freq', type=int, default=2405)
     ap.add_argument('-m', '--mode', default='SB')
     ap.add_argument('-r', '--rate')
+    ap.add_argument('-w', '--wait', type=float, default=0.1)
     ap.add_argument('args', nargs='*')
 
     # parse args
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark channel sweep rate of nRF24 scanner over modeled radios.
+
+Puts jammers (radios retransmitting a payload back to back) on given
+channels of virtual air (ucdev.nrf24sim), and sweeps all channels
+with a scanner radio. Reports sweep rate in channels per virtual
+second, and occupancy detected on jammed and other channels. Method
+is one of:
+
+- naive: scan loop written with live registers, as done before
+  nRF24.sweep() (RF_CH update and CD read per channel)
+- sweep: nRF24.sweep()
+
+Per-transfer latency (-L) applies to both SPI and GPIO (CE) of the
+scanner, as both are USB transactions on the bridge. SPI runs at -F
+frequency, as in nrf24-scan.py. Also reports bus bound of sweep(), the
+rate at which its 4 USB transactions per channel (CE high, CE low, RPD
+read, RF_CH write) and dwell take all the time.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def make_radio(air, latency=0):
+    chip = nRF24Sim(air, latency=latency, gpio_latency=latency)
+    rf = nRF24(chip, CE=chip.pin(PIN_CE), IRQ=chip.pin(PIN_IRQ))
+    rf.clock = air.clock.time
+    rf.sleep = air.clock.advance
+    return rf
+
+def make_jammer(ctx, air, ch):
+    rf = make_radio(air)
+    rf.reset(MODE_SB|DIR_SEND|eval("RATE_%s" % ctx.opt.rate.upper()))
+    rf.RF_CH = ch
+    rf.W_TX_PAYLOAD(bytearray(ctx.opt.size))
+    rf.CE = 1
+
+    # retransmit first payload forever
+    air.clock.advance(0.01)
+    rf.REUSE_TX_PL()
+    return rf
+
+def naive(ctx, rf, channels, dwell, count):
+    rf.reset(MODE_SB|DIR_RECV, freq=ctx.opt.spi_freq)
+    rf.CE = 0
+    rf.EN_RXADDR = 0
+    for n in range(count):
+        hits = bytearray(len(channels))
+        for i, ch in enumerate(channels):
+            rf.RF_CH.RF_CH = ch
+            rf.CE = 1
+            rf.sleep(dwell)
+            rf.CE = 0
+            hits[i] = rf.CD.CD
+        yield rf.clock(), hits
+
+def sweep(ctx, rf, channels, dwell, count):
+    rf.reset(MODE_SB|DIR_RECV, freq=ctx.opt.spi_freq)
+    return rf.sweep(channels, dwell, count)
+
+def main(ctx):
+    air = nRF24Air(seed=ctx.opt.seed)
+    jammers = [make_jammer(ctx, air, ch) for ch in ctx.opt.jam]
+
+    rf = make_radio(air, ctx.opt.latency)
+    channels = list(range(126))
+    total = [0] * len(channels)
+
+    func = {'naive': naive, 'sweep': sweep}[ctx.opt.method]
+    v0, t0 = air.clock.now, time.time()
+    for ts, hits in func(ctx, rf, channels, ctx.opt.dwell, ctx.opt.number):
+        for i, hit in enumerate(hits):
+            total[i] += hit
+    vt, dt = air.clock.now - v0, time.time() - t0
+
+    nr = ctx.opt.number
+    jam = [total[ch] / float(nr) for ch in ctx.opt.jam]
+    other = [total[ch] / float(nr) for ch in channels if ch not in ctx.opt.jam]
+    print("occupancy: jammed min {0:.2f}, other max {1:.2f}".format(
+        min(jam or [0]), max(other or [0])))
+    print("{0}: {1} sweeps in {2:.3f}[s], {3:.1f} channels/s, wall {4:.1f}[us] per channel".format(
+        ctx.opt.method, nr, vt, nr * len(channels) / vt,
+        dt / (nr * len(channels)) * 1e6))
+
+    # 2 bytes each for RPD read and RF_CH write
+    step = 4 * ctx.opt.latency + ctx.opt.dwell + 2 * 16.0 / ctx.opt.spi_freq
+    print("bus bound: {0:.1f} channels/s".format(1 / step))
+
+def to_channels(v):
+    return [int(i) for i in v.split(",") if i]
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-M', '--method', default='sweep')
+    ap.add_argument('-n', '--number', type=int, default=5)
+    ap.add_argument('-j', '--jam', type=to_channels, default=[5, 40, 80])
+    ap.add_argument('-r', '--rate', default='1M')
+    ap.add_argument('-s', '--size', type=int, default=32)
+    ap.add_argument('-d', '--dwell', type=float, default=170e-6)
+    ap.add_argument('-L', '--latency', type=float, default=1e-3)
+    ap.add_argument('-F', '--spi-freq', type=int, default=1000000)
+    ap.add_argument('-S', '--seed', type=int, default=0)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+from __future__ import print_function
+
+usage = """
+nRF24 channel activity scanner
+
+Sweeps 2.4GHz channels with nRF24L01+ and streams waterfall of carrier
+(RPD) occupancy, one line per given number of sweeps. Occupancy of
+each channel is shown from ' ' (never busy) to '@' (always busy).
+Total occupancy and sweep rate are printed on exit.
+
+To run and test this script, connection betwen CY7C65211 and nRF24L01
+must be done as below:
+
+Cypress       nRF24L01
+----------------------
+ GPIO 0 <---> CE
+ GPIO 1 <---> IRQ
+   SSEL <---> CSN
+   MISO <---> MO
+   MOSI <---> MI
+   SCLK <---> SCK
+
+"""
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.cy7c65211 import CyUSBSerial, CyGPIO, CySPI
+from ucdev.nrf24 import *
+from ucdev.nrf24scan import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def find_dev(ctx):
+    dll = os.getenv("CYUSBSERIAL_DLL") or "cyusbserial"
+    lib = CyUSBSerial(lib=dll)
+    found = list(lib.find(vid=ctx.opt.vid, pid=ctx.opt.pid))
+    return found[ctx.opt.nth]
+
+# "0-125" or "1,6,11" or mix of them
+def to_channels(v):
+    ret = []
+    for i in v.split(","):
+        lo, hi = (i.split("-") + [i])[:2]
+        ret += range(int(lo), int(hi) + 1)
+    return ret
+
+def main(ctx):
+    dev = find_dev(ctx)
+    io = CyGPIO(dev)
+    rf = nRF24(CySPI(dev), CE=io.pin(0), IRQ=io.pin(1))
+    rf.reset(MODE_SB|DIR_RECV, freq=ctx.opt.spi_freq)
+
+    scan = nRF24Scanner(rf, ctx.opt.channels, ctx.opt.dwell)
+    for line in header(scan.channels):
+        print(" " * 10 + line)
+
+    try:
+        for ts, occ in scan.waterfall(ctx.opt.sweeps, ctx.opt.count):
+            print("{0:9.3f} {1} {2:7.1f}".format(ts - scan.t0, render(occ),
+                                                 scan.rate()))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+    print(" " * 10 + render(scan.occupancy()))
+    print("{0} sweeps, {1:.1f} channels/s".format(scan.sweeps, scan.rate()))
+    for ch, occ in zip(scan.channels, scan.occupancy()):
+        log.debug("CH{0:03d} ({1}MHz): {2:.3f}".format(ch, 2400 + ch, occ))
+
+def to_int(v):
+    return int(v, 0)
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser(usage=usage)
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-V', '--vid', type=to_int, default=0x04b4)
+    ap.add_argument('-P', '--pid', type=to_int, default=0x0004)
+    ap.add_argument('-n', '--nth', type=int, default=0)
+    ap.add_argument('-c', '--channels', type=to_channels, default=list(range(126)))
+    ap.add_argument('-d', '--dwell', type=float, default=170e-6)
+    ap.add_argument('-s', '--sweeps', type=int, default=10)
+    ap.add_argument('-N', '--count', type=int)
+    ap.add_argument('-F', '--spi-freq', type=int, default=1000000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
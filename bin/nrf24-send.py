@@ -55,15 +55,18 @@ def main(ctx):
     rf.TX_ADDR = ctx.opt.tx
     rf.RF_CH   = ctx.opt.freq - 2400
 
-    # send loop
-    buf = sys.stdin.read(32)
-    while buf:
-        while not rf.FIFO_STATUS.TX_EMPTY:
-            rf.flush()
-        rf.send(buf)
-        sys.stdout.write('.')
-        sys.stdout.flush()
+    # send loop, keeping TX FIFO filled
+    def chunks():
         buf = sys.stdin.read(32)
+        while buf:
+            yield buf
+            sys.stdout.write('.')
+            sys.stdout.flush()
+            buf = sys.stdin.read(32)
+
+    stat = rf.send_stream(chunks(), policy=ctx.opt.policy)
+    log.info("sent {sent} payloads in {time:.3f}[s], {pps:.1f} payloads/s, "
+             "MAX_RT={max_rt}, flushed={flushed}".format(**stat))
 
 def to_int(v):
     return int(v, 0)
@@ -79,6 +82,7 @@ if __name__ == '__main__' and '__file__' in globals():
     ap.add_argument('-f', '--freq', type=int, default=2405)
     ap.add_argument('-m', '--mode', default='SB')
     ap.add_argument('-r', '--rate')
+    ap.add_argument('-p', '--policy', default='flush')
     ap.add_argument('args', nargs='*')
 
     # parse args
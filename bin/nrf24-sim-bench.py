@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark nRF24 send/recv over modeled radios (ucdev.nrf24sim).
+
+Sets up a sender and a receiver the same way nrf24-send.py and
+nrf24-recv.py do, and runs their send and recv loops in turn on a
+shared virtual air. Reports delivered packets, virtual throughput and
+latency (as modeled, deterministic for given seed), and wall time
+spent in Python per packet.
+
+Per-transfer SPI latency (-L) defaults to 1ms, which is typical for
+USB-to-SPI bridge on full-speed USB. This applies to the sender only.
+Receiver is modeled as driven by another host, and costs no time.
+
+With -S, sender uses nRF24.send_stream() instead of send loop.
+With -R, receiver uses nRF24.recv_stream() instead of recv loop.
+Number of SPI transactions the receiver spent per packet is reported,
+as it is what bounds receive rate on real USB bridge.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def make_radio(ctx, air, mode, latency, freq, cache=False):
+    chip = nRF24Sim(air, latency=latency)
+    rf = nRF24(chip, CE=chip.pin(PIN_CE), IRQ=chip.pin(PIN_IRQ), cache=cache)
+    rf.clock = air.clock.time
+
+    mode |= eval("MODE_%s" % ctx.opt.mode.upper())
+    if ctx.opt.rate:
+        mode |= eval("RATE_%s" % ctx.opt.rate.upper())
+    rf.reset(mode, freq=freq)
+    rf.RF_CH = ctx.opt.freq - 2400
+    return rf
+
+def payloads(nr):
+    for i in range(nr):
+        yield ("%08d" % i).ljust(32, "X")
+
+def main(ctx):
+    air = nRF24Air(loss=ctx.opt.loss, seed=ctx.opt.seed)
+    clock = air.clock
+
+    addr = 0xE7E7E7E7E7
+    tx = make_radio(ctx, air, DIR_SEND, ctx.opt.latency, ctx.opt.spi_freq)
+    tx.TX_ADDR = addr
+    if ctx.opt.mode.upper() == 'ESB':
+        tx.RX_ADDR_P0 = addr
+
+    # receiver is the only writer of its registers, so config is cached
+    rx = make_radio(ctx, air, DIR_RECV, 0, 1e12, cache=True)
+    if ctx.opt.mode.upper() == 'ESB':
+        rx.RX_ADDR_P0 = 0
+    rx.RX_ADDR_P1 = addr
+
+    nr = ctx.opt.number
+    sent = {}
+    lat = []
+
+    def received(data):
+        seq = int(bytes(data[:8]))
+        lat.append(clock.now - sent.get(seq, clock.now))
+
+    # same as nrf24-recv.py, until RX FIFO gets empty
+    def drain():
+        if ctx.opt.recv_stream:
+            for pipe, data, ts in rx.recv_stream(timeout=0):
+                received(data)
+            return
+        while True:
+            rc, data = rx.recv()
+            if not (rc and rc.RX_DR and data):
+                break
+            received(data)
+
+    def stamped(it):
+        for i, buf in enumerate(it):
+            drain()
+            sent[i] = clock.now
+            yield buf
+        drain()
+
+    x0 = rx.spi.nr_xfer
+    v0, t0 = clock.now, time.time()
+    if ctx.opt.stream:
+        ret = tx.send_stream(stamped(payloads(nr)), policy=ctx.opt.policy)
+        # receive payloads still in flight
+        clock.advance(0.01)
+        drain()
+        print("send_stream: {0}".format(ret))
+    else:
+        for buf in stamped(payloads(nr)):
+            # same as nrf24-send.py
+            while not tx.FIFO_STATUS.TX_EMPTY:
+                tx.flush()
+                if tx.STATUS.MAX_RT:
+                    tx.FLUSH_TX()
+            tx.send(buf)
+    got = len(lat)
+    xfer = rx.spi.nr_xfer - x0
+
+    vt, dt = clock.now - v0, time.time() - t0
+    print("sent={0} recv={1} stats={2}".format(nr, got, air.stats))
+    print("virtual: {0:.3f}[s], {1:.1f} pkt/s, {2:.1f} B/s, latency {3:.3f}[ms]".format(
+        vt, got / vt, got * 32 / vt, sum(lat) / max(len(lat), 1) * 1e3))
+    print("wall:    {0:.3f}[s], {1:.1f}[us] per packet".format(dt, dt / nr * 1e6))
+    print("rx spi:  {0} transactions, {1:.2f} per packet".format(xfer, xfer / float(max(got, 1))))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=1000)
+    ap.add_argument('-m', '--mode', default='ESB')
+    ap.add_argument('-r', '--rate')
+    ap.add_argument('-f', '--freq', type=int, default=2405)
+    ap.add_argument('-l', '--loss', type=float, default=0.0)
+    ap.add_argument('-L', '--latency', type=float, default=1e-3)
+    ap.add_argument('-F', '--spi-freq', type=int, default=100000)
+    ap.add_argument('-s', '--seed', type=int, default=0)
+    ap.add_argument('-S', '--stream', action='store_true')
+    ap.add_argument('-R', '--recv-stream', action='store_true')
+    ap.add_argument('-p', '--policy', default='flush')
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
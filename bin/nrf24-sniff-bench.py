@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark decoding rate of nRF24 sniffer (ucdev.nrf24sniff).
+
+Generates raw 32-byte captures as seen in promiscuous mode: ESB
+frames (random address and payload size, with -d ratio of them being
+retransmitted) followed by noise, mixed with pure noise captures (-N
+ratio). Captures are fed to nRF24Sniffer.run() through SPI that
+returns them to R_RX_PAYLOAD, and written to pcap file (-w, default
+to /dev/null).
+
+Reports CPU time per capture, and checks that every frame is decoded
+once and no noise is taken as a frame. Decoding keeps up with radio if
+CPU time per capture is below shortest packet interval on air, which
+is also reported (2Mbps, back-to-back, 130us TX settling).
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+from ucdev.common import SPI
+from ucdev.nrf24 import *
+from ucdev.nrf24sniff import *
+
+import logging
+log = logging.getLogger(__name__)
+
+class CaptureSPI(SPI):
+    """Returns queued captures to R_RX_PAYLOAD, with STATUS of pipe 0."""
+
+    def __init__(self, captures):
+        self.captures = iter(captures)
+
+    def send(self, data):
+        cap = next(self.captures, None)
+        if cap is None:
+            return bytearray([0x0E]) + bytearray(len(data) - 1)
+        return bytearray([0x00]) + cap
+
+def captures(ctx):
+    rnd = random.Random(ctx.opt.seed)
+    addrs = [bytearray(rnd.randint(0, 255) for i in range(5)) for j in range(4)]
+    pids = [0] * len(addrs)
+
+    for i in range(ctx.opt.number):
+        if rnd.random() < ctx.opt.noise:
+            yield bytearray(rnd.randint(0, 255) for i in range(CAPTURE_SIZE)), None
+            continue
+
+        # PID is incremented by each sender
+        n = rnd.randint(0, len(addrs) - 1)
+        pids[n] = (pids[n] + 1) & 3
+        payload = bytearray(rnd.randint(0, 255) for i in range(rnd.randint(0, 23)))
+        frame = encode(addrs[n], payload, pids[n])
+        frame += bytearray(rnd.randint(0, 255) for i in range(CAPTURE_SIZE - len(frame)))
+        yield frame, payload
+        if rnd.random() < ctx.opt.dup:
+            yield frame, None
+
+def main(ctx):
+    caps = list(captures(ctx))
+    sent = [p for c, p in caps if p is not None]
+
+    out = open(ctx.opt.write, "wb")
+    rf = nRF24(CaptureSPI(c for c, p in caps))
+    sniff = nRF24Sniffer(rf, pcap=PcapWriter(out))
+
+    t0 = time.time()
+    got = [bytearray(f.payload) for f in sniff.run(timeout=0, min_wait=0)]
+    dt = time.time() - t0
+    out.close()
+
+    if got != sent:
+        log.error("decoded %d frames, expected %d", len(got), len(sent))
+
+    # 1 byte payload, 5-byte address, on 2Mbps
+    interval = (1 + 5 + 1 + 1 + 2) * 8 / 2e6 + 130e-6
+    print("sniffer: {0}".format(sniff.stat))
+    print("{0} captures, {1} frames ok, {2:.1f}[us] per capture "
+          "(shortest packet interval {3:.1f}[us])".format(
+              len(caps), sum(a == b for a, b in zip(got, sent)),
+              dt / len(caps) * 1e6, interval * 1e6))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=10000)
+    ap.add_argument('-N', '--noise', type=float, default=0.5)
+    ap.add_argument('-d', '--dup', type=float, default=0.2)
+    ap.add_argument('-w', '--write', default=os.devnull)
+    ap.add_argument('-S', '--seed', type=int, default=0)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+from __future__ import print_function
+
+usage = """
+nRF24 sniffer with CRC check and pcap output
+
+Unlike nrf24-dump.py, which prints every capture including noise,
+this decodes (E)SB frames with software CRC check, drops ESB
+retransmissions, and prints each new frame. With -w, frames are also
+written to pcap file (see ucdev.nrf24sniff for record format).
+
+To run and test this script, connection betwen CY7C65211 and nRF24L01
+must be done as below:
+
+Cypress       nRF24L01
+----------------------
+ GPIO 0 <---> CE
+ GPIO 1 <---> IRQ
+   SSEL <---> CSN
+   MISO <---> MO
+   MOSI <---> MI
+   SCLK <---> SCK
+
+"""
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from ucdev.cy7c65211 import CyUSBSerial, CyGPIO, CySPI
+from ucdev.nrf24 import *
+from ucdev.nrf24sniff import *
+
+import logging
+log = logging.getLogger(__name__)
+
+def find_dev(ctx):
+    dll = os.getenv("CYUSBSERIAL_DLL") or "cyusbserial"
+    lib = CyUSBSerial(lib=dll)
+    found = list(lib.find(vid=ctx.opt.vid, pid=ctx.opt.pid))
+    return found[ctx.opt.nth]
+
+def main(ctx):
+    dev = find_dev(ctx)
+    io = CyGPIO(dev)
+    rf = nRF24(CySPI(dev), CE=io.pin(0), IRQ=io.pin(1))
+
+    pcap = PcapWriter(ctx.opt.write) if ctx.opt.write else None
+    sniff = nRF24Sniffer(rf, aw=ctx.opt.aw, sizes=ctx.opt.sizes,
+                         sb=ctx.opt.sb, pcap=pcap)
+
+    rate = eval("RATE_%s" % ctx.opt.rate.upper()) if ctx.opt.rate else None
+    sniff.setup(ctx.opt.freq - 2400, rate, ctx.opt.prefix, ctx.opt.spi_freq)
+
+    try:
+        for frame in sniff.run():
+            print("{0:.6f} {1}".format(frame.ts, frame))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pcap:
+            pcap.close()
+    log.info("stat: {0}".format(sniff.stat))
+
+def to_int(v):
+    return int(v, 0)
+
+def to_list(v):
+    return [int(i) for i in v.split(",") if i]
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser(usage=usage)
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-V', '--vid', type=to_int, default=0x04b4)
+    ap.add_argument('-P', '--pid', type=to_int, default=0x0004)
+    ap.add_argument('-n', '--nth', type=int, default=0)
+    ap.add_argument('-f', '--freq', type=int, default=2405)
+    ap.add_argument('-r', '--rate')
+    ap.add_argument('-p', '--prefix', type=to_int, default=0x0055)
+    ap.add_argument('-a', '--aw', type=to_list, default=[5, 4, 3])
+    ap.add_argument('-s', '--sizes', type=to_list, default=[])
+    ap.add_argument('-b', '--sb', action='store_true')
+    ap.add_argument('-w', '--write')
+    ap.add_argument('-F', '--spi-freq', type=int, default=1000000)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
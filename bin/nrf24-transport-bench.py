@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark message goodput of ucdev.nrf24transport over modeled radios.
+
+Sends messages from a sender to a receiver on shared virtual air
+(ucdev.nrf24sim), and reports goodput in message bytes per virtual
+second. Method is one of:
+
+- stopwait: 32-byte chunks sent one by one with send(), as
+  nrf24-send.py used to do (no framing, so only bytes are counted)
+- esb: nRF24Sender/nRF24Receiver with ESB auto-ack only
+- ackpay: nRF24Sender/nRF24Receiver with cumulative ack in ACK payload
+
+Received messages are checked against sent ones. As in
+nrf24-sim-bench.py, SPI latency (-L) applies to the sender only.
+Receiver is modeled as driven by another host polling continuously,
+by polling it after each SPI transaction of the sender.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+from ucdev.nrf24transport import *
+
+import logging
+log = logging.getLogger(__name__)
+
+ADDR = 0xE7E7E7E7E7
+
+class Interleaved(object):
+    """SPI of modeled radio, calling hook after each transaction."""
+
+    def __init__(self, chip, hook=None):
+        self.chip = chip
+        self.hook = hook
+
+    def __getattr__(self, key):
+        return getattr(self.chip, key)
+
+    def send(self, data):
+        ret = self.chip.send(data)
+        if self.hook:
+            self.hook()
+        return ret
+
+    def send_into(self, data, out=None):
+        ret = self.chip.send_into(data, out)
+        if self.hook:
+            self.hook()
+        return ret
+
+def make_pair(ctx):
+    air = nRF24Air(loss=ctx.opt.loss, seed=ctx.opt.seed)
+    ret = []
+    for mode, latency, freq in ((DIR_SEND, ctx.opt.latency, ctx.opt.spi_freq),
+                                (DIR_RECV, 0, 1e12)):
+        chip = nRF24Sim(air, latency=latency)
+        spi = Interleaved(chip) if mode == DIR_SEND else chip
+        rf = nRF24(spi, CE=chip.pin(PIN_CE), IRQ=chip.pin(PIN_IRQ),
+                   cache=mode == DIR_RECV)
+        rf.clock = air.clock.time
+        rf.sleep = air.clock.advance
+
+        if ctx.opt.rate:
+            mode |= eval("RATE_%s" % ctx.opt.rate.upper())
+        rf.reset(mode | MODE_ESB, freq=freq)
+        rf.RF_CH = ctx.opt.freq - 2400
+        ret.append(rf)
+
+    tx, rx = ret
+    tx.TX_ADDR = tx.RX_ADDR_P0 = ADDR
+    rx.RX_ADDR_P0 = 0
+    rx.RX_ADDR_P1 = ADDR
+    return air, tx, rx
+
+def messages(ctx):
+    rnd = random.Random(ctx.opt.seed)
+    for i in range(ctx.opt.number):
+        yield bytes(bytearray(rnd.randint(0, 255) for j in range(ctx.opt.size)))
+
+def run_stopwait(ctx, air, tx, rx):
+    got = [0]
+    def drain():
+        for pipe, data, ts in rx.recv_stream(timeout=0):
+            got[0] += len(data)
+    tx.spi.hook = drain
+
+    for msg in messages(ctx):
+        for off in range(0, len(msg), 32):
+            while not tx.FIFO_STATUS.TX_EMPTY:
+                tx.flush()
+                if tx.STATUS.MAX_RT:
+                    tx.FLUSH_TX()
+            tx.send(msg[off:off + 32])
+    air.clock.advance(0.01)
+    drain()
+    return got[0], None
+
+def run_transport(ctx, air, tx, rx):
+    ack_payload = ctx.opt.method == 'ackpay'
+    sender = nRF24Sender(tx, window=ctx.opt.window, ack_payload=ack_payload)
+    receiver = nRF24Receiver(rx, ack_payload=ack_payload)
+
+    tx.spi.hook = receiver.poll
+
+    sent = list(messages(ctx))
+    for msg in sent:
+        sender.write(msg)
+    sender.flush()
+    air.clock.advance(0.01)
+    receiver.poll()
+
+    got = list(receiver.messages)
+    if got != sent:
+        log.error("received %d of %d messages intact",
+                  sum(a == b for a, b in zip(got, sent)), len(sent))
+    print("sender:   {0}".format(sender.stats()))
+    print("receiver: {0}".format(receiver.stat))
+    return sum(len(m) for m in got), sender.stats()
+
+def main(ctx):
+    air, tx, rx = make_pair(ctx)
+    x0 = tx.spi.chip.nr_xfer
+
+    v0, t0 = air.clock.now, time.time()
+    if ctx.opt.method == 'stopwait':
+        got, stat = run_stopwait(ctx, air, tx, rx)
+    else:
+        got, stat = run_transport(ctx, air, tx, rx)
+    vt, dt = air.clock.now - v0, time.time() - t0
+    xfer = tx.spi.chip.nr_xfer - x0
+
+    total = ctx.opt.number * ctx.opt.size
+    print("air:      {0}".format(air.stats))
+    print("{0}: {1}/{2} bytes in {3:.3f}[s], goodput {4:.1f} B/s, "
+          "{5:.2f} SPI transactions per 32B, wall {6:.3f}[s]".format(
+              ctx.opt.method, got, total, vt, got / vt,
+              xfer * 32.0 / max(got, 1), dt))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-M', '--method', default='ackpay')
+    ap.add_argument('-n', '--number', type=int, default=20)
+    ap.add_argument('-s', '--size', type=int, default=1000)
+    ap.add_argument('-w', '--window', type=int, default=32)
+    ap.add_argument('-r', '--rate')
+    ap.add_argument('-f', '--freq', type=int, default=2405)
+    ap.add_argument('-l', '--loss', type=float, default=0.0)
+    ap.add_argument('-L', '--latency', type=float, default=1e-3)
+    ap.add_argument('-F', '--spi-freq', type=int, default=100000)
+    ap.add_argument('-S', '--seed', type=int, default=0)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
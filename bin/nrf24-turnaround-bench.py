@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Benchmark request/response latency of half-duplex nRF24 link.
+
+Poller radio sends request, turns around to RX and waits for reply
+from responder radio, which echoes each request back. Both run on
+modeled air (ucdev.nrf24sim) in their own thread, with -L latency on
+each SPI/GPIO access as USB round trip (see nrf24-group-bench.py).
+
+Poller does -n exchanges in each of two ways:
+
+- naive: as nrf24-chat.py used to, set_mode(DIR_SEND) with CE toggle
+  and live CONFIG read, send() and set_mode(DIR_RECV), then polls
+  recv() for reply, with no shadow cache
+- turnaround: nRF24.send_then_listen(), without shadow cache, with
+  pipe configuration and TX timeout read once beforehand
+- cached: nRF24.send_then_listen(), with shadow cache
+
+Reports round trip time, and SPI transactions and CE writes done by
+poller per exchange. Responder retransmits reply every -d ARD
+(x250us), up to -a ARC times, until poller gets back to RX mode.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import threading
+
+from argparse import ArgumentParser
+from ucdev.common import WallClock, GPIOPin
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+
+import logging
+log = logging.getLogger(__name__)
+
+ADDR = 0xE7E7E7E7E7
+
+class CountingPin(GPIOPin):
+    def __init__(self, port, nr):
+        GPIOPin.__init__(self, port, nr)
+        self.writes = 0
+
+    def set(self, val):
+        self.writes += 1
+        return GPIOPin.set(self, val)
+
+def make_radio(ctx, air, cache):
+    chip = nRF24Sim(air, latency=ctx.opt.latency, gpio_latency=ctx.opt.latency)
+    rf = nRF24(chip, CE=CountingPin(chip, PIN_CE), IRQ=chip.pin(PIN_IRQ),
+               cache=cache)
+    rf.clock = air.clock.time
+    rf.sleep = air.clock.advance
+    rf.reset(MODE_ESB | DIR_RECV, freq=ctx.opt.spi_freq)
+    # both receive on pipe 0, as it gets ACK for TX_ADDR
+    rf.TX_ADDR = rf.RX_ADDR_P0 = ADDR
+    rf.RX_PW_P0 = 32
+    rf.RF_CH = ctx.opt.channel
+    return rf
+
+# set_mode() of earlier version
+def naive_set_mode(rf, mode):
+    rf.CE = 0
+    rf.CONFIG.PRIM_RX = 1 if (mode & DIR_MASK) == DIR_RECV else 0
+    rf.CE = 1
+
+def naive(rf, data, timeout, **kw):
+    naive_set_mode(rf, DIR_SEND)
+    rf.send(data)
+    naive_set_mode(rf, DIR_RECV)
+
+    t0 = rf.clock()
+    while rf.clock() - t0 < timeout:
+        rc, buf = rf.recv()
+        if rc and rc.RX_DR and buf:
+            return buf
+
+def turnaround(rf, data, timeout, **kw):
+    ret = rf.send_then_listen(data, timeout, **kw)
+    if ret:
+        return ret[1]
+
+# echoes each request, which may arrive while listening after reply
+def responder(rf, running):
+    rf.set_mode(DIR_RECV)
+    while running:
+        ret = next(rf.recv_stream(timeout=0.1, min_wait=0, max_wait=0), None)
+        while ret:
+            ret = rf.send_then_listen(bytes(ret[1]), timeout=0)
+
+def run(ctx, func, cache):
+    air = nRF24Air(clock=WallClock(), loss=ctx.opt.loss, seed=ctx.opt.seed)
+    rf = make_radio(ctx, air, cache)
+    kw = {}
+    if func == turnaround and not cache:
+        kw = dict(width=rf.rx_widths(), tx_time=rf.tx_timeout())
+    peer = make_radio(ctx, air, True)
+    peer.SETUP_RETR = SETUP_RETR(ARD=ctx.opt.ard, ARC=ctx.opt.arc)
+
+    running = [True]
+    th = threading.Thread(target=responder, args=(peer, running))
+    th.daemon = True
+    th.start()
+
+    rf.CE = 1
+    chip = rf.spi
+    xfer0, gpio0 = chip.nr_xfer, rf._nRF24__ce.writes
+    ok = 0
+    t0 = time.time()
+    for i in range(ctx.opt.number):
+        data = ("%08d" % i).ljust(32, "X").encode()
+        ret = func(rf, data, ctx.opt.timeout, **kw)
+        ok += ret is not None and bytes(ret) == data
+    dt = time.time() - t0
+
+    nr = ctx.opt.number
+    xfer = (chip.nr_xfer - xfer0) / float(nr)
+    gpio = (rf._nRF24__ce.writes - gpio0) / float(nr)
+
+    running.pop()
+    th.join()
+    return ok, dt / nr, xfer, gpio
+
+def main(ctx):
+    for name, func, cache in (("naive", naive, False),
+                              ("turnaround", turnaround, False),
+                              ("cached", turnaround, True)):
+        ok, rtt, xfer, gpio = run(ctx, func, cache)
+        print("{0:>10}: {1}/{2} replies, {3:.2f}[ms] per exchange, "
+              "{4:.1f} SPI + {5:.1f} CE writes".format(
+                  name, ok, ctx.opt.number, rtt * 1e3, xfer, gpio))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=100)
+    ap.add_argument('-c', '--channel', type=int, default=10)
+    ap.add_argument('-l', '--loss', type=float, default=0.0)
+    ap.add_argument('-L', '--latency', type=float, default=1e-3)
+    ap.add_argument('-F', '--spi-freq', type=int, default=1000000)
+    ap.add_argument('-d', '--ard', type=int, default=15)
+    ap.add_argument('-a', '--arc', type=int, default=15)
+    ap.add_argument('-t', '--timeout', type=float, default=0.05)
+    ap.add_argument('-S', '--seed', type=int, default=0)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
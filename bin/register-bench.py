@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark register value engines.
+
+Compares per-operation cost of bitstring-based ucdev.register and
+int-based ucdev.intregister. No hardware is needed.
+
+ucdev.register only works with bitstring 3.x (pip install
+'ucdev[bench]' or 'bitstring<4'), and is skipped with newer bitstring.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+from argparse import ArgumentParser
+
+import logging
+log = logging.getLogger(__name__)
+
+DESC = ": MASK_RX_DR MASK_TX_DS MASK_MAX_RT EN_CRC CRCO PWR_UP PRIM_RX"
+
+CASES = [
+    ("define",    "Register(DESC, 0x00)"),
+    ("create",    "REG(0x0E)"),
+    ("decode",    "REG(buf)"),
+    ("encode",    "reg.tobytes() if hasattr(reg, 'tobytes') else reg.value.bytes"),
+    ("field-get", "reg.PRIM_RX"),
+    ("field-set", "reg.PRIM_RX = 1"),
+    ("kw-create", "REG(PWR_UP=1, EN_CRC=1, PRIM_RX=1)"),
+]
+
+def bench(ctx, modname):
+    setup = "\n".join([
+        "from {0} import Register".format(modname),
+        "DESC = {0!r}".format(DESC),
+        "REG = Register(DESC, 0x00)",
+        "reg = REG(0x0E)",
+        "buf = bytearray(b'\\x0e')",
+    ])
+
+    ret = {}
+    for name, stmt in CASES:
+        nr = ctx.opt.number if name != "define" else ctx.opt.number // 10
+        sec = min(timeit.repeat(stmt, setup, number=nr, repeat=ctx.opt.repeat))
+        ret[name] = sec / nr * 1e6
+    return ret
+
+# ucdev.register breaks on bitstring 4.0 and later
+def bitstring_version():
+    try:
+        import bitstring
+    except ImportError:
+        return None
+    return tuple(int(i) for i in bitstring.__version__.split(".")[:2])
+
+def main(ctx):
+    result = {}
+    for modname in ("ucdev.register", "ucdev.intregister"):
+        ver = bitstring_version()
+        if modname == "ucdev.register" and ver and ver >= (4, 0):
+            log.warning("{0}: skipped (needs bitstring<4, found {1}.{2})".format(
+                modname, *ver))
+            continue
+        try:
+            result[modname] = bench(ctx, modname)
+        except ImportError as e:
+            log.warning("{0}: skipped ({1})".format(modname, e))
+
+    names = sorted(result)
+    print("{0:12s}".format("[usec/op]") +
+          "".join("{0:>20s}".format(i) for i in names))
+    for name, stmt in CASES:
+        print("{0:12s}".format(name) +
+              "".join("{0:20.3f}".format(result[i][name]) for i in names))
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-n', '--number', type=int, default=10000)
+    ap.add_argument('-r', '--repeat', type=int, default=3)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    main(ctx)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Soak test for register class generation.
+
+Repeats register reads the same way nRF24 does (decode raw SPI response
+into a live register value with writeback hook), and checks that neither
+number of classes nor memory usage grows over time. No hardware is needed.
+
+Register engine is given by -e, as short name ('register' for
+bitstring-based ucdev.register, 'intregister' for int-based
+ucdev.intregister, or 'bitstring' and 'int' as aliases) or module path.
+Exits with non-zero status if class count grows after warmup.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import gc
+import time
+import resource
+import importlib
+
+from argparse import ArgumentParser
+
+import logging
+log = logging.getLogger(__name__)
+
+ENGINES = {
+    'register': 'ucdev.register',
+    'bitstring': 'ucdev.register',
+    'intregister': 'ucdev.intregister',
+    'int': 'ucdev.intregister',
+}
+
+def count_classes():
+    return sum(1 for i in gc.get_objects() if isinstance(i, type))
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def main(ctx):
+    mod = importlib.import_module(ENGINES.get(ctx.opt.engine, ctx.opt.engine))
+    Register = mod.Register
+
+    STATUS = Register(": RX_DR TX_DS MAX_RT RX_P_NO:3 TX_FULL", 0x07)
+    CONFIG = Register(": MASK_RX_DR MASK_TX_DS MASK_MAX_RT EN_CRC CRCO PWR_UP PRIM_RX", 0x00)
+    RX_PW_P1 = Register(":2 RX_PW_P1:6", 0x12)
+    regs = [STATUS, CONFIG, RX_PW_P1]
+    buf = bytearray(b'\x0e')
+    hook = lambda v: None
+
+    # warmup: classes are generated on first use of each register
+    for reg in regs:
+        reg(buf)
+
+    step = ctx.opt.number // ctx.opt.samples
+    base = None
+    ret = 0
+    t0 = time.time()
+
+    print("{0:>10s} {1:>10s} {2:>10s} {3:>10s}".format(
+        "reads", "classes", "objects", "maxrss"))
+    for n in range(ctx.opt.number + 1):
+        # same as nRF24 live register read
+        reg = regs[n % len(regs)](buf)
+        reg.subscribe(hook)
+
+        # redefinition must not create a new class either
+        if n % 1000 == 0:
+            Register(": RX_DR TX_DS MAX_RT RX_P_NO:3 TX_FULL", 0x07)
+
+        if n % step == 0:
+            gc.collect()
+            stat = (n, count_classes(), len(gc.get_objects()), max_rss())
+            print("{0:10d} {1:10d} {2:10d} {3:10d}".format(*stat))
+            if base is None:
+                base = stat
+            elif stat[1] != base[1]:
+                ret = 1
+
+    dt = time.time() - t0
+    print("{0} reads in {1:.1f}[s], {2:.0f} reads/s".format(
+        ctx.opt.number, dt, ctx.opt.number / dt))
+    if ret:
+        log.error("class count grew from {0} to {1}".format(base[1], stat[1]))
+    return ret
+
+if __name__ == '__main__' and '__file__' in globals():
+    ap = ArgumentParser()
+    ap.add_argument('-D', '--debug', default='INFO')
+    ap.add_argument('-e', '--engine', default='intregister',
+                    help="register, intregister (default), bitstring, int, "
+                    "or module path")
+    ap.add_argument('-n', '--number', type=int, default=2000000)
+    ap.add_argument('-s', '--samples', type=int, default=10)
+    ap.add_argument('args', nargs='*')
+
+    # parse args
+    ctx = lambda:0
+    ctx.opt = ap.parse_args()
+
+    # setup logger
+    logging.basicConfig(level=eval('logging.' + ctx.opt.debug))
+
+    sys.exit(main(ctx))
@@ -8,7 +8,9 @@ setup(name='ucdev',
       author='Taisuke Yamada',
       author_email='tai@remove-if-not-spam.rakugaki.org',
       license='MIT',
-      packages=['ucdev'],
+      packages=['ucdev', 'ucdev.cy7c65211'],
+      setup_requires=['cffi>=1.0.0'],
+      cffi_modules=['ucdev/cy7c65211/build.py:ffibuilder'],
       classifiers=[
           'License :: OSI Approved :: MIT License',
           'Intended Audience :: Developers',
@@ -22,6 +24,11 @@ setup(name='ucdev',
       install_requires=[
           'bitstring',
           'cffi',
-          'IPython',
-      ]
+      ],
+      extras_require={
+          'shell': ['IPython'],
+          'scan': ['numpy'],
+          'stream': ['numpy'],
+          'bench': ['bitstring<4'],
+      }
 )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8-unix -*-
+"""Tests of RegisterDevice.batch() over simulated nRF24L01+."""
+
+import unittest
+
+from ucdev.nrf24 import *
+from ucdev.nrf24sim import *
+
+class Error(Exception):
+    pass
+
+def open_radio():
+    chip = nRF24Sim(nRF24Air())
+    rf = nRF24(chip, CE=chip.pin(PIN_CE), cache=True)
+    rf.RF_CH = 2
+    rf.SETUP_RETR = 0x03
+    return chip, rf
+
+class BatchTest(unittest.TestCase):
+    def check_shadow(self, chip, rf):
+        for reg in (RF_CH, SETUP_RETR):
+            self.assertEqual(rf.get_reg(reg).uint, chip.regs[reg])
+
+    def test_flush(self):
+        chip, rf = open_radio()
+        with rf.batch():
+            rf.RF_CH = 10
+            rf.SETUP_RETR.ARC = 5
+            self.assertEqual(chip.regs[RF_CH], 2)
+        self.assertEqual(chip.regs[RF_CH], 10)
+        self.assertEqual(chip.regs[SETUP_RETR], 0x05)
+        self.check_shadow(chip, rf)
+
+    def test_discard(self):
+        chip, rf = open_radio()
+        def update():
+            with rf.batch():
+                rf.RF_CH = 10
+                with rf.batch():
+                    rf.SETUP_RETR.ARC = 5
+                raise Error()
+        self.assertRaises(Error, update)
+        self.assertEqual(chip.regs[RF_CH], 2)
+        self.assertEqual(chip.regs[SETUP_RETR], 0x03)
+        self.check_shadow(chip, rf)
+
+        # not left in batch mode
+        rf.RF_CH = 20
+        self.assertEqual(chip.regs[RF_CH], 20)
+
+    def test_nested_discard(self):
+        chip, rf = open_radio()
+        with rf.batch():
+            rf.RF_CH = 10
+            try:
+                with rf.batch():
+                    rf.RF_CH = 30
+                    rf.SETUP_RETR.ARC = 5
+                    raise Error()
+            except Error:
+                pass
+            self.assertEqual(rf.RF_CH.uint, 10)
+        self.assertEqual(chip.regs[RF_CH], 10)
+        self.assertEqual(chip.regs[SETUP_RETR], 0x03)
+        self.check_shadow(chip, rf)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8-unix -*-
+"""Tests of CyI2C/CySPI over simulated libcyusbserial backend."""
+
+import io
+import unittest
+
+from ucdev.cy7c65211 import CyUSBSerial, CyI2C, CySPI
+from ucdev.cy7c65211.sim import CySim, LoopbackSPI, I2CRegisterSlave
+from ucdev.trace import *
+from ucdev import trace
+
+def open_sim():
+    sim = CySim()
+    sdev = sim.add_device()
+    sdev.spi = LoopbackSPI()
+    sdev.attach_i2c(0x68, I2CRegisterSlave())
+    dev = next(CyUSBSerial(lib=sim).find())
+    dev.trace = Tracer()
+    return sim, dev
+
+def dumped(dev):
+    buf = io.BytesIO()
+    dev.trace.dump(buf)
+    buf.seek(0)
+    return list(trace.load(buf))
+
+class TraceErrorTest(unittest.TestCase):
+    def test_i2c_read_nak(self):
+        sim, dev = open_sim()
+        i2c = CyI2C(dev)
+        cfg = i2c.prepare(slaveAddress=0x1e)
+        self.assertRaises(Exception, i2c.read_into, cfg, 6)
+
+        recs = dumped(dev)
+        self.assertEqual(len(recs), 1)
+        ts, dt, bus, dir, addr, rc, nr, data = recs[0]
+        self.assertEqual((bus, dir, addr), (BUS_I2C, DIR_READ, 0x1e))
+        self.assertEqual(rc, dev.CY_ERROR_I2C_NAK_ERROR)
+
+    def test_i2c_write_nak(self):
+        sim, dev = open_sim()
+        i2c = CyI2C(dev)
+        cfg = i2c.prepare(slaveAddress=0x1e)
+        self.assertRaises(Exception, i2c.write, cfg, b"\x00\x01")
+
+        recs = dumped(dev)
+        self.assertEqual(len(recs), 1)
+        ts, dt, bus, dir, addr, rc, nr, data = recs[0]
+        self.assertEqual((bus, dir, addr), (BUS_I2C, DIR_WRITE, 0x1e))
+        self.assertEqual(rc, dev.CY_ERROR_I2C_NAK_ERROR)
+        self.assertEqual(data, b"\x00\x01")
+
+    def test_no_raise(self):
+        sim, dev = open_sim()
+        dev.raise_on_error = False
+        i2c = CyI2C(dev)
+        cfg = i2c.prepare(slaveAddress=0x1e)
+        self.assertEqual(len(i2c.read_into(cfg, 6)), 0)
+        self.assertEqual(dumped(dev)[0][5], dev.CY_ERROR_I2C_NAK_ERROR)
+
+    def test_success(self):
+        sim, dev = open_sim()
+        i2c = CyI2C(dev)
+        cfg = i2c.prepare(slaveAddress=0x68)
+        self.assertEqual(bytes(i2c.transfer(cfg, b"\x00", 2)), b"\x00\x00")
+        self.assertEqual([r[5] for r in dumped(dev)],
+                         [dev.CY_SUCCESS, dev.CY_SUCCESS])
+
+class SendIntoTest(unittest.TestCase):
+    def check_short(self, size):
+        sim, dev = open_sim()
+        spi = CySPI(dev)
+        data = bytes(bytearray(range(256))) * (size // 256 + 1)
+        out = bytearray(size)
+        self.assertRaises(ValueError, spi.send_into, data, out)
+        self.assertEqual(out, bytearray(size))
+
+    def test_short(self):
+        self.check_short(16)
+
+    def test_short_large(self):
+        self.check_short(4096)
+
+    def test_exact(self):
+        sim, dev = open_sim()
+        spi = CySPI(dev)
+        data = bytes(bytearray(range(256))) * 16
+        out = bytearray(len(data))
+        self.assertEqual(bytes(spi.send_into(data, out)), data)
+        self.assertEqual(bytes(out), data)
+
+    def test_no_alias(self):
+        sim, dev = open_sim()
+        spi = CySPI(dev)
+        first = spi.send_into(b"\x01\x02\x03")
+        spi.send_into(b"\xff\xff\xff")
+        self.assertEqual(bytes(first), b"\x01\x02\x03")
+
+        i2c = CyI2C(dev)
+        cfg = i2c.prepare(slaveAddress=0x68)
+        i2c.write(cfg, b"\x00\x11\x22")
+        first = i2c.transfer(cfg, b"\x00", 2)
+        i2c.write(cfg, b"\x00\x33\x44")
+        self.assertEqual(bytes(first), b"\x11\x22")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,80 @@
 # -*- coding: utf-8-unix -*-
 
+import time
+
+from contextlib import contextmanager
+from collections import OrderedDict
+
+"""
+Generic class to wrap built-in types with custom attributes.
+"""
+class Value(object):
+    def __new__(cls, arg, **kw):
+        return type(cls.__name__, (type(arg), cls, ), kw)(arg)
+
+"""
+Base class for devices exposing registers as attributes.
+
+Subclass provides get_reg(reg) and set_reg(reg, value) to access
+actual device register. Live register instances read and write back
+through load_reg()/store_reg(), so that writebacks can be deferred by
+batch() context:
+
+  with dev.batch():
+      dev.CONFIG.PRIM_RX = 1
+      dev.CONFIG.PWR_UP = 1
+      dev.RF_CH = 10
+
+Above reads CONFIG once, and issues one write for CONFIG and RF_CH
+each on exit, in the order registers were first updated. If exception
+is raised inside the context, pending writes are discarded, and
+nothing is written. Nested batch is merged into outermost one, and
+exception raised (and caught) inside nested batch discards only
+writes pending since it was entered.
+"""
+class RegisterDevice(object):
+    __pending = None
+
+    @contextmanager
+    def batch(self):
+        pending = self.__pending
+        if pending is not None:
+            saved = list(pending.items())
+            done = False
+            try:
+                yield self
+                done = True
+            finally:
+                if not done:
+                    pending.clear()
+                    pending.update(saved)
+            return
+
+        self.__pending = pending = OrderedDict()
+        try:
+            yield self
+        finally:
+            self.__pending = None
+
+        if pending:
+            self.flush_batch(list(pending.items()))
+
+    def flush_batch(self, items):
+        for reg, val in items:
+            self.set_reg(reg, val)
+
+    def load_reg(self, reg):
+        pending = self.__pending
+        if pending is not None and reg in pending:
+            return reg(pending[reg])
+        return self.get_reg(reg)
+
+    def store_reg(self, reg, val):
+        pending = self.__pending
+        if pending is None:
+            return self.set_reg(reg, val)
+        pending[reg] = reg(val).uint
+
 class SPI(object):
     pass
 
@@ -20,3 +95,44 @@ class GPIOPin(object):
 
     def set(self, val):
         return self.port.set(self.nr, val)
+
+"""
+Virtual clock shared by simulated devices.
+
+Time only advances by advance() calls, so simulation is deterministic.
+With realtime=True, advance() also sleeps for the given time.
+"""
+class SimClock(object):
+    def __init__(self, realtime=False):
+        self.now = 0.0
+        self.realtime = realtime
+
+    def time(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+        if self.realtime:
+            time.sleep(dt)
+
+"""
+Clock of real time, with the same interface as SimClock.
+
+Unlike SimClock(realtime=True), which adds up all advance() calls,
+time is taken from host, so simulated devices can be driven by
+several threads in parallel, each waiting for its own transfers.
+"""
+class WallClock(object):
+    def __init__(self):
+        self.t0 = time.time()
+
+    @property
+    def now(self):
+        return time.time() - self.t0
+
+    def time(self):
+        return self.now
+
+    def advance(self, dt):
+        if dt > 0:
+            time.sleep(dt)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8-unix -*-
+"""
+Builds out-of-line cffi module for the Cypress header.
+
+This generates ucdev.cy7c65211._cyusbserial module holding an ffi
+object with header already parsed, so CyUSBSerial can load the
+library without parsing the header at runtime. It is run by setup.py
+through cffi_modules, or manually with
+
+  python ucdev/cy7c65211/build.py
+
+from the top of the source tree.
+
+"""
+
+import os, sys
+from cffi import FFI
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from header import src as cdef_src
+
+ffibuilder = FFI()
+ffibuilder.cdef(cdef_src)
+
+# ABI mode: library itself is still loaded by dlopen() at runtime
+ffibuilder.set_source("ucdev.cy7c65211._cyusbserial", None)
+
+if __name__ == "__main__":
+    ffibuilder.compile(verbose=True)
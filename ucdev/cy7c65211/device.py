@@ -1,27 +1,87 @@
 # -*- coding: utf-8-unix -*-
 
 import sys, os
+import re
 import platform
 
+from functools import partial
+from collections import OrderedDict
+
 from cffi import FFI
 from ucdev.common import GPIO, SPI, I2C
+from ucdev.trace import BUS_SPI, BUS_I2C, DIR_WRITE, DIR_READ
 
 from .header import src as cdef_src
 
 import logging
 log = logging.getLogger(__name__)
 
+# API functions taking device handle as a first argument
+HANDLE_FUNCS = re.findall(r'CY_RETURN_STATUS\s+(Cy\w+)\s*\(\s*CY_HANDLE\b', cdef_src)
+
+"""
+Returns API symbol, or None if not found in the library.
+"""
+def get_symbol(ffi, api, key):
+    try:
+        return getattr(api, key)
+    except (AttributeError, getattr(ffi, 'error', AttributeError)):
+        # not all functions exist on all platforms
+        return None
+
+"""
+Builds dispatch table of the library.
+
+Returns dict of API functions taking device handle, and dict of
+return code to its symbol name.
+"""
+def load_api(ffi, api):
+    funcs = OrderedDict()
+    for name in HANDLE_FUNCS:
+        func = get_symbol(ffi, api, name)
+        if func:
+            funcs[name] = func
+
+    errors = dict(ffi.typeof("CY_RETURN_STATUS").elements)
+    return funcs, errors
+
+"""
+Returns ffi object with the header loaded.
+
+Uses prebuilt out-of-line module if installed (see build.py), and
+falls back to parsing the header at runtime.
+"""
+def load_ffi():
+    try:
+        from ._cyusbserial import ffi
+    except ImportError:
+        ffi = FFI()
+        ffi.cdef(cdef_src)
+    return ffi
+
+"""
+Loads libcyusbserial. One instance is created per library.
+
+lib is a path or name of the shared library, or an object providing
+dlopen(ffi) which returns API namespace in place of the library
+(see ucdev.cy7c65211.sim).
+"""
 class CyUSBSerial(object):
-    __self = None
+    __libs = {}
 
     def __new__(cls, lib=None, ffi=None):
-        if not cls.__self:
+        if lib not in cls.__libs:
             if not ffi:
-                ffi = FFI()
+                ffi = load_ffi()
+            else:
+                ffi.cdef(cdef_src)
             obj = super(CyUSBSerial, cls).__new__(cls)
             obj.ffi = ffi
-            obj.ffi.cdef(cdef_src)
-            obj.api = ffi.dlopen(lib if lib else "cyusbserial")
+            if hasattr(lib, 'dlopen'):
+                obj.api = lib.dlopen(ffi)
+            else:
+                obj.api = ffi.dlopen(lib if lib else "cyusbserial")
+            obj.funcs, obj.errors = load_api(ffi, obj.api)
 
             # initialize if API exists
             if hasattr(obj.api, 'CyLibraryInit'):
@@ -29,8 +89,8 @@ class CyUSBSerial(object):
                 if rc != obj.api.CY_SUCCESS:
                     raise Exception("ERROR: CyLibraryInit=%d" % rc)
 
-            cls.__self = obj
-        return cls.__self
+            cls.__libs[lib] = obj
+        return cls.__libs[lib]
 
     def __del__(self):
         # finalize if API exists
@@ -67,6 +127,55 @@ class CyUSBSerial(object):
 
 ######################################################################
 
+class CyBufferPool(object):
+    """Reusable transfer buffers for a device.
+
+    Buffers are allocated in power-of-two size classes with cffi type
+    objects looked up only once, and returned to the pool after each
+    transfer. So steady-state transfers allocate nothing.
+    """
+    MIN_SIZE = 64
+
+    def __init__(self, ffi):
+        self.ffi = ffi
+        self.t_buf = ffi.typeof("UCHAR[]")
+        self.t_ptr = ffi.typeof("UCHAR *")
+        self.t_cdb = ffi.typeof("CY_DATA_BUFFER *")
+        self.free = {}
+        self.allocated = 0
+
+    def get(self, length):
+        size = self.MIN_SIZE
+        while size < length:
+            size <<= 1
+
+        try:
+            buf, cdb = self.free[size].pop()
+        except (KeyError, IndexError):
+            buf = self.ffi.new(self.t_buf, size)
+            cdb = self.ffi.new(self.t_cdb, (buf, size, 0))
+            self.allocated += 1
+
+        cdb.length = length
+        cdb.transferCount = 0
+        return buf, cdb
+
+    def put(self, buf, cdb):
+        cdb.buffer = buf
+        self.free.setdefault(len(buf), []).append((buf, cdb))
+
+    def wrap(self, cdb, data):
+        """Points cdb to given writable buffer object without copying.
+
+        Returned object must be kept alive while cdb is in use, and cdb
+        points back to its own buffer once returned by put().
+        """
+        ref = self.ffi.from_buffer(data)
+        cdb.buffer = self.ffi.cast(self.t_ptr, ref)
+        return ref
+
+######################################################################
+
 class CyUSBSerialDevice(object):
     def __init__(self, lib, devno, ifnum):
         self.lib   = lib
@@ -75,53 +184,91 @@ class CyUSBSerialDevice(object):
         self.dev   = None
 
         self.raise_on_error = True
+        self.__raw = None
 
         # import API symbols from the library
         dummy = self.CY_SUCCESS
-        self.__dict__.update(lib.api.__dict__)
-
-    # delegate API calls to the library
-    def __getattr__(self, key):
-        lib, api = self.lib, self.lib.api
-        val = getattr(api, key)
+        for key in dir(lib.api):
+            if key.startswith('_'):
+                continue
+            val = get_symbol(lib.ffi, lib.api, key)
+            if val is not None:
+                self.__dict__.setdefault(key, val)
 
         # wrap API so device handle is handled automatically
-        if callable(val):
-            def wrap(self, name, func):
-                def wrapper(*args, **kwargs):
-                    # automatically open handle on first call
-                    if not self.dev:
-                        self.open()
+        for name, func in lib.funcs.items():
+            setattr(self, name, self.__wrap(name, func))
+
+        # transfer buffers reused by CySPI/CyI2C
+        self.pool = CyBufferPool(lib.ffi)
+
+        # transfer tracer (see ucdev.trace), disabled if None
+        self.trace = None
 
-                    # delegate API call
-                    rc = func(self.dev, *args, **kwargs)
+    def __wrap(self, name, func):
+        success = self.lib.api.CY_SUCCESS
+        reopen  = name in ('CyCyclePort', 'CyResetDevice')
 
-                    if self.raise_on_error and rc != api.CY_SUCCESS:
-                        sym = self.err_to_sym(rc)
-                        msg = "ERROR: {0}={1}, {2}".format(name, rc, sym)
-                        raise Exception(msg)
+        def wrapper(*args):
+            # automatically open handle on first call
+            dev = self.dev
+            if not dev:
+                self.open()
+                dev = self.dev
 
-                    # invalidate handle to force reopen on next call
-                    elif name in ('CyCyclePort', 'CyResetDevice'):
-                        self.dev = None
+            # delegate API call
+            rc = func(dev, *args)
 
-                    return rc
-                return wrapper
-            val = wrap(self, key, val)
+            if rc != success and self.raise_on_error:
+                self.check(name, rc)
+
+            # invalidate handle to force reopen on next call
+            elif reopen:
+                self.dev = None
+
+            return rc
+        return wrapper
+
+    def check(self, name, rc):
+        """Raises on error code returned by API name, as wrapped API
+        does, unless raise_on_error is False."""
+        if rc != self.lib.api.CY_SUCCESS and self.raise_on_error:
+            sym = self.err_to_sym(rc)
+            msg = "ERROR: {0}={1}, {2}".format(name, rc, sym)
+            raise Exception(msg)
+
+    # delegate other symbols to the library
+    def __getattr__(self, key):
+        val = getattr(self.lib.api, key)
 
         # save as local attribute to help ipython completion
         setattr(self, key, val)
 
         return val
 
+    #
+    # API functions bound to current device handle, with no auto-open
+    # or return code check. For use in hot loops:
+    #
+    #   raw = dev.raw
+    #   while True:
+    #       rc = raw.CySpiReadWrite(rcdb, wcdb, 1000)
+    #
+    # Fetch again if handle is reopened (e.g. after CyCyclePort).
+    #
+    @property
+    def raw(self):
+        if not self.dev:
+            self.open()
+        if not self.__raw or self.__raw.handle != self.dev:
+            self.__raw = CyRawAPI(self.lib.funcs, self.dev)
+        return self.__raw
+
     def __del__(self, *args):
         self.close()
 
     def err_to_sym(self, rc):
-        for k, v in vars(self.lib.api).items():
-            if k.startswith("CY_ERROR") and v == rc:
-                return k
-        return "UNKNOWN"
+        return self.lib.errors.get(rc, "UNKNOWN")
 
     def open(self):
         lib, ffi, api = self.lib, self.lib.ffi, self.lib.api
@@ -138,6 +285,12 @@ class CyUSBSerialDevice(object):
             api.CyClose(self.dev)
             self.dev = None
 
+class CyRawAPI(object):
+    def __init__(self, funcs, handle):
+        self.handle = handle
+        for name, func in funcs.items():
+            setattr(self, name, partial(func, handle))
+
 ######################################################################
 
 class CyI2C(SPI):
@@ -147,6 +300,9 @@ class CyI2C(SPI):
             raise Exception(msg)
         self.dev = dev
 
+        # no-STOP copy of data config for each slave, used by transfer()
+        self.__nostop = {}
+
     def set_config(self, config):
         dev = self.dev
         ffi = dev.lib.ffi
@@ -184,36 +340,99 @@ class CyI2C(SPI):
         api = dev.lib.api
 
         rc = dev.CyI2cReset(resetMode)
-        log.debug("rc=%d" % rc)
+        log.debug("rc=%d", rc)
 
     def read(self, cfg, data, timeout=1000):
+        out = bytearray(len(data))
+        rlen = len(self.read_into(cfg, out, timeout=timeout))
+        return out if rlen == len(out) else out[:rlen]
+
+    def read_into(self, cfg, out, timeout=1000):
+        """Reads into given writable buffer without copying, or into
+        new bytearray if length is given instead.
+
+        Returns memoryview of data read.
+        """
         dev = self.dev
         ffi = dev.lib.ffi
-        api = dev.lib.api
+        pool = dev.pool
+
+        if isinstance(out, int):
+            out = bytearray(out)
+        rbuf, rcdb = pool.get(len(out))
+        try:
+            # kept alive until transfer is done
+            ref = pool.wrap(rcdb, out)
 
-        rlen = len(data)
-        rbuf = ffi.new("UCHAR[%d]" % rlen)
-        rcdb = ffi.new("CY_DATA_BUFFER *", (rbuf, rlen, 0))
+            tr = dev.trace
+            if tr:
+                t0 = tr.clock()
 
-        rc = dev.CyI2cRead(cfg, rcdb, timeout)
-        log.debug("r:" + " ".join(["{:08b}".format(i) for i in rbuf]))
+            # raw call, so failed transfer is also traced before raise
+            rc = dev.raw.CyI2cRead(cfg, rcdb, timeout)
+            rlen = rcdb.transferCount
 
-        return bytearray(ffi.buffer(rcdb.buffer, rcdb.transferCount)[0:])
+            if tr:
+                tr.record(BUS_I2C, DIR_READ, cfg.slaveAddress,
+                          ffi.buffer(rcdb.buffer, rlen), rc, t0, tr.clock())
+        finally:
+            pool.put(rbuf, rcdb)
+        dev.check('CyI2cRead', rc)
+
+        return memoryview(out)[:rlen]
 
     def write(self, cfg, data, timeout=1000):
         dev = self.dev
         ffi = dev.lib.ffi
-        api = dev.lib.api
+        pool = dev.pool
 
         wlen = len(data)
-        wbuf = ffi.new("UCHAR[%d]" % wlen, bytes(data))
-        wcdb = ffi.new("CY_DATA_BUFFER *", (wbuf, wlen, 0))
+        wbuf, wcdb = pool.get(wlen)
+        try:
+            ffi.memmove(wbuf, data, wlen)
+
+            tr = dev.trace
+            if tr:
+                t0 = tr.clock()
+
+            rc = dev.raw.CyI2cWrite(cfg, wcdb, timeout)
 
-        log.debug("w:" + " ".join(["{:08b}".format(i) for i in wbuf]))
-        rc = dev.CyI2cWrite(cfg, wcdb, timeout)
+            if tr:
+                tr.record(BUS_I2C, DIR_WRITE, cfg.slaveAddress,
+                          data, rc, t0, tr.clock())
+        finally:
+            pool.put(wbuf, wcdb)
+        dev.check('CyI2cWrite', rc)
 
         return rc
 
+    def transfer(self, cfg, data, length, timeout=1000):
+        """Writes data, then reads length bytes with repeated START,
+        as for register read (write register address, read its value).
+
+        Write is not terminated by STOP, so slave keeps its register
+        pointer for the read. Read ends as set in cfg. No-STOP config
+        for the write is prepared once for each slave address, and
+        transfer buffers come from device pool, so nothing is allocated
+        per call.
+
+        This is a host-side convenience, not a combined transaction:
+        libcyusbserial has no write-read call, so this is still
+        CyI2cWrite() then CyI2cRead(), two USB round trips, with the
+        same latency as write() followed by read_into(). To cut bridge
+        calls per value, read registers in bursts instead.
+
+        Like read_into(), length can also be a writable buffer to read
+        into. Returns memoryview of data read.
+        """
+        wcfg = self.__nostop.get(cfg.slaveAddress)
+        if wcfg is None:
+            wcfg = self.prepare(cfg.slaveAddress, isStopBit=0)
+            self.__nostop[cfg.slaveAddress] = wcfg
+
+        self.write(wcfg, data, timeout)
+        return self.read_into(cfg, length, timeout)
+
 ######################################################################
 
 class CySPI(SPI):
@@ -259,26 +478,55 @@ class CySPI(SPI):
         return ret
 
     def send(self, data, timeout=1000):
+        out = bytearray(len(data))
+        rlen = len(self.send_into(data, out, timeout=timeout))
+        return out if rlen == len(out) else out[:rlen]
+
+    def send_into(self, data, out=None, timeout=1000):
+        """Clocks out data, and stores data clocked in to given writable
+        buffer without copying, or to new bytearray if not given.
+
+        Returns memoryview of data clocked in.
+        """
         dev = self.dev
         ffi = dev.lib.ffi
+        pool = dev.pool
 
         wlen = len(data)
-        wbuf = ffi.new("UCHAR[%d]" % wlen, bytes(data))
-        wcdb = ffi.new("CY_DATA_BUFFER *", (wbuf, wlen, 0))
-
-        rlen = len(data)
-        rbuf = ffi.new("UCHAR[%d]" % rlen)
-        rcdb = ffi.new("CY_DATA_BUFFER *", (rbuf, rlen, 0))
-
-        log.debug("w:" + " ".join(["{:08b}".format(i) for i in wbuf]))
-
-        self.CSN = 1
-        rc = dev.CySpiReadWrite(rcdb, wcdb, timeout)
-        self.CSN = 0
-
-        log.debug("r:" + " ".join(["{:08b}".format(i) for i in rbuf]))
-
-        return bytearray(ffi.buffer(rcdb.buffer, rcdb.transferCount)[0:])
+        if out is None:
+            out = bytearray(wlen)
+        elif len(out) < wlen:
+            raise ValueError("ERROR: Buffer too small: %d < %d" % (len(out), wlen))
+
+        wbuf, wcdb = pool.get(wlen)
+        rbuf, rcdb = pool.get(wlen)
+        try:
+            ffi.memmove(wbuf, data, wlen)
+
+            # kept alive until transfer is done
+            ref = pool.wrap(rcdb, out)
+
+            tr = dev.trace
+            if tr:
+                t0 = tr.clock()
+
+            self.CSN = 1
+            rc = dev.raw.CySpiReadWrite(rcdb, wcdb, timeout)
+            self.CSN = 0
+
+            rlen = rcdb.transferCount
+
+            if tr:
+                t1 = tr.clock()
+                tr.record(BUS_SPI, DIR_WRITE, 0, data, rc, t0, t1)
+                tr.record(BUS_SPI, DIR_READ, 0,
+                          ffi.buffer(rcdb.buffer, rlen), rc, t0, t1)
+        finally:
+            pool.put(wbuf, wcdb)
+            pool.put(rbuf, rcdb)
+        dev.check('CySpiReadWrite', rc)
+
+        return memoryview(out)[:rlen]
 
 ######################################################################
 
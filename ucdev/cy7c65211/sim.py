@@ -0,0 +1,405 @@
+# -*- coding: utf-8-unix -*-
+
+"""
+Simulated libcyusbserial backend.
+
+Implements subset of libcyusbserial API in Python, so that CyUSBSerial
+and drivers on top of it can run without the library or the bridge:
+
+  sim = CySim()
+  dev = sim.add_device()
+  dev.spi = LoopbackSPI()
+  dev.attach_i2c(0x68, I2CRegisterSlave())
+
+  lib = CyUSBSerial(lib=sim)
+  spi = CySPI(next(lib.find()))
+  spi.send(b"\\x01\\x02")
+
+Each API call advances virtual clock (sim.clock) by time estimated
+with USB link model and serial bus clock. Default link model matches
+full-speed USB, where each transaction takes at least one 1ms frame
+and bulk transfer is limited to about 1MB/s. Timing is deterministic,
+so throughput and latency of the driver stack can be measured on any
+host. With CySim(realtime=True), calls also sleep for estimated time.
+
+Slave devices are modeled by objects with following interface:
+
+- SPI: transfer(data) returns bytes clocked in while data is clocked
+  out. Each call is a single chip-select frame.
+- I2C: write(data) and read(length) for each transaction addressed to
+  the slave, and stop() when transaction ends with STOP condition.
+- GPIO input: function returning pin level, attached to a pin by
+  attach_gpio(pin, func), called on each read of the pin.
+"""
+
+import sys, os
+
+from ucdev.common import SimClock
+
+import logging
+log = logging.getLogger(__name__)
+
+# number of GPIO pins on CY7C65211/3/5
+NR_GPIO = 12
+
+"""
+Returns dict of all enum constants defined in the header.
+"""
+def enum_constants(ffi):
+    ret = {}
+    for name in ffi.list_types()[0]:
+        try:
+            t = ffi.typeof(name)
+        except Exception:
+            continue
+        if t.kind == 'enum':
+            for v, k in t.elements.items():
+                ret[k] = v
+    return ret
+
+######################################################################
+
+"""
+USB link timing model.
+
+Time of each API call is estimated as nr * latency + nbytes / bandwidth,
+where nr is number of USB transactions and nbytes is number of bytes
+moved over USB.
+"""
+class USBModel(object):
+    def __init__(self, latency=1e-3, bandwidth=1.0e6):
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def cost(self, nbytes, nr=1):
+        return nr * self.latency + nbytes / float(self.bandwidth)
+
+######################################################################
+
+class SPISlave(object):
+    def transfer(self, data):
+        # nothing drives MISO
+        return bytearray(b"\xff" * len(data))
+
+class LoopbackSPI(SPISlave):
+    def transfer(self, data):
+        return bytearray(data)
+
+class I2CSlave(object):
+    def write(self, data):
+        pass
+
+    def read(self, length):
+        return bytearray(b"\xff" * length)
+
+    def stop(self):
+        pass
+
+"""
+I2C slave with byte-addressed register file.
+
+First byte written selects register, and following bytes are written
+to registers from there. Reads continue from selected register. Address
+auto-increments on each byte. Override read_reg/write_reg to model
+registers with side effects.
+"""
+class I2CRegisterSlave(I2CSlave):
+    def __init__(self, size=256, regs=None):
+        self.regs = bytearray(regs if regs else size)
+        self.ptr = 0
+
+    def read_reg(self, reg):
+        return self.regs[reg]
+
+    def write_reg(self, reg, val):
+        self.regs[reg] = val
+
+    def write(self, data):
+        if not data:
+            return
+        self.ptr = data[0] % len(self.regs)
+        for val in bytearray(data[1:]):
+            self.write_reg(self.ptr, val)
+            self.ptr = (self.ptr + 1) % len(self.regs)
+
+    def read(self, length):
+        ret = bytearray(length)
+        for i in range(length):
+            ret[i] = self.read_reg(self.ptr)
+            self.ptr = (self.ptr + 1) % len(self.regs)
+        return ret
+
+######################################################################
+
+class CySimDevice(object):
+    def __init__(self, sim, vid=0x04b4, pid=0x0004, name=b"USB-Serial (Simulated)"):
+        self.sim = sim
+        self.vid = vid
+        self.pid = pid
+        self.name = name
+
+        self.spi = None
+        self.i2c = {}
+        self.gpio = bytearray(NR_GPIO)
+        self.gpio_watch = []
+        self.gpio_input = {}
+
+        self.spi_config = dict(frequency=1000000, dataWidth=8, protocol=0,
+                               isMsbFirst=True, isMaster=True,
+                               isContinuousMode=False, isSelectPrecede=False,
+                               isCpha=False, isCpol=False)
+        self.i2c_config = dict(frequency=100000, slaveAddress=0x1e,
+                               isMaster=True, isClockStretch=False)
+
+    def attach_i2c(self, addr, slave):
+        self.i2c[addr] = slave
+        return slave
+
+    """
+    Sets GPIO pin, and calls watcher functions with (pin, val) on change.
+    """
+    def set_gpio(self, pin, val):
+        val = 1 if val else 0
+        old, self.gpio[pin] = self.gpio[pin], val
+        if old != val:
+            for func in self.gpio_watch:
+                func(pin, val)
+
+    """
+    Drives GPIO pin by slave, as func() called on each read of the pin.
+    """
+    def attach_gpio(self, pin, func):
+        self.gpio_input[pin] = func
+        return func
+
+    def get_gpio(self, pin):
+        func = self.gpio_input.get(pin)
+        if func:
+            return 1 if func() else 0
+        return self.gpio[pin]
+
+class CySim(object):
+    def __init__(self, usb=None, realtime=False):
+        self.usb = usb if usb else USBModel()
+        self.clock = SimClock(realtime)
+        self.devices = []
+        self.api = None
+
+    def add_device(self, *args, **kwargs):
+        dev = CySimDevice(self, *args, **kwargs)
+        self.devices.append(dev)
+        return dev
+
+    """
+    Advances clock by time taken for USB transfer and serial bus.
+    """
+    def elapse(self, nbytes=0, nr=1, bustime=0):
+        self.clock.advance(self.usb.cost(nbytes, nr) + bustime)
+
+    # called by CyUSBSerial in place of ffi.dlopen()
+    def dlopen(self, ffi):
+        if not self.api:
+            self.api = CySimAPI(self, ffi)
+        return self.api
+
+"""
+API namespace returned by CySim.dlopen().
+
+Only API functions and constants are public here, as CyUSBSerialDevice
+imports all public symbols of the library.
+"""
+class CySimAPI(object):
+    def __init__(self, sim, ffi):
+        self._sim = sim
+        self._ffi = ffi
+        self._handles = {}
+        self._next = 1
+
+        for k, v in enum_constants(ffi).items():
+            setattr(self, k, v)
+
+    def _get(self, handle):
+        return self._handles.get(int(self._ffi.cast("uintptr_t", handle)))
+
+    def _copy(self, cdb, data):
+        nr = min(len(data), cdb.length)
+        self._ffi.memmove(cdb.buffer, bytes(data[:nr]), nr)
+        cdb.transferCount = nr
+
+    def CyLibraryInit(self):
+        return self.CY_SUCCESS
+
+    def CyLibraryExit(self):
+        return self.CY_SUCCESS
+
+    def CyGetListofDevices(self, nr):
+        nr[0] = len(self._sim.devices)
+        return self.CY_SUCCESS
+
+    def CyGetDeviceInfo(self, devno, info):
+        if devno >= len(self._sim.devices):
+            return self.CY_ERROR_DEVICE_NOT_FOUND
+        dev = self._sim.devices[devno]
+
+        info.vidPid.vid = dev.vid
+        info.vidPid.pid = dev.pid
+        info.numInterfaces = 1
+        for key in ('manufacturerName', 'productName', 'deviceFriendlyName'):
+            self._ffi.memmove(getattr(info, key), dev.name, len(dev.name))
+        info.deviceType[0] = self.CY_TYPE_SPI
+        info.deviceClass[0] = self.CY_CLASS_VENDOR
+        info.deviceBlock = self.SerialBlock_SCB0
+        return self.CY_SUCCESS
+
+    def CyOpen(self, devno, ifnum, handle):
+        if devno >= len(self._sim.devices):
+            return self.CY_ERROR_DEVICE_NOT_FOUND
+
+        self._sim.elapse()
+        self._handles[self._next] = self._sim.devices[devno]
+        handle[0] = self._ffi.cast("CY_HANDLE", self._next)
+        self._next += 1
+        return self.CY_SUCCESS
+
+    def CyClose(self, handle):
+        self._handles.pop(int(self._ffi.cast("uintptr_t", handle)), None)
+        return self.CY_SUCCESS
+
+    def CyCyclePort(self, handle):
+        self.CyClose(handle)
+        return self.CY_SUCCESS
+
+    CyResetDevice = CyCyclePort
+
+    def CyGetLibraryVersion(self, handle, ver):
+        ver.majorVersion = 1
+        return self.CY_SUCCESS
+
+    def CyGetFirmwareVersion(self, handle, ver):
+        ver.majorVersion = 1
+        return self.CY_SUCCESS
+
+    def CySetGpioValue(self, handle, pin, val):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        if pin >= NR_GPIO:
+            return self.CY_ERROR_INVALID_PARAMETER
+
+        self._sim.elapse()
+        dev.set_gpio(pin, val)
+        return self.CY_SUCCESS
+
+    def CyGetGpioValue(self, handle, pin, val):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        if pin >= NR_GPIO:
+            return self.CY_ERROR_INVALID_PARAMETER
+
+        self._sim.elapse()
+        val[0] = dev.get_gpio(pin)
+        return self.CY_SUCCESS
+
+    # copy config between dict and config struct
+    def __to_cdata(self, cfg, config):
+        for k, v in self._ffi.typeof(cfg).item.fields:
+            setattr(cfg, k, config[k])
+
+    def __from_cdata(self, cfg, config):
+        for k, v in self._ffi.typeof(cfg).item.fields:
+            config[k] = getattr(cfg, k)
+
+    def CyGetSpiConfig(self, handle, cfg):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        self._sim.elapse()
+        self.__to_cdata(cfg, dev.spi_config)
+        return self.CY_SUCCESS
+
+    def CySetSpiConfig(self, handle, cfg):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        self._sim.elapse()
+        self.__from_cdata(cfg, dev.spi_config)
+        return self.CY_SUCCESS
+
+    def CyGetI2cConfig(self, handle, cfg):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        self._sim.elapse()
+        self.__to_cdata(cfg, dev.i2c_config)
+        return self.CY_SUCCESS
+
+    def CySetI2cConfig(self, handle, cfg):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        self._sim.elapse()
+        self.__from_cdata(cfg, dev.i2c_config)
+        return self.CY_SUCCESS
+
+    def CySpiReadWrite(self, handle, rcdb, wcdb, timeout):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+
+        nr = wcdb.length
+        data = bytearray(self._ffi.buffer(wcdb.buffer, nr))
+        wcdb.transferCount = nr
+
+        ret = (dev.spi or SPISlave()).transfer(data)
+        if rcdb:
+            self._copy(rcdb, ret)
+
+        # data goes both ways over USB
+        bustime = nr * 8.0 / dev.spi_config['frequency']
+        self._sim.elapse(nr * 2, 1, bustime)
+        return self.CY_SUCCESS
+
+    def __i2c_xfer(self, dev, cfg, nr):
+        bustime = (nr + 1) * 9.0 / dev.i2c_config['frequency']
+        self._sim.elapse(nr, 1, bustime)
+
+        return dev.i2c.get(cfg.slaveAddress)
+
+    def CyI2cRead(self, handle, cfg, rcdb, timeout):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+
+        slave = self.__i2c_xfer(dev, cfg, rcdb.length)
+        if not slave:
+            rcdb.transferCount = 0
+            return self.CY_ERROR_I2C_NAK_ERROR
+
+        self._copy(rcdb, slave.read(rcdb.length))
+        if cfg.isStopBit:
+            slave.stop()
+        return self.CY_SUCCESS
+
+    def CyI2cWrite(self, handle, cfg, wcdb, timeout):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+
+        slave = self.__i2c_xfer(dev, cfg, wcdb.length)
+        if not slave:
+            wcdb.transferCount = 0
+            return self.CY_ERROR_I2C_NAK_ERROR
+
+        slave.write(bytearray(self._ffi.buffer(wcdb.buffer, wcdb.length)))
+        wcdb.transferCount = wcdb.length
+        if cfg.isStopBit:
+            slave.stop()
+        return self.CY_SUCCESS
+
+    def CyI2cReset(self, handle, mode):
+        dev = self._get(handle)
+        if not dev:
+            return self.CY_ERROR_INVALID_HANDLE
+        self._sim.elapse()
+        return self.CY_SUCCESS
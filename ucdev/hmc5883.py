@@ -22,17 +22,23 @@ IRC  = 12 # 12  Identification Register C  Read
 MODE_CONTINUOUS = 0
 MODE_SINGLE     = 1
 
+# CRA value for 75Hz output, no averaging
+CRA_75HZ = 0x18
+
 class ValueObject():
     pass
 
 class HMC5883():
     def __init__(self, i2c, address=0x1E):
         self.i2c = i2c
-        self.cfg = i2c.prepare(slaveAddress=address, isStopBit=0, isNakBit=0)
+        self.cfg = i2c.prepare(slaveAddress=address, isStopBit=1, isNakBit=1)
+
+    # writes register pointer, and reads from there with repeated START
+    def read_from(self, reg, len=1):
+        return bytearray(self.i2c.transfer(self.cfg, pack('<B', reg).bytes, len))
 
     def get_reg(self, reg):
-        self.write(pack('<B', reg).bytes)
-        return self.read(1)
+        return self.read_from(reg, 1)
 
     def set_reg(self, reg, val):
         return self.write(pack('<BB', reg, val).bytes)
@@ -48,8 +54,7 @@ class HMC5883():
         self.set_reg(MR, mode)
 
     def get_data(self):
-        self.write(pack('<B', DXRA).bytes)
-        raw = self.read(6)
+        raw = self.read_from(DXRA, 6)
         ret = ValueObject()
         ret.DXR = Bits(bytes=raw[0:2])
         ret.DZR = Bits(bytes=raw[2:4])
@@ -57,5 +62,18 @@ class HMC5883():
         return ret
 
     def get_id(self):
-        self.write(pack('<B', IRA).bytes)
-        return Bits(bytes=self.read(3))
+        return Bits(bytes=self.read_from(IRA, 3))
+
+"""
+Sets MPU-6050 auxiliary I2C master to sample HMC5883L behind it, as
+slave nr (0-3) of given MPU6050 instance, in continuous mode at 75Hz.
+
+Data output registers (X, Z, Y as big-endian int16, in this order) are
+read into EXT_SENS_DATA on each MPU-6050 sample, and into its FIFO if
+fifo is True, so MPU6050.read_sample() returns 9-axis data.
+"""
+def attach_mpu6050(mpu, nr=0, fifo=False, address=0x1E):
+    mpu.enable_aux()
+    mpu.aux_write(address, CRA, CRA_75HZ)
+    mpu.aux_write(address, MR, MODE_CONTINUOUS)
+    mpu.set_aux_slave(nr, address, DXRA, 6, fifo=fifo)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Integer-backed implementation of Register/RegisterValue.
+
+This provides the same interface as ucdev.register, but keeps the
+register value as a plain int and accesses each field with a shift
+and a mask precomputed per register layout. No bitstring object is
+created on field get/set, so this is the one used by drivers polling
+registers in a tight loop.
+
+Class for each register layout is generated on first access to its
+fields, so defining many registers at module import is cheap.
+
+FOO = Register("A:4 B:4", 0x12)
+
+# evals as int which is a register address
+print FOO == 0x12
+# each field attribute returns a mask for that field
+print FOO.B == 0b00001111
+print FOO.B.offset == 0
+
+# creates register instance with initial value
+foo = FOO(0xAC)
+print foo.A == 0xA
+print foo.B == 0xC
+print foo.uint == 0xAC
+foo.B = 0
+print foo.uint == 0xA0
+
+Differences from ucdev.register:
+- Field values are returned as int, not as bitstring.Bits.
+- RegisterValue.value returns int. Use tobytes() for raw bytes.
+"""
+
+import sys, os
+import binascii
+
+from ucdev.common import Value
+
+"""
+Convert various typed values into int value of given bit length.
+"""
+def to_int(val, bitlen):
+    if isinstance(val, RegisterValue):
+        val = val.uint
+    elif isinstance(val, (bytes, bytearray)):
+        # same as Bits(bytes=val, length=bitlen): take leading bits
+        nr = len(val) * 8
+        num = int(binascii.hexlify(val), 16) if val else 0
+        return num >> (nr - bitlen) if nr >= bitlen else num << (bitlen - nr)
+    elif hasattr(val, 'tobytes'):
+        return to_int(val.tobytes(), bitlen)
+
+    val = int(val)
+    if val < 0 or val >> bitlen:
+        raise ValueError("%d does not fit in %d bits" % (val, bitlen))
+    return val
+
+class Field(int):
+    def __new__(cls, bitlen, offset):
+        field = int.__new__(cls, ((1 << bitlen) - 1) << offset)
+        field.offset = offset
+        field.bitlen = bitlen
+        return field
+
+    @property
+    def uint(self):
+        return int(self)
+
+    @property
+    def mask(self):
+        return (1 << self.bitlen) - 1
+
+class Register(int):
+    # generated classes, keyed on register layout
+    __cache = {}
+
+    def __new__(cls, desc, address):
+        obj = int.__new__(cls, address)
+        obj.__dict__['_desc'] = desc
+        return obj
+
+    def __setattr__(self, key, val):
+        raise AttributeError("Register definition is readonly: %s" % key)
+
+    # generate class for this register on first access to its layout
+    def __getattr__(self, key):
+        if type(self) is not Register:
+            raise AttributeError(key)
+        self.__resolve()
+        return getattr(self, key)
+
+    def __resolve(self):
+        cls = type(self)
+        r_fields = []
+        r_bitlen = 0
+
+        # parse register description
+        for f in self._desc.split():
+            # expected: f in (":", "HOGE", "HOGE:123", ":123")
+            pair = f.split(":")
+            if len(pair) == 2:
+                f_name, f_bitlen = pair[0], int(pair[1]) if pair[1] else 1
+            else:
+                f_name, f_bitlen = pair[0], 1
+
+            r_fields.append((f_name, f_bitlen))
+            r_bitlen += f_bitlen
+
+        # reuse class generated for the same layout
+        key = (cls, tuple(r_fields))
+        sub = cls.__cache.get(key)
+        if not sub:
+            # generate mask constants from register description
+            kw = {'__slots__': ()}
+            f_offset = r_bitlen
+            for f_name, f_bitlen in r_fields:
+                f_offset -= f_bitlen
+                if f_name:
+                    kw[f_name] = Field(f_bitlen, f_offset)
+
+            # dynamically generate class for this register configuration
+            sub = type(cls.__name__, (cls, ), kw)
+            type.__setattr__(sub, '_fields', [k for k,v in r_fields if k])
+            type.__setattr__(sub, '_length', r_bitlen)
+            type.__setattr__(sub, '_value_class', RegisterValue.create(sub))
+            cls.__cache[key] = sub
+
+        object.__setattr__(self, '__class__', sub)
+
+    @property
+    def fields(self):
+        return list(self._fields)
+
+    @property
+    def length(self):
+        return self._length
+
+    """
+    Returns a new register instance with given initial value.
+    """
+    def __call__(self, *args, **kwargs):
+        val = args[0] if args else 0
+        if val.__class__ is not int or val < 0 or val >> self._length:
+            val = to_int(val, self._length)
+        reg = self._value_class(self, val)
+        if kwargs:
+            for k, v in kwargs.items():
+                setattr(reg, k, v)
+        return reg
+
+class RegisterValue(object):
+    __slots__ = ('_reg', '_value', '_mon')
+
+    @classmethod
+    def create(cls, regcls):
+        def makeprop(field):
+            shift, mask, bitlen = field.offset, field.mask, field.bitlen
+            clear = ~int(field)
+            def fget(self):
+                return (self._value >> shift) & mask
+            def fset(self, val):
+                if val.__class__ is not int:
+                    val = to_int(val, bitlen)
+                elif val < 0 or val > mask:
+                    raise ValueError("%d does not fit in %d bits" % (val, bitlen))
+                self._value = (self._value & clear) | (val << shift)
+                if self._mon:
+                    self._notify()
+            return property(fget, fset)
+
+        kw = {'__slots__': ()}
+        for f_name in regcls._fields:
+            kw[f_name] = makeprop(getattr(regcls, f_name))
+
+        return type(cls.__name__, (cls, ), kw)
+
+    def __init__(self, reg, value):
+        self._reg = reg
+        self._value = value
+        self._mon = None
+
+    @property
+    def length(self):
+        return self._reg.length
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = to_int(value, self._reg.length)
+        if self._mon:
+            self._notify()
+
+    # alias to keep bitstring-style "reg.value.uint" code working
+    uint = value
+
+    @property
+    def fields(self):
+        return self._reg.fields
+
+    def tobytes(self):
+        nr = (self._reg.length + 7) // 8
+        return bytearray(binascii.unhexlify("%0*x" % (nr * 2, self._value)))
+
+    def subscribe(self, func):
+        if self._mon is None:
+            self._mon = {}
+        self._mon[func] = 1
+
+    def unsubscribe(self, func):
+        if self._mon and func in self._mon:
+            del self._mon[func]
+
+    def _notify(self, *args, **kwargs):
+        for func in list(self._mon.keys()):
+            func(self, *args, **kwargs)
+
+    def __repr__(self):
+        rep = []
+        for f_name in self.fields:
+            field = getattr(self, f_name)
+            rep.append("{0}={1:#x}".format(f_name, field))
+        return "(" + ", ".join(rep) + ")"
+
+    """
+    Returns a new register value instance with the same initial value.
+    """
+    def __call__(self, *args, **kwargs):
+        return self._reg(args[0] if args else self._value, **kwargs)
+
+    def __int__(self):
+        return self._value
+
+    __index__ = __int__
+
+    def __and__(self, v):
+        return self._value & to_int(v, self.length)
+
+    def __or__(self, v):
+        return self._value | to_int(v, self.length)
+
+    def __xor__(self, v):
+        return self._value ^ to_int(v, self.length)
+
+    def __nonzero__(self):
+        return self._value != 0
+
+    __bool__ = __nonzero__
+
+if __name__ == "__main__":
+    REG = Register("FOO:3 :1 BAR:4", 0x12)
+    print(REG)
+    print(REG.FOO)
+    print(REG.BAR)
+
+    reg = REG(0xAC)
+    print(reg)
+    print(reg.FOO)
+    print(reg.BAR)
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8-unix -*-
 
-from struct import pack, unpack
-from ucdev.register import Value, Register
+import time
+from struct import pack, unpack, Struct
+from ucdev.common import Value, RegisterDevice
+from ucdev.intregister import Register
 
 import logging
 log = logging.getLogger(__name__)
 
-from IPython import embed
 
 ######################################################################
 # I2C MPU-6050 registers
@@ -137,10 +138,35 @@ WHO_AM_I = Register(": WHO_AM_I:6 :", 0x75)
 
 ######################################################################
 
-class MPU6050(object):
+# ACCEL_XOUT_H to GYRO_ZOUT_L, as read in one burst
+SAMPLE = Struct(">7h")
+
+# LSB per g of AFS_SEL=0, and per deg/s of FS_SEL=0
+ACCEL_LSB = 16384.0
+GYRO_LSB  = 131.0
+
+# ADDR/REG/CTRL registers of auxiliary I2C slave 0-3 (same layout as SLV0)
+AUX_SLAVES = ((I2C_SLV0_ADDR, I2C_SLV0_REG, I2C_SLV0_CTRL),
+              (I2C_SLV1_ADDR, I2C_SLV1_REG, I2C_SLV1_CTRL),
+              (I2C_SLV2_ADDR, I2C_SLV2_REG, I2C_SLV2_CTRL),
+              (I2C_SLV3_ADDR, I2C_SLV3_REG, I2C_SLV3_CTRL))
+
+######################################################################
+
+class MPU6050(RegisterDevice):
+    # clock used for timeouts
+    clock = staticmethod(time.time)
+
     def __init__(self, i2c, address=0x68):
         self.i2c = i2c
         self.cfg = i2c.prepare(slaveAddress=address, isStopBit=1, isNakBit=1)
+        self.sample = SAMPLE
+        self.buf = bytearray(SAMPLE.size)
+        self.cmd_sample = pack('<B', ACCEL_XOUT_H)
+        self.scale = None
+
+        # {slave number: (length, fifo)} of auxiliary I2C slaves
+        self.aux = {}
 
     def read(self, len=1):
         buf = "\x00" * len
@@ -150,24 +176,200 @@ class MPU6050(object):
         return self.i2c.write(self.cfg, data)
 
     def get_reg(self, reg, len=1):
-        self.write(pack('<B', reg))
-        tmp = self.read(len)
+        tmp = bytearray(self.i2c.transfer(self.cfg, pack('<B', reg), len))
         return reg(tmp) if isinstance(reg, Register) else tmp
 
     def set_reg(self, reg, *arg, **kw):
-        tmp = reg(*arg, **kw).value
+        tmp = reg(*arg, **kw)
+        if reg in (ACCEL_CONFIG, GYRO_CONFIG):
+            self.scale = None
         return self.write(pack('<BB', reg, tmp.uint))
 
+    def flush_batch(self, items):
+        # registers at consecutive addresses are written in one burst,
+        # as register pointer auto-increments (except on FIFO_R_W)
+        run = None
+        for reg, val in items:
+            if reg in (ACCEL_CONFIG, GYRO_CONFIG):
+                self.scale = None
+            if run and reg == run[0] + len(run) - 1 and reg - 1 != FIFO_R_W:
+                run.append(val)
+                continue
+            if run:
+                self.write(bytes(bytearray(run)))
+            run = [int(reg), val]
+        if run:
+            self.write(bytes(bytearray(run)))
+
+    def get_scale(self):
+        """Returns (accel, gyro) LSB per g and per deg/s, of current
+        AFS_SEL/FS_SEL. Cached until either is written."""
+        if self.scale is None:
+            afs = self.ACCEL_CONFIG.AFS_SEL
+            fs = self.GYRO_CONFIG.FS_SEL
+            self.scale = (ACCEL_LSB / (1 << afs), GYRO_LSB / (1 << fs))
+        return self.scale
+
+    def sample_div(self, rate, dlpf=1):
+        """Returns (SMPLRT_DIV, actual rate) for sample rate nearest to
+        given rate [Hz] with DLPF_CFG=dlpf. Sample rate is divided from
+        gyro output rate, which is 8kHz with DLPF off (0 or 7), and
+        1kHz otherwise."""
+        base = 8000 if dlpf in (0, 7) else 1000
+        div = int(round(float(base) / rate)) - 1
+        if not 0 <= div <= 255:
+            raise Exception("ERROR: Invalid sample rate: %s" % rate)
+        return div, float(base) / (div + 1)
+
+    def set_sample_rate(self, rate, dlpf=1):
+        """Wakes up with PLL on X gyro as clock, and sets DLPF_CFG and
+        SMPLRT_DIV for given rate. Returns actual sample rate."""
+        div, rate = self.sample_div(rate, dlpf)
+        with self.batch():
+            self.PWR_MGMT_1 = PWR_MGMT_1(CLKSEL=1)
+            self.SMPLRT_DIV = div
+            self.CONFIG = CONFIG(DLPF_CFG=dlpf)
+        return rate
+
+    def read_sample(self, scale=False):
+        """Returns (ax, ay, az, temp, gx, gy, gz) of latest sample.
+
+        All output registers are read in one burst with auto-increment,
+        by CyI2C.transfer() (register pointer write, then read: two
+        bridge calls, however many registers are read).
+        Values are signed raw counts, or with scale=True, accel in g,
+        temperature in degC and gyro in deg/s.
+
+        If auxiliary I2C slaves are set by set_aux_slave(), burst also
+        covers EXT_SENS_DATA, which follows GYRO_ZOUT_L, and its data
+        is appended as big-endian int16 values (not scaled).
+        """
+        self.i2c.transfer(self.cfg, self.cmd_sample, self.buf)
+        ret = self.sample.unpack_from(self.buf)
+        if not scale:
+            return ret
+
+        a, g = self.get_scale()
+        ax, ay, az, t, gx, gy, gz = ret[:7]
+        return (ax / a, ay / a, az / a, t / 340.0 + 36.53,
+                gx / g, gy / g, gz / g) + ret[7:]
+
+    #
+    # Auxiliary I2C master
+    #
+    # MPU-6050 can read up to 4 slaves on its auxiliary I2C bus at each
+    # sample, into EXT_SENS_DATA_00-23 (and FIFO), in order of slave
+    # number. Slaves are then read together with the sensor data,
+    # sampled at the same time, with no transaction on the bridge for
+    # each slave. Slaves are not accessible from the bridge while
+    # master is enabled, so use aux_write()/aux_read() to set them up.
+    #
+    def enable_aux(self, clock=13):
+        """Enables auxiliary I2C master, with I2C_MST_CLK (13 for
+        400kHz). Data ready is delayed until slave data is loaded."""
+        with self.batch():
+            self.INT_PIN_CFG.I2C_BYPASS_EN = 0
+            self.I2C_MST_CTRL.WAIT_FOR_ES = 1
+            self.I2C_MST_CTRL.I2C_MSG_CLK = clock
+            self.USER_CTRL.I2C_MST_EN = 1
+
+    def set_aux_slave(self, nr, addr, reg, length, fifo=False, swap=False):
+        """Sets slave nr (0-3) to read length bytes from reg of slave
+        at addr on each sample, also into FIFO if fifo is True. Length
+        must be even, as slave data is returned as int16 words. With
+        swap=True, bytes of each word are swapped (for little-endian
+        slave data)."""
+        if not 0 <= nr < len(AUX_SLAVES):
+            raise Exception("ERROR: Invalid slave number: %d" % nr)
+        if not 0 < length < 16 or length % 2:
+            raise Exception("ERROR: Invalid length: %d" % length)
+
+        ADDR, REG, CTRL = AUX_SLAVES[nr]
+        ctrl = I2C_SLV0_CTRL.I2C_SLV0_EN | length
+        if swap:
+            ctrl |= I2C_SLV0_CTRL.I2C_SLV0_BYTE_SW
+
+        with self.batch():
+            self.store_reg(ADDR, I2C_SLV0_ADDR.I2C_SLV0_RW | addr)
+            self.store_reg(REG, reg)
+            self.store_reg(CTRL, ctrl)
+            self.__set_aux_fifo(nr, fifo)
+
+        self.aux[nr] = (length, fifo)
+        self.__update_sample()
+
+    def clear_aux_slave(self, nr):
+        with self.batch():
+            self.store_reg(AUX_SLAVES[nr][2], 0)
+            self.__set_aux_fifo(nr, False)
+        self.aux.pop(nr, None)
+        self.__update_sample()
+
+    # FIFO_EN bit of slave 0-2 (slave 3 is in I2C_MST_CTRL)
+    def __aux_fifo_bits(self):
+        return (FIFO_EN.SLV0_FIFO_EN, FIFO_EN.SLV1_FIFO_EN, FIFO_EN.SLV2_FIFO_EN)
+
+    def __set_aux_fifo(self, nr, fifo):
+        bits = self.__aux_fifo_bits()
+        if nr < len(bits):
+            val = self.FIFO_EN().uint & ~bits[nr]
+            self.FIFO_EN = val | (bits[nr] if fifo else 0)
+        else:
+            self.I2C_MST_CTRL.SLV_3_FIFO_EN = int(fifo)
+
+    def aux_fifo_en(self):
+        """Returns FIFO_EN bits of slaves 0-2 set to FIFO."""
+        bits = self.__aux_fifo_bits()
+        return sum(bits[nr] for nr, (length, fifo) in self.aux.items()
+                   if fifo and nr < len(bits))
+
+    # EXT_SENS_DATA is filled in order of enabled slaves
+    def __update_sample(self):
+        ext = sum(length for length, fifo in self.aux.values())
+        self.sample = Struct(">%dh" % (7 + ext // 2))
+        self.buf = bytearray(self.sample.size)
+
+    def aux_fifo_len(self):
+        """Returns bytes of slave data in each FIFO frame."""
+        return sum(length for length, fifo in self.aux.values() if fifo)
+
+    def __aux_xfer(self, addr, reg, rw, val=0, timeout=0.1):
+        with self.batch():
+            self.I2C_SLV4_ADDR = I2C_SLV4_ADDR(I2C_SLV4_RW=rw, I2C_SLV4_ADDR=addr)
+            self.I2C_SLV4_REG = reg
+            self.I2C_SLV4_DO = val
+            self.I2C_SLV4_CTRL.I2C_SLV4_EN = 1
+
+        # done at next sample
+        t0 = self.clock()
+        while True:
+            st = self.I2C_MST_STATUS()
+            if st.I2C_SLV4_NACK:
+                raise Exception("ERROR: NACK from aux slave 0x%02X" % addr)
+            if st.I2C_SLV4_DONE:
+                return
+            if self.clock() - t0 > timeout:
+                raise Exception("ERROR: Timeout on aux slave 0x%02X" % addr)
+
+    def aux_write(self, addr, reg, val):
+        """Writes register of slave on auxiliary bus, by slave 4."""
+        self.__aux_xfer(addr, reg, 0, val)
+
+    def aux_read(self, addr, reg):
+        """Reads register of slave on auxiliary bus, by slave 4."""
+        self.__aux_xfer(addr, reg, 1)
+        return self.I2C_SLV4_DI.uint
+
 def add_register(cls):
     def makeprop(reg):
         def fget(self):
-            tmp = self.get_reg(reg)
+            tmp = self.load_reg(reg)
             def update_hook(v):
-                self.set_reg(reg, v)
+                self.store_reg(reg, v)
             tmp.subscribe(update_hook)
             return tmp
         def fset(self, v):
-            self.set_reg(reg, v)
+            self.store_reg(reg, v)
         return property(fget, fset)
 
     for name, reg in globals().items():
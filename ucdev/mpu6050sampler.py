@@ -0,0 +1,185 @@
+# -*- coding: utf-8-unix -*-
+"""Data-ready interrupt driven sampling of MPU-6050.
+
+Instead of reading at fixed sleep interval, which reads some samples
+twice and misses others as host and sensor clocks drift apart, INT pin
+of the sensor is wired to bridge GPIO, and each sample is read once,
+right after it becomes ready:
+
+  mpu = MPU6050(CyI2C(dev))
+  sampler = MPU6050Sampler(mpu, CyGPIO(dev).pin(2), rate=100)
+  sampler.start()
+  for ts, sample in sampler.run(count=1000):
+      print(ts, sample)
+  sampler.stop()
+  print(sampler.summary())
+
+Bridge has no GPIO interrupt, so INT is polled by CyGPIO, each poll
+taking a USB round trip. INT is latched (LATCH_INT_EN) so that it is
+not missed between polls, and cleared by the sample read itself
+(INT_RD_CLEAR), so no INT_STATUS read is needed. Polling starts only
+lead (fraction of sample period) ahead of next expected sample, and
+sleeps in between.
+
+Each sample is timestamped on host, halfway between the last poll that
+found INT inactive and the first that found it active. If INT is found
+active on the first poll, sample was ready before polling started, and
+is counted in stat['late'] (lead is too short).
+
+MPU-6050 has no FIFO watermark interrupt, so for rates beyond what
+polling can follow, use MPU6050Stream (ucdev.mpu6050stream) instead.
+"""
+
+import sys, os
+import time
+import math
+
+from ucdev.mpu6050 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+class MPU6050Sampler(object):
+    # clock used for timestamps, and sleep for polling
+    clock = staticmethod(time.time)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, mpu, pin, rate=100, dlpf=1, active_low=False,
+                 lead=0.25, scale=False):
+        self.mpu = mpu
+        self.pin = pin
+        self.active_low = active_low
+        self.scale = scale
+
+        self.div, self.rate = mpu.sample_div(rate, dlpf)
+        self.dlpf = dlpf
+        self.period = 1 / self.rate
+        self.lead = self.period * lead
+        self.reset_stat()
+
+    def reset_stat(self):
+        self.t_last = None
+        self.stat = dict(samples=0, polls=0, late=0, missed=0)
+        self.__t0 = None
+        self.__dt = [0.0, 0.0, None, None]
+
+    def start(self):
+        """Configures sampling and latched data ready interrupt."""
+        mpu = self.mpu
+
+        mpu.set_sample_rate(self.rate, self.dlpf)
+        with mpu.batch():
+            mpu.INT_PIN_CFG.INT_LEVEL = int(self.active_low)
+            mpu.INT_PIN_CFG.LATCH_INT_EN = 1
+            mpu.INT_PIN_CFG.INT_RD_CLEAR = 1
+        mpu.INT_ENABLE.DATA_RDY_EN = 1
+
+        # drop interrupt already pending
+        mpu.INT_STATUS()
+        self.reset_stat()
+
+    def stop(self):
+        self.mpu.INT_ENABLE.DATA_RDY_EN = 0
+
+    def wait(self, timeout=None):
+        """Waits for INT, and returns host timestamp of data ready, or
+        None on timeout."""
+        pin = self.pin
+        active = 0 if self.active_low else 1
+
+        # data is not due before lead time ahead of next sample
+        now = self.clock()
+        if self.t_last is not None:
+            dt = self.t_last + self.period - self.lead - now
+            if dt > 0:
+                self.sleep(dt)
+                now = self.clock()
+
+        t_end = None if timeout is None else now + timeout
+        last = None
+        while True:
+            t0 = self.clock()
+            level = pin.get()
+            now = self.clock()
+            self.stat['polls'] += 1
+
+            # time pin was read is taken as middle of poll
+            ts = (t0 + now) / 2
+            if level == active:
+                if last is None:
+                    self.stat['late'] += 1
+                    return ts
+                return (last + ts) / 2
+            if t_end is not None and now >= t_end:
+                return None
+            last = ts
+
+    def read(self, timeout=None):
+        """Waits for next sample, and returns (timestamp, sample) as
+        MPU6050.read_sample() returns, or None on timeout."""
+        ts = self.wait(timeout)
+        if ts is None:
+            return None
+
+        # also clears INT
+        sample = self.mpu.read_sample(self.scale)
+        self.__account(ts)
+        return ts, sample
+
+    def run(self, timeout=None, count=None):
+        """Yields (timestamp, sample) of each sample.
+
+        Stops after count samples, or when no sample arrived for
+        timeout seconds, or never if both are None.
+        """
+        nr = 0
+        while count is None or nr < count:
+            ret = self.read(timeout)
+            if ret is None:
+                return
+            nr += 1
+            yield ret
+
+    ##################################################################
+    # statistics
+
+    def __account(self, ts):
+        stat = self.stat
+        stat['samples'] += 1
+        if self.t_last is None:
+            self.__t0 = ts
+        else:
+            dt = ts - self.t_last
+            skip = int(round(dt / self.period)) - 1
+            if skip > 0:
+                stat['missed'] += skip
+            acc = self.__dt
+            acc[0] += dt
+            acc[1] += dt * dt
+            acc[2] = dt if acc[2] is None else min(acc[2], dt)
+            acc[3] = dt if acc[3] is None else max(acc[3], dt)
+        self.t_last = ts
+
+    def summary(self):
+        """Returns dict of stat, with throughput and jitter:
+
+        - rate: samples per second received
+        - interval: mean interval between timestamps [s]
+        - jitter: standard deviation of interval [s]
+        - min, max: shortest and longest interval [s]
+        """
+        ret = dict(self.stat)
+        nr = ret['samples'] - 1
+        if nr < 1:
+            return ret
+
+        s, ss, lo, hi = self.__dt
+        mean = s / nr
+        ret.update(rate=nr / (self.t_last - self.__t0), interval=mean,
+                   jitter=math.sqrt(max(ss / nr - mean * mean, 0)),
+                   min=lo, max=hi)
+        return ret
+
+######################################################################
+
+__all__ = ['MPU6050Sampler']
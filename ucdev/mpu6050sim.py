@@ -0,0 +1,262 @@
+# -*- coding: utf-8-unix -*-
+"""Behavioral model of InvenSense MPU-6050.
+
+This module models MPU-6050 as I2C slave of simulated Cypress bridge
+(ucdev.cy7c65211.sim), with sampling at rate set by DLPF_CFG and
+SMPLRT_DIV, data output registers, 1024-byte FIFO with overflow, and
+INT_STATUS flags:
+
+  sim = CySim()
+  sdev = sim.add_device()
+  chip = sdev.attach_i2c(0x68, MPU6050Sim(sim.clock))
+
+  mpu = MPU6050(CyI2C(next(CyUSBSerial(lib=sim).find())))
+
+Samples are taken on virtual clock (sim.clock), lazily on each I2C
+transaction. Value of n-th sample is given by sample(n), which returns
+deterministic ramp (accel X counts n up), so that reader can check
+continuity of received samples. Override it for other data.
+
+Register pointer auto-increments on each byte, except on FIFO_R_W,
+so burst read of FIFO_R_W drains FIFO. Reading INT_STATUS and
+I2C_MST_STATUS clears them.
+
+INT pin is modeled by int_pin(), to be attached to bridge GPIO:
+
+  sdev.attach_gpio(2, chip.int_pin)
+
+Pin is held active while enabled interrupt is pending with LATCH_INT_EN,
+or else pulses for 50us at each sample (too short to be seen by polling
+over USB). With INT_RD_CLEAR, any read clears INT_STATUS.
+
+Slaves on auxiliary I2C bus (I2CSlave objects, as for the bridge) are
+attached by attach_aux(addr, slave). With I2C_MST_EN, enabled slaves
+0-3 are read into EXT_SENS_DATA (and FIFO) at each sample, and single
+transfer of slave 4 is done at next sample.
+"""
+
+import sys, os
+from struct import pack
+
+from ucdev.cy7c65211.sim import I2CRegisterSlave
+from ucdev.mpu6050 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+FIFO_SIZE = 1024
+
+# register values on power-on reset
+RESET_VALUES = {PWR_MGMT_1: 0x40, WHO_AM_I: 0x68}
+
+class MPU6050Sim(I2CRegisterSlave):
+    """Model of single MPU-6050 chip, accessed over I2C."""
+
+    def __init__(self, clock):
+        I2CRegisterSlave.__init__(self, 0x80)
+        self.clock = clock
+        self.aux = {}
+        self.reset()
+
+    def attach_aux(self, addr, slave):
+        self.aux[addr] = slave
+        return slave
+
+    def reset(self):
+        self.regs[:] = bytearray(len(self.regs))
+        for reg, val in RESET_VALUES.items():
+            self.regs[reg] = val
+        self.fifo = bytearray()
+        self.nr_sample = 0
+        self.t_next = None
+        self.t_int = None
+        self.stat = dict(samples=0, overflows=0)
+
+    def sample(self, n):
+        """Returns (accel xyz, temp, gyro xyz) of n-th sample."""
+        def s16(v):
+            return (v + 0x8000) % 0x10000 - 0x8000
+        return (s16(n), s16(-n), 16384, -3920, s16(n * 3), 0, s16(-n * 7))
+
+    ##################################################################
+    # sampling
+
+    @property
+    def period(self):
+        dlpf = self.regs[CONFIG] & CONFIG.DLPF_CFG
+        rate = 8000.0 if dlpf in (0, 7) else 1000.0
+        return (1 + self.regs[SMPLRT_DIV]) / rate
+
+    def update(self):
+        """Takes all samples due by now."""
+        if self.regs[PWR_MGMT_1] & PWR_MGMT_1.SLEEP:
+            self.t_next = None
+            return
+
+        now = self.clock.now
+        if self.t_next is None:
+            self.t_next = now + self.period
+        while self.t_next <= now:
+            self.t_int = self.t_next
+            self.take_sample()
+            self.t_next += self.period
+
+    def take_sample(self):
+        raw = pack(">7h", *self.sample(self.nr_sample))
+        self.nr_sample += 1
+        self.stat['samples'] += 1
+
+        self.regs[ACCEL_XOUT_H:ACCEL_XOUT_H + len(raw)] = raw
+        ext = self.aux_master()
+        self.regs[INT_STATUS] |= INT_STATUS.DATA_RDY_EN
+
+        if not self.regs[USER_CTRL] & USER_CTRL.FIFO_EN:
+            return
+
+        # written in register order
+        en = self.regs[FIFO_EN]
+        data = bytearray()
+        if en & FIFO_EN.ACCESS_FIFO_EN:
+            data += raw[0:6]
+        if en & FIFO_EN.TEMP_FIFO_EN:
+            data += raw[6:8]
+        for i, bit in enumerate((FIFO_EN.XG_FIFO_EN, FIFO_EN.YG_FIFO_EN,
+                                 FIFO_EN.ZG_FIFO_EN)):
+            if en & bit:
+                data += raw[8 + i * 2:10 + i * 2]
+        for nr, bit in enumerate((FIFO_EN.SLV0_FIFO_EN, FIFO_EN.SLV1_FIFO_EN,
+                                  FIFO_EN.SLV2_FIFO_EN, None)):
+            if bit is None:
+                on = self.regs[I2C_MST_CTRL] & I2C_MST_CTRL.SLV_3_FIFO_EN
+            else:
+                on = en & bit
+            if on and nr in ext:
+                data += ext[nr]
+
+        # oldest data is overwritten on overflow
+        self.fifo += data
+        if len(self.fifo) > FIFO_SIZE:
+            del self.fifo[:len(self.fifo) - FIFO_SIZE]
+            self.stat['overflows'] += 1
+            if self.regs[INT_ENABLE] & INT_ENABLE.FIFO_OFLOW_EN:
+                self.regs[INT_STATUS] |= INT_STATUS.FIFO_OFLOW_INT
+
+    def aux_master(self):
+        """Reads enabled slaves 0-3 into EXT_SENS_DATA, and does
+        transfer of slave 4. Returns {slave number: data read}."""
+        if not self.regs[USER_CTRL] & USER_CTRL.I2C_MST_EN:
+            return {}
+
+        ext = {}
+        pos = EXT_SENS_DATA_00
+        for nr in range(4):
+            addr, reg, ctrl = self.regs[I2C_SLV0_ADDR + nr * 3:I2C_SLV0_CTRL + nr * 3 + 1]
+            length = ctrl & I2C_SLV0_CTRL.I2C_SLV0_LEN
+            if not ctrl & I2C_SLV0_CTRL.I2C_SLV0_EN or not length:
+                continue
+            if not addr & I2C_SLV0_ADDR.I2C_SLV0_RW:
+                # write to slave is not modeled
+                continue
+
+            slave = self.aux.get(addr & 0x7F)
+            if slave is None:
+                self.regs[I2C_MST_STATUS] |= 1 << nr
+                continue
+            slave.write(bytearray([reg]))
+            data = bytearray(slave.read(length))
+            slave.stop()
+            if ctrl & I2C_SLV0_CTRL.I2C_SLV0_BYTE_SW:
+                data[0:length // 2 * 2:2], data[1:length // 2 * 2:2] = \
+                    data[1:length // 2 * 2:2], data[0:length // 2 * 2:2]
+
+            ext[nr] = data
+            self.regs[pos:pos + length] = data
+            pos += length
+
+        ctrl = self.regs[I2C_SLV4_CTRL]
+        if ctrl & I2C_SLV4_CTRL.I2C_SLV4_EN:
+            addr, reg = self.regs[I2C_SLV4_ADDR], self.regs[I2C_SLV4_REG]
+            slave = self.aux.get(addr & 0x7F)
+            if slave is None:
+                self.regs[I2C_MST_STATUS] |= I2C_MST_STATUS.I2C_SLV4_NACK
+            elif addr & I2C_SLV4_ADDR.I2C_SLV4_RW:
+                slave.write(bytearray([reg]))
+                self.regs[I2C_SLV4_DI] = slave.read(1)[0]
+                slave.stop()
+            else:
+                slave.write(bytearray([reg, self.regs[I2C_SLV4_DO]]))
+                slave.stop()
+            self.regs[I2C_SLV4_CTRL] &= ~I2C_SLV4_CTRL.I2C_SLV4_EN
+            self.regs[I2C_MST_STATUS] |= I2C_MST_STATUS.I2C_SLV4_DONE
+        return ext
+
+    # 50us pulse, unless latched
+    INT_PULSE = 50e-6
+
+    def int_pin(self):
+        """Returns level of INT pin."""
+        self.update()
+        cfg = self.regs[INT_PIN_CFG]
+        active = self.regs[INT_STATUS] & self.regs[INT_ENABLE]
+        if active and not cfg & INT_PIN_CFG.LATCH_INT_EN:
+            active = self.clock.now - self.t_int < self.INT_PULSE
+        level = 1 if active else 0
+        return level ^ 1 if cfg & INT_PIN_CFG.INT_LEVEL else level
+
+    ##################################################################
+    # I2C slave interface
+
+    def write(self, data):
+        self.update()
+        I2CRegisterSlave.write(self, data)
+
+    def read(self, length):
+        self.update()
+        ret = bytearray(length)
+        for i in range(length):
+            ret[i] = self.read_reg(self.ptr)
+            if self.ptr != FIFO_R_W:
+                self.ptr = (self.ptr + 1) % len(self.regs)
+        if self.regs[INT_PIN_CFG] & INT_PIN_CFG.INT_RD_CLEAR:
+            self.regs[INT_STATUS] = 0
+        return ret
+
+    def read_reg(self, reg):
+        if reg == FIFO_COUNTH:
+            return len(self.fifo) >> 8
+        if reg == FIFO_COUNTL:
+            return len(self.fifo) & 0xFF
+        if reg == FIFO_R_W:
+            if not self.fifo:
+                return 0xFF
+            val = self.fifo[0]
+            del self.fifo[0]
+            return val
+        if reg in (INT_STATUS, I2C_MST_STATUS):
+            val, self.regs[reg] = self.regs[reg], 0
+            return val
+        return self.regs[reg]
+
+    def write_reg(self, reg, val):
+        if reg == PWR_MGMT_1 and val & PWR_MGMT_1.DEVICE_RESET:
+            return self.reset()
+        if reg == USER_CTRL:
+            # FIFO is reset while FIFO_EN is 0, and reset bits self-clear
+            if val & USER_CTRL.FIFO_RESET and not val & USER_CTRL.FIFO_EN:
+                self.fifo = bytearray()
+            val &= ~(USER_CTRL.FIFO_RESET | USER_CTRL.I2C_MST_RESET |
+                     USER_CTRL.SIG_COND_RESET)
+        if reg in (INT_STATUS, I2C_MST_STATUS, FIFO_COUNTH, FIFO_COUNTL,
+                   WHO_AM_I, I2C_SLV4_DI):
+            return
+        if reg == FIFO_R_W:
+            if len(self.fifo) < FIFO_SIZE:
+                self.fifo.append(val)
+            return
+        if reg == SMPLRT_DIV or reg == CONFIG:
+            self.t_next = None
+        self.regs[reg] = val
+
+######################################################################
+
+__all__ = ['MPU6050Sim']
@@ -0,0 +1,179 @@
+# -*- coding: utf-8-unix -*-
+"""Streaming samples of MPU-6050 through its FIFO.
+
+Instead of reading output registers of each sample, sensor is set to
+push samples into its 1024-byte FIFO at given rate, and FIFO is drained
+by burst reads of whole frames, decoded into NumPy structured array:
+
+  mpu = MPU6050(CyI2C(dev))
+  stream = MPU6050Stream(mpu, rate=1000)
+  stream.start()
+  for ts, frames in stream.run():
+      print(frames['accel'].mean(axis=0), frames['gyro'][-1])
+  stream.stop()
+
+Each drain costs 2 register reads by CyI2C.transfer() (FIFO_COUNT and
+FIFO_R_W, each a pointer write and a read on the bridge), however many
+frames it returns. Polling
+interval adapts so that FIFO is drained around given fill level. At
+1kHz with all channels (14 bytes per frame), I2C bus needs to run at
+400kHz, as FIFO data alone takes 1.26s per second at 100kHz.
+
+On FIFO overflow, oldest bytes are overwritten and frame alignment is
+lost, so FIFO is reset and its data is discarded. This is detected by
+INT_STATUS.FIFO_OFLOW_INT, read after drain only if FIFO was more than
+half full (as it only overflows while it is far behind), and counted
+in stat['overflows'].
+
+Data of auxiliary I2C slaves set with fifo=True (see
+MPU6050.set_aux_slave()) are in 'ext' field, so slaves need to be set
+before creating the stream.
+
+Requires NumPy.
+"""
+
+import sys, os
+import time
+import numpy as np
+
+from struct import pack
+from ucdev.mpu6050 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+FIFO_SIZE = 1024
+
+"""
+Returns dtype of FIFO frame with given data enabled, and ext bytes of
+auxiliary slave data. Fields are in the order written into FIFO, as
+big-endian int16.
+"""
+def frame_dtype(accel=True, temp=True, gyro=True, ext=0):
+    fields = []
+    if accel:
+        fields.append(('accel', '>i2', (3,)))
+    if temp:
+        fields.append(('temp', '>i2'))
+    if gyro:
+        fields.append(('gyro', '>i2', (3,)))
+    if ext:
+        fields.append(('ext', '>i2', (ext // 2,)))
+    return np.dtype(fields)
+
+class MPU6050Stream(object):
+    # clock used for timestamps, and sleep for polling
+    clock = staticmethod(time.time)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, mpu, rate=1000, accel=True, temp=True, gyro=True,
+                 dlpf=1, fill=0.25):
+        self.mpu = mpu
+        self.dtype = frame_dtype(accel, temp, gyro, mpu.aux_fifo_len())
+        self.size = self.dtype.itemsize
+        if not self.size:
+            raise Exception("ERROR: No data selected for FIFO")
+
+        self.div, self.rate = mpu.sample_div(rate, dlpf)
+        self.dlpf = dlpf
+        self.fifo_en = FIFO_EN(TEMP_FIFO_EN=int(temp), XG_FIFO_EN=int(gyro),
+                               YG_FIFO_EN=int(gyro), ZG_FIFO_EN=int(gyro),
+                               ACCESS_FIFO_EN=int(accel))
+
+        # auxiliary slaves set to FIFO by MPU6050.set_aux_slave()
+        self.fifo_en |= mpu.aux_fifo_en()
+
+        # poll when FIFO is expected to have this many frames
+        self.batch = max(int(FIFO_SIZE // self.size * fill), 1)
+
+        self.buf = bytearray(FIFO_SIZE)
+        self.cnt = bytearray(2)
+        self.cmd_count = pack('<B', FIFO_COUNTH)
+        self.cmd_data = pack('<B', FIFO_R_W)
+        self.user_ctrl = None
+        self.stat = dict(reads=0, polls=0, frames=0, bytes=0, overflows=0)
+
+    def start(self):
+        """Configures sampling, and starts FIFO from empty."""
+        mpu = self.mpu
+
+        mpu.set_sample_rate(self.rate, self.dlpf)
+        mpu.INT_ENABLE.FIFO_OFLOW_EN = 1
+        mpu.FIFO_EN = self.fifo_en
+
+        # keep other bits, as I2C master may be in use
+        self.user_ctrl = mpu.USER_CTRL().uint & ~USER_CTRL.FIFO_EN
+        self.reset()
+
+    def stop(self):
+        self.mpu.FIFO_EN = 0
+        self.mpu.USER_CTRL = self.user_ctrl
+
+    def reset(self):
+        """Empties FIFO, dropping its data."""
+        mpu = self.mpu
+        mpu.USER_CTRL = self.user_ctrl | USER_CTRL.FIFO_RESET
+        mpu.USER_CTRL = self.user_ctrl | USER_CTRL.FIFO_EN
+
+    def count(self):
+        mpu = self.mpu
+        cnt = mpu.i2c.transfer(mpu.cfg, self.cmd_count, self.cnt)
+        return (cnt[0] << 8) | cnt[1]
+
+    def read(self):
+        """Returns all whole frames in FIFO, as structured array of
+        frame_dtype(). Array is empty if FIFO had no whole frame, or
+        has been reset on overflow."""
+        mpu = self.mpu
+        stat = self.stat
+        size = self.size
+
+        stat['reads'] += 1
+        n = self.count()
+        n -= n % size
+        if n:
+            mpu.i2c.transfer(mpu.cfg, self.cmd_data, memoryview(self.buf)[:n])
+
+        # overflow may also happen after FIFO_COUNT is read
+        if n > FIFO_SIZE // 2 and mpu.INT_STATUS.FIFO_OFLOW_INT:
+            stat['overflows'] += 1
+            self.reset()
+            n = 0
+
+        if not n:
+            stat['polls'] += 1
+            return np.empty(0, self.dtype)
+
+        stat['bytes'] += n
+        stat['frames'] += n // size
+        return np.frombuffer(self.buf, self.dtype, n // size).copy()
+
+    def run(self, timeout=None, count=None):
+        """Yields (timestamp, frames) of each drain of FIFO, where
+        timestamp is host time when last frame was read.
+
+        Stops after count frames, or when no frame arrived for timeout
+        seconds, or never if both are None.
+        """
+        period = self.batch / self.rate
+        wait = period
+        nr = 0
+        idle = self.clock()
+        while count is None or nr < count:
+            frames = self.read()
+            now = self.clock()
+            if len(frames):
+                nr += len(frames)
+                idle = now
+                yield now, frames
+
+                # adjust so that next read finds batch frames
+                wait = max(wait + (self.batch - len(frames)) / self.rate, 0)
+                wait = min(wait, period * 1.5)
+            elif timeout is not None and now - idle >= timeout:
+                return
+            self.sleep(wait)
+
+######################################################################
+
+__all__ = ['MPU6050Stream', 'frame_dtype', 'FIFO_SIZE']
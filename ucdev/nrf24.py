@@ -78,13 +78,71 @@ instance by doing:
 This only updates PRIM_RX value of cloned "reg" register, and will
 not change actual register value of tx instance.
 
+Note on shadow register cache:
+
+Each register access is a SPI transaction over USB. If this host is
+the only one updating configuration registers, they can be cached by
+
+  tx = nRF24(CySPI(txd), CE=CyGPIO(txd).pin(0), cache=True)
+
+Then, configuration registers are read from device only once, and
+
+  tx.CONFIG.PRIM_RX = 1
+
+costs a single SPI write. Registers updated by the device itself
+(STATUS, FIFO_STATUS, OBSERVE_TX, CD) are always read from device.
+Use tx.invalidate() to drop cached values, or tx.resync() to reload
+them from device.
+
+Note on batched register update:
+
+Each field update on "live" register instance is written back
+immediately. To update multiple fields and registers at once, do
+
+  with tx.batch():
+      tx.CONFIG.PRIM_RX = 1
+      tx.CONFIG.PWR_UP = 1
+      tx.RF_CH = 10
+
+This defers all writebacks until the end of the block, and writes
+each updated register only once, in the order first updated.
+
+Note on streaming TX:
+
+send() waits until each payload is sent. To send many payloads, use
+
+  stat = tx.send_stream(payloads)
+
+which keeps CE high and TX FIFO filled, costing a single SPI command
+per payload. See send_stream() for handling of MAX_RT.
+
+Note on TX/RX turnaround:
+
+For half-duplex request/response, use
+
+  tx.set_mode(DIR_RECV)
+  ret = tx.send_then_listen(request, timeout=0.01)
+
+which turns radio around between RX and TX with minimal bus access.
+See set_mode() for details.
+
+Note on channel scan:
+
+  for ts, hits in tx.sweep():
+      ...
+
+sweeps all channels repeatedly, reading carrier detect (RPD) bit of
+each. See ucdev.nrf24scan for occupancy statistics.
+
 """
 
 __author__ = 'Taisuke Yamada <tai@remove-if-not-spam.rakugaki.org>'
 
 import sys, os, time
 from struct import pack, unpack
-from register import Value, Register
+from collections import OrderedDict
+from ucdev.common import Value, RegisterDevice
+from ucdev.intregister import Register, to_int
 
 import logging
 log = logging.getLogger(__name__)
@@ -120,6 +178,9 @@ FIFO_STATUS = Register(": TX_REUSE TX_FULL TX_EMPTY :2 RX_FULL RX_EMPTY", 0x17)
 DYNPD = Register(":2 DPL_P5 DPL_P4 DPL_P3 DPL_P2 DPL_P1 DPL_P0", 0x1C)
 FEATURE = Register(":5 EN_DPL EN_ACK_PAY EN_DYN_ACK", 0x1D)
 
+# Registers updated by the device itself. These are never shadowed.
+VOLATILE_REGISTERS = (STATUS, OBSERVE_TX, CD, FIFO_STATUS)
+
 class Command(Value):
     pass
 
@@ -158,12 +219,66 @@ for i in [Register(": RATE:2 MODE:3 DIR", 0)]:
   RATE_1M   = 2<<i.RATE.offset
   RATE_2M   = 3<<i.RATE.offset
 
+"""
+Converts payload given as bytes, bytearray or str into bytearray.
+"""
+def to_payload(data):
+    if isinstance(data, (bytes, bytearray)):
+        return bytearray(data)
+    return bytearray(str(data).encode())
+
+"""
+Returns payload as byte-sized buffer object, without copying if data
+supports buffer protocol. Other objects are converted as to_payload().
+"""
+def to_buffer(data):
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    try:
+        ret = memoryview(data)
+    except TypeError:
+        return to_payload(data)
+    return ret if ret.itemsize == 1 else ret.tobytes()
+
 ######################################################################
 
 class nRF24API(object):
     def __init__(self, spi):
         self.spi = spi
 
+        # Reusable command frame buffers for payload commands.
+        # With SPI supporting send_into(), frame is built in place and
+        # received directly into buffer, so nothing is copied outside
+        # of SPI driver.
+        self.__send_into = getattr(spi, 'send_into', None)
+        self.__resize(33)
+
+    def __resize(self, length):
+        self.__wbuf = bytearray(length)
+        self.__rbuf = bytearray(length)
+        self.__wview = memoryview(self.__wbuf)
+
+    def __send(self, length):
+        ret = self.spi.send(self.__wview[:length].tobytes())
+        self.__rbuf[:len(ret)] = ret
+
+    def __write_payload(self, cmd, data):
+        if not isinstance(data, (bytes, bytearray)):
+            data = to_buffer(data)
+        nr = len(data)
+        if nr >= len(self.__wbuf):
+            self.__resize(nr + 1)
+
+        # payload goes LSByte first, so reverse it while copying
+        wbuf = self.__wbuf
+        wbuf[0] = cmd
+        wbuf[nr:0:-1] = data
+        if self.__send_into:
+            self.__send_into(self.__wview[:nr + 1], self.__rbuf)
+        else:
+            self.__send(nr + 1)
+        return STATUS(self.__rbuf[0])
+
     def NOP(self):
         spi = self.spi
         ret = spi.send(pack("<B", NOP))
@@ -193,24 +308,34 @@ class nRF24API(object):
     #
     def W_REGISTER(self, reg, *arg, **kw):
         spi = self.spi
-        tmp = reg(*arg, **kw).value
-        tmp.byteswap()
-        ret = spi.send(pack("<B", W_REGISTER | reg) + tmp.bytes)
+        tmp = reg(*arg, **kw).tobytes()
+        tmp.reverse()
+        ret = spi.send(pack("<B", W_REGISTER | reg) + tmp)
         return STATUS(ret[0])
 
-    def R_RX_PAYLOAD(self, length=32):
-        spi = self.spi
-        ret = spi.send(pack("<B{0}x".format(length), R_RX_PAYLOAD))
-        tmp = ret[1:]
-        tmp.reverse()
-        return STATUS(ret[0]), tmp
+    def R_RX_PAYLOAD(self, length=32, out=None):
+        """Reads payload into new bytearray, or into given writable
+        buffer without allocation, in which case memoryview of the
+        payload in the buffer is returned.
+        """
+        if length >= len(self.__wbuf):
+            self.__resize(length + 1)
+        self.__wbuf[0] = R_RX_PAYLOAD
+        if self.__send_into:
+            self.__send_into(self.__wview[:length + 1], self.__rbuf)
+        else:
+            self.__send(length + 1)
+
+        rbuf = self.__rbuf
+        if out is None:
+            tmp = rbuf[1:length + 1]
+            tmp.reverse()
+            return STATUS(rbuf[0]), tmp
+        out[:length] = rbuf[length:0:-1]
+        return STATUS(rbuf[0]), memoryview(out)[:length]
 
     def W_TX_PAYLOAD(self, data):
-        spi = self.spi
-        tmp = bytearray(str(data))
-        tmp.reverse()
-        ret = spi.send(pack("<B", W_TX_PAYLOAD) + tmp)
-        return STATUS(ret[0])
+        return self.__write_payload(W_TX_PAYLOAD, data)
 
     def FLUSH_TX(self):
         spi = self.spi
@@ -238,18 +363,10 @@ class nRF24API(object):
         return STATUS(ret[0]), ret[1]
 
     def W_ACK_PAYLOAD(self, data, pipe=0):
-        spi = self.spi
-        tmp = bytearray(str(data))
-        tmp.reverse()
-        ret = spi.send(pack("<B", W_ACK_PAYLOAD | pipe) + tmp)
-        return STATUS(ret[0])
+        return self.__write_payload(W_ACK_PAYLOAD | pipe, data)
 
     def W_TX_PAYLOAD_NOACK(self, data):
-        spi = self.spi
-        tmp = bytearray(str(data))
-        tmp.reverse()
-        ret = spi.send(pack("<B", W_TX_PAYLOAD_NOACK) + tmp)
-        return STATUS(ret[0])
+        return self.__write_payload(W_TX_PAYLOAD_NOACK, data)
 
 def add_command(cls):
     # TODO:
@@ -268,59 +385,73 @@ add_command(nRF24API)
 
 ######################################################################
 
-class nRF24(nRF24API):
-    # Non-SPI pins for extra control.
-    # NOTE:
-    # - CSN pin is (or should be) managed in SPI class, not here.
-    CE  = property(lambda s:s.__ce.get(), lambda s,v:s.__ce.set(1 if v else 0))
-    IRQ = property(lambda s:s.__irq.get())
+class nRF24Profile(object):
+    """Declarative register configuration of nRF24.
 
-    def __init__(self, spi, CE=None, IRQ=None):
-        self.debug = False
-        self.spi   = spi
-        self.__ce  = CE
-        self.__irq = IRQ
+    Profile holds expected value of each register, either as a whole
+    or per field, in the order registers are to be written. It is
+    compiled against known device state into a list of register
+    writes actually needed, so applying the same profile again costs
+    nothing when device state is known (see nRF24 shadow cache).
 
-    # NOTE:
-    # - Here, I'm treating __repr__ like __str__ as my goal is to improve
-    #   interactive usability of this class under ipython.
-    def __repr__(self):
-        name = self.__class__.__name__
-        return "{0}{1}".format(name, str(self.STATUS))
+      prof = nRF24Profile()
+      prof.set(CONFIG, PWR_UP=1, EN_CRC=1)
+      prof.set(RF_CH, 10)
+      tx.apply_profile(prof)
+    """
 
-    def reset(self, mode=MODE_ESB|DIR_RECV, freq=100000):
-        self.reset_spi(freq)
-        self.reset_mode(mode)
+    def __init__(self):
+        self.regs = OrderedDict()
+        self.activate = False
+        self.ce = None
 
-    def reset_spi(self, freq):
-        spi = self.spi
+    # Usage:
+    #   prof.set(REG, VALUE)
+    #   prof.set(REG, FIELD1=123, FIELD2=234, ...)
+    #
+    # Fields not given are left as-is on device. Values not fitting
+    # in field raise ValueError.
+    #
+    def set(self, reg, *arg, **kw):
+        mask, value = self.regs.get(reg, (0, 0))
+
+        if arg:
+            mask  = (1 << reg.length) - 1
+            value = reg(arg[0]).uint
+
+        for k, v in kw.items():
+            field = getattr(reg, k)
+            mask |= field
+            value = (value & ~field) | (to_int(v, field.bitlen) << field.offset)
+
+        self.regs[reg] = (mask, value)
+        return self
+
+    def compile(self, state):
+        """Returns list of (reg, mask, value) differing from given state.
+
+        State is a dict of register to its known value. Registers not
+        in state are considered unknown, and always written.
+        """
+        ret = []
+        for reg, (mask, value) in self.regs.items():
+            cur = state.get(reg)
+            if cur is None or cur & mask != value:
+                ret.append((reg, mask, value))
+        return ret
 
-        rc = spi.set_config({
-                'frequency': freq,
-                'dataWidth': 8,
-                'protocol': spi.MOTOROLA,
-                'isMsbFirst': True,
-                'isMaster': True,
-                'isContinuousMode': True,
-                'isCpha': False,
-                'isCpol': False,
-                })
-        if rc != 0:
-            raise Exception("ERROR: SPI init failed=%d" % rc)
+    @classmethod
+    def from_mode(cls, mode):
+        """Returns profile for flags given to nRF24.reset()."""
+        prof = cls()
+        is_rx = mode & DIR_MASK == DIR_RECV
 
-    def reset_mode(self, mode):
         # nRF24L01+ Preliminary Product Specification
         # - Appendix C - Constant carrier wave output for testing
         if mode & MODE_MASK == MODE_TEST:
             log.debug('reset_mode: TEST mode')
-            self.CONFIG = CONFIG(PWR_UP=1, PRIM_RX=0, EN_CRC=0)
-            time.sleep(1.5/1000.0) # max 1.5ms from power-down mode
-
-            self.RF_SETUP = RF_SETUP(CONT_WAVE=1, PLL_LOCK=1, RF_PWR=0)
-            #self.EN_AA = 0
-            #self.SETUP_RETR = 0
-            #self.TX_ADDR = 0xFFFFFFFFFF
-            #self.W_TX_PAYLOAD("\xFF" * 32)
+            prof.set(CONFIG, CONFIG(PWR_UP=1, PRIM_RX=0, EN_CRC=0))
+            prof.set(RF_SETUP, RF_SETUP(CONT_WAVE=1, PLL_LOCK=1, RF_PWR=0))
 
             # NOTE:
             # To generate wave, freq and CE=1 need to be set in app code
@@ -328,11 +459,8 @@ class nRF24(nRF24API):
         # nRF24L01+ Preliminary Product Specification
         # - Appendix A - Enhanced ShockBurst - Configuration and Communication Example
         elif mode & MODE_MASK == MODE_ESB:
-            is_rx = mode & DIR_MASK == DIR_RECV
             log.debug('reset_mode: MODE=ESB, RX={is_rx}'.format(**locals()))
-
-            self.CONFIG = CONFIG(PWR_UP=1, EN_CRC=1, PRIM_RX=int(is_rx))
-            time.sleep(1.5/1000.0)
+            prof.set(CONFIG, CONFIG(PWR_UP=1, EN_CRC=1, PRIM_RX=int(is_rx)))
 
             #
             # Now, configure registers.
@@ -343,79 +471,198 @@ class nRF24(nRF24API):
 
             # Enable all addresses by default
             # Turn it off in application if power consumption is an issue.
-            self.EN_RXADDR = 0xFF
-            self.EN_AA = 0xFF
+            prof.set(EN_RXADDR, 0xFF)
+            prof.set(EN_AA, 0xFF)
 
             # NOTE:
             # - P0 should be 0 by default as P0 only receives ACK by default.
             # - Update this in application code if using ACK-with-PAYLOAD.
-            self.RX_PW_P0 = 0
-            for i in range(1, 6):
-                setattr(self, "RX_PW_P" + str(i), 32)
+            prof.set(RX_PW_P0, 0)
+            for reg in (RX_PW_P1, RX_PW_P2, RX_PW_P3, RX_PW_P4, RX_PW_P5):
+                prof.set(reg, 32)
 
             # other parameters
-            self.SETUP_RETR = SETUP_RETR(ARD=0b0100, ARC=0b0011)
-            self.RF_SETUP = RF_SETUP(PLL_LOCK=0, RF_DR_LOW=0, RF_DR_HIGH=1)
+            prof.set(SETUP_RETR, SETUP_RETR(ARD=0b0100, ARC=0b0011))
+            prof.set(RF_SETUP, RF_SETUP(PLL_LOCK=0, RF_DR_LOW=0, RF_DR_HIGH=1))
 
             # extra ESB-only features (dynamic payload length, etc)
-            self.FEATURE = FEATURE(EN_DPL=1, EN_ACK_PAY=1, EN_DYN_ACK=1)
-            self.ACTIVATE()
+            prof.set(FEATURE, FEATURE(EN_DPL=1, EN_ACK_PAY=1, EN_DYN_ACK=1))
+            prof.activate = True
 
             # enable recv-mode immediately
             if is_rx:
-                self.CE = 1
+                prof.ce = 1
 
         elif mode & MODE_MASK == MODE_SB:
-            is_rx = mode & DIR_MASK == DIR_RECV
             log.debug('reset_mode: MODE=SB, RX={is_rx}'.format(**locals()))
+            prof.set(CONFIG, CONFIG(PWR_UP=1, EN_CRC=1, PRIM_RX=int(is_rx)))
 
-            self.CONFIG = CONFIG(PWR_UP=1, EN_CRC=1, PRIM_RX=int(is_rx))
-            time.sleep(1.5/1000.0)
-
-            self.EN_RXADDR = 0xFF
-            self.EN_AA = 0
-            self.SETUP_RETR = 0x00
-            self.RF_SETUP = RF_SETUP(PLL_LOCK=0, RF_DR_LOW=0, RF_DR_HIGH=0)
+            prof.set(EN_RXADDR, 0xFF)
+            prof.set(EN_AA, 0)
+            prof.set(SETUP_RETR, 0x00)
+            prof.set(RF_SETUP, RF_SETUP(PLL_LOCK=0, RF_DR_LOW=0, RF_DR_HIGH=0))
 
             # NOTE:
             # - Standard (=non-ESB) SB only supports "static length payload".
             # - Length of payload must match between send/recv sides.
             # - Here, 32-byte payload is set as default.
-            for i in range(0, 6):
-                setattr(self, "RX_PW_P" + str(i), 32)
+            for reg in (RX_PW_P0, RX_PW_P1, RX_PW_P2, RX_PW_P3, RX_PW_P4, RX_PW_P5):
+                prof.set(reg, 32)
 
             if is_rx:
-                self.CE = 1
+                prof.ce = 1
 
         elif mode & MODE_MASK == MODE_BLE:
             log.debug('reset_mode: MODE=BLE')
 
             # TODO: BLE mode is not yet implemented
-            self.CONFIG = CONFIG(PWR_UP=1, EN_CRC=0, PRIM_RX=0)
-
-            time.sleep(1.5/1000.0)
-
-            self.TXADDR = ""
-            self.EN_AA = 0
-            self.SETUP_RETR = 0
-            self.RF_SETUP = self.RF_SETUP(PLL_LOCK=0, RF_DR_HIGH=0)
-            self.FEATURE = 0
+            prof.set(CONFIG, CONFIG(PWR_UP=1, EN_CRC=0, PRIM_RX=0))
+            prof.set(EN_AA, 0)
+            prof.set(SETUP_RETR, 0)
+            prof.set(RF_SETUP, PLL_LOCK=0, RF_DR_HIGH=0)
+            prof.set(FEATURE, 0)
         else:
             log.warn("Unknown mode. Not resetting.")
 
         # set datarate, if given
         if mode & RATE_MASK == RATE_250K:
             log.debug('reset_mode: RATE=250K')
-            self.RF_SETUP.RF_DR_HIGH = 0
-            self.RF_SETUP.RF_DR_LOW  = 1
+            prof.set(RF_SETUP, RF_DR_HIGH=0, RF_DR_LOW=1)
         elif mode & RATE_MASK == RATE_1M:
             log.debug('reset_mode: RATE=1M')
-            self.RF_SETUP.RF_DR_HIGH = 0
-            self.RF_SETUP.RF_DR_LOW  = 0
+            prof.set(RF_SETUP, RF_DR_HIGH=0, RF_DR_LOW=0)
         elif mode & RATE_MASK == RATE_2M:
             log.debug('reset_mode: RATE=2M')
-            self.RF_SETUP.RF_DR_HIGH = 1
-            self.RF_SETUP.RF_DR_LOW  = 0
+            prof.set(RF_SETUP, RF_DR_HIGH=1, RF_DR_LOW=0)
+
+        return prof
+
+######################################################################
+
+class nRF24(nRF24API, RegisterDevice):
+    # Non-SPI pins for extra control.
+    # NOTE:
+    # - CSN pin is (or should be) managed in SPI class, not here.
+    CE  = property(lambda s:s.__ce.get(), lambda s,v:s.__set_ce(v))
+    IRQ = property(lambda s:s.__irq.get())
+
+    # clock used for timestamps and rate reporting, and sleep for polling
+    clock = staticmethod(time.time)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, spi, CE=None, IRQ=None, cache=False):
+        nRF24API.__init__(self, spi)
+        self.debug = False
+        self.cache = cache
+        self.__ce  = CE
+        self.__irq = IRQ
+        self.__shadow = {}
+
+        # last CE level set, for set_mode()
+        self.__ce_level = None
+
+    # NOTE:
+    # - Here, I'm treating __repr__ like __str__ as my goal is to improve
+    #   interactive usability of this class under ipython.
+    def __repr__(self):
+        name = self.__class__.__name__
+        return "{0}{1}".format(name, str(self.STATUS))
+
+    def reset(self, mode=MODE_ESB|DIR_RECV, freq=100000):
+        self.reset_spi(freq)
+        self.reset_mode(mode)
+
+    def reset_spi(self, freq):
+        spi = self.spi
+
+        rc = spi.set_config({
+                'frequency': freq,
+                'dataWidth': 8,
+                'protocol': spi.MOTOROLA,
+                'isMsbFirst': True,
+                'isMaster': True,
+                'isContinuousMode': True,
+                'isCpha': False,
+                'isCpol': False,
+                })
+        if rc != 0:
+            raise Exception("ERROR: SPI init failed=%d" % rc)
+
+    def reset_mode(self, mode):
+        return self.apply_profile(nRF24Profile.from_mode(mode))
+
+    def apply_profile(self, prof):
+        """Writes registers of given profile that differ from device.
+
+        Device state is taken from shadow register cache, so only
+        registers changed from last known state are written if cache
+        is enabled. Otherwise, all registers in profile are written.
+        Returns number of registers written.
+        """
+        state = dict(self.__shadow) if self.cache else {}
+        plan  = prof.compile(state)
+
+        for reg, mask, value in plan:
+            # merge with current value if only some fields are given
+            if mask != (1 << reg.length) - 1:
+                value |= self.get_reg(reg).uint & ~mask
+
+            self.set_reg(reg, value)
+
+            # max 1.5ms from power-down mode
+            if reg == CONFIG and value & CONFIG.PWR_UP:
+                if not state.get(CONFIG, 0) & CONFIG.PWR_UP:
+                    time.sleep(1.5/1000.0)
+
+            if reg == FEATURE and prof.activate:
+                self.ACTIVATE()
+
+        if prof.ce is not None:
+            self.CE = prof.ce
+
+        return len(plan)
+
+    #
+    # Shadow register cache
+    #
+    # With cache=True, value of non-volatile registers is remembered
+    # after first read or write, and later reads are served from
+    # this shadow copy without SPI access. This assumes only this host
+    # updates those registers, so call invalidate() or resync() if
+    # the device was reset or updated behind this instance.
+    #
+    def get_reg(self, reg):
+        if self.cache and reg not in VOLATILE_REGISTERS:
+            val = self.__shadow.get(reg)
+            if val is not None:
+                return reg(val)
+
+        tmp = self.R_REGISTER(reg)[1]
+
+        if self.cache and reg not in VOLATILE_REGISTERS:
+            self.__shadow[reg] = tmp.uint
+        return tmp
+
+    def set_reg(self, reg, *arg, **kw):
+        return self.W_REGISTER(reg, *arg, **kw)
+
+    def W_REGISTER(self, reg, *arg, **kw):
+        tmp = reg(*arg, **kw)
+        ret = super(nRF24, self).W_REGISTER(reg, tmp)
+
+        if self.cache and reg not in VOLATILE_REGISTERS:
+            self.__shadow[reg] = tmp.uint
+        return ret
+
+    def invalidate(self, reg=None):
+        if reg is None:
+            self.__shadow.clear()
+        elif reg in self.__shadow:
+            del self.__shadow[reg]
+
+    def resync(self):
+        for reg in list(self.__shadow.keys()):
+            self.__shadow[reg] = self.R_REGISTER(reg)[1].uint
 
     def flush(self):
         self.CE = 1
@@ -435,15 +682,238 @@ class nRF24(nRF24API):
         else:
             self.REUSE_TX_PL()
 
-    def set_mode(self, mode):
+    def __set_ce(self, v):
+        v = 1 if v else 0
+        self.__ce.set(v)
+        self.__ce_level = v
+
+    def set_mode(self, mode, ce=1):
+        """Switches between TX (DIR_SEND) and RX (DIR_RECV) mode.
+
+        CONFIG is taken from shadow register cache if enabled (and read
+        from device otherwise), and is only written if PRIM_RX changes.
+        As TX and RX mode are entered from Standby-I (nRF24L01+ Product
+        Specification, 6.1.1), CE is dropped while PRIM_RX is written,
+        and radio settles in 130us once CE is raised again. CE level
+        last set through this instance is remembered, and CE is only
+        written if not already at given level. Returns number of bus
+        operations issued.
+        """
+        nr = 0 if self.cache and CONFIG in self.__shadow else 1
+        config = self.get_reg(CONFIG).uint
+        prim_rx = CONFIG.PRIM_RX if (mode & DIR_MASK) == DIR_RECV else 0
+
+        if config & CONFIG.PRIM_RX != prim_rx:
+            if self.__ce_level != 0:
+                self.CE = 0
+                nr += 1
+            self.W_REGISTER(CONFIG, (config & ~CONFIG.PRIM_RX) | prim_rx)
+            nr += 1
+
+        if self.__ce_level != ce:
+            self.CE = ce
+            nr += 1
+        return nr
+
+    def send_then_listen(self, data, timeout=0.01, width=None, tx_time=None):
+        """Sends payload, then listens for reply.
+
+        For request/response exchange with remote node. Payload is
+        written while still in RX mode, and radio is turned around to
+        TX and back to RX with CE dropped around each PRIM_RX write
+        (see set_mode()). TX result is polled with NOP, and RX mode is
+        entered as soon as TX_DS is seen. Payloads already in RX FIFO
+        when receiver is turned off are flushed, so they are never
+        taken as reply.
+
+        Returns (pipe, payload, timestamp) of first payload received
+        within timeout seconds, as yielded by recv_stream(), or None if
+        nothing is received. On MAX_RT, TX FIFO is flushed, but reply is
+        still waited for, as only ACK may have been lost. If radio
+        reports neither TX_DS nor MAX_RT within tx_time seconds, TX FIFO
+        is flushed and exception is raised.
+
+        Pipe configuration (width, as returned by rx_widths()) and
+        tx_time (as returned by tx_timeout()) are read from device on
+        each call if not given, so give them when exchanging often
+        without shadow cache. Then this costs 5 SPI transactions (one
+        more to read CONFIG without shadow cache) and 4 CE writes, plus
+        further NOP polls, before listening.
+        """
+        if width is None:
+            width = self.rx_widths()
+        if tx_time is None:
+            tx_time = self.tx_timeout()
+        config = self.get_reg(CONFIG).uint & ~CONFIG.PRIM_RX
+
+        self.W_TX_PAYLOAD(data)
+        self.CE = 0
+        st = self.W_REGISTER(CONFIG, config)
+
+        # receiver is off, so nothing more arrives before reply
+        if st.RX_P_NO != 0b111:
+            self.FLUSH_RX()
+        if st.RX_DR or st.TX_DS or st.MAX_RT:
+            self.W_REGISTER(STATUS, RX_DR=1, TX_DS=1, MAX_RT=1)
+
+        self.CE = 1
+        t_end = self.clock() + tx_time
+        st = self.NOP()
+        while not (st.TX_DS or st.MAX_RT):
+            if self.clock() >= t_end:
+                self.set_mode(DIR_RECV)
+                self.FLUSH_TX()
+                raise Exception("ERROR: No TX_DS/MAX_RT within %.3fs" % tx_time)
+            st = self.NOP()
+
         self.CE = 0
-        self.CONFIG.PRIM_RX = 1 if (mode & DIR_MASK) == DIR_RECV else 0
+        self.W_REGISTER(CONFIG, config | CONFIG.PRIM_RX)
         self.CE = 1
 
+        if st.MAX_RT:
+            self.FLUSH_TX()
+        self.W_REGISTER(STATUS, TX_DS=1, MAX_RT=1)
+        return next(self.recv_stream(timeout, min_wait=0, max_wait=0,
+                                     width=width), None)
+
     def send(self, data=None):
         self.queue(data)
         self.flush()
 
+    def tx_timeout(self):
+        """Returns longest time sending a payload can take, from ARD
+        and ARC, allowing 1ms of airtime for each attempt."""
+        retr = self.SETUP_RETR
+        return (retr.ARC + 1) * ((retr.ARD + 1) * 250e-6 + 1e-3)
+
+    def send_stream(self, iterable, policy='flush', retries=3, timeout=None):
+        """Sends payloads from iterable, keeping TX FIFO filled.
+
+        CE is kept high during the stream, so the radio transmits
+        payloads back-to-back as long as TX FIFO is not empty. FIFO
+        state is taken from STATUS returned by each SPI command, so
+        each payload costs a single SPI transaction while FIFO has
+        room. Payload written to full FIFO is ignored by the device,
+        and is rewritten once TX_FULL clears.
+
+        On MAX_RT, policy decides how to handle payloads in TX FIFO:
+
+        - 'flush': drop them and continue
+        - 'retry': retransmit, and drop them after given retries
+        - 'raise': raise exception
+
+        If TX FIFO does not get room (or empty at the end) for timeout
+        seconds (default: tx_timeout() for each of 3 queued payloads,
+        times retries + 1 with policy 'retry'), TX FIFO is flushed and
+        stream is aborted (or exception is raised with policy 'raise').
+        MAX_RT does not extend the timeout, so radio stuck in MAX_RT
+        (e.g. unplugged, reading 0xFF) is also detected.
+
+        Returns dict of number of payloads written ('sent'), MAX_RT
+        events ('max_rt'), FIFO flushes ('flushed'), timeouts
+        ('timeouts'), payloads flushed on timeout ('failed'), elapsed
+        time ('time') and payloads per second ('pps').
+        """
+        stat = dict(sent=0, max_rt=0, flushed=0, timeouts=0, failed=0,
+                    time=0, pps=0)
+        if timeout is None:
+            timeout = 3 * self.tx_timeout()
+            if policy == 'retry':
+                timeout *= retries + 1
+        ctx = dict(policy=policy, retries=retries, retry=0, timeout=timeout)
+
+        t0 = self.clock()
+        self.W_REGISTER(STATUS, TX_DS=1, MAX_RT=1)
+        self.CE = 1
+        try:
+            for data in iterable:
+                st = self.W_TX_PAYLOAD(data)
+                while st is not None and st.TX_FULL:
+                    st = self.__wait_tx(st, ctx, stat)
+                    if st is not None:
+                        st = self.W_TX_PAYLOAD(data)
+                if st is None:
+                    break
+                stat['sent'] += 1
+
+                if st.TX_DS:
+                    ctx['retry'] = 0
+                if st.MAX_RT:
+                    self.__on_max_rt(ctx, stat)
+            else:
+                # wait until all payloads are sent
+                t_end = self.clock() + timeout
+                while True:
+                    st, fifo = self.R_REGISTER(FIFO_STATUS)
+                    if fifo.TX_EMPTY:
+                        break
+                    if st.MAX_RT:
+                        self.__on_max_rt(ctx, stat)
+                    elif self.clock() >= t_end:
+                        self.__on_tx_timeout(self.__tx_fifo_count(), ctx, stat)
+                        break
+        finally:
+            self.CE = 0
+
+        stat['time'] = self.clock() - t0
+        if stat['time'] > 0:
+            stat['pps'] = stat['sent'] / stat['time']
+        return stat
+
+    # polls with NOP until TX FIFO has room, returns None on timeout
+    def __wait_tx(self, st, ctx, stat):
+        t_end = self.clock() + ctx['timeout']
+        while True:
+            if st.MAX_RT:
+                st = self.__on_max_rt(ctx, stat)
+            if not st.TX_FULL:
+                return st
+            if self.clock() >= t_end:
+                self.__on_tx_timeout(3, ctx, stat)
+                return None
+            st = self.NOP()
+
+    # FIFO_STATUS only tells if TX FIFO is empty or full, so payloads
+    # in it are counted by filling it up with dummy payloads, with CE
+    # low so that none is sent. Only used before flushing TX FIFO.
+    def __tx_fifo_count(self):
+        self.CE = 0
+        st, fifo = self.R_REGISTER(FIFO_STATUS)
+        if fifo.TX_EMPTY:
+            return 0
+        for nr in (3, 2, 1):
+            if st.TX_FULL:
+                return nr
+            self.W_TX_PAYLOAD(b"\x00")
+            st = self.NOP()
+        return 0
+
+    def __on_tx_timeout(self, nr, ctx, stat):
+        stat['timeouts'] += 1
+        stat['failed'] += nr
+        self.FLUSH_TX()
+        stat['flushed'] += 1
+        if ctx['policy'] == 'raise':
+            raise Exception("ERROR: No TX_DS/MAX_RT for %.3fs after %d payloads" %
+                            (ctx['timeout'], stat['sent']))
+
+    def __on_max_rt(self, ctx, stat):
+        stat['max_rt'] += 1
+        policy = ctx['policy']
+
+        if policy == 'raise':
+            raise Exception("ERROR: MAX_RT after %d payloads" % stat['sent'])
+        elif policy == 'retry' and ctx['retry'] < ctx['retries']:
+            ctx['retry'] += 1
+        else:
+            ctx['retry'] = 0
+            self.FLUSH_TX()
+            stat['flushed'] += 1
+
+        # clearing MAX_RT resumes transmission
+        self.W_REGISTER(STATUS, TX_DS=1, MAX_RT=1)
+        return self.NOP()
+
     def recv(self, length=None):
         if self.FIFO_STATUS.RX_EMPTY:
             return None,None
@@ -453,10 +923,165 @@ class nRF24(nRF24API):
         ret = self.R_RX_PAYLOAD(length)
         return ret
 
+    def rx_widths(self):
+        """Returns {pipe: payload width} of enabled pipes, with None
+        for pipes using dynamic payload length."""
+        dynpd = self.DYNPD.uint if self.FEATURE.EN_DPL else 0
+        enabled = self.EN_RXADDR.uint
+        width = {}
+        for pipe, reg in enumerate((RX_PW_P0, RX_PW_P1, RX_PW_P2,
+                                    RX_PW_P3, RX_PW_P4, RX_PW_P5)):
+            if enabled & (1 << pipe):
+                width[pipe] = None if dynpd & (1 << pipe) else self.get_reg(reg).uint
+        return width
+
+    def recv_stream(self, timeout=None, min_wait=0.001, max_wait=0.1, stat=None,
+                    copy=True, width=None):
+        """Yields (pipe, payload, timestamp) of each received payload.
+
+        RX FIFO state is taken from STATUS returned by each SPI command,
+        so no FIFO_STATUS read is needed. If no enabled pipe uses dynamic
+        payload length, payload read is issued speculatively, and each
+        payload costs a single SPI transaction (read on empty FIFO just
+        returns garbage). Otherwise, R_RX_PL_WID is issued first, and
+        each payload costs two.
+
+        When FIFO is empty, RX_DR is cleared (if set in STATUS of that
+        poll, so it costs nothing on later polls), which also releases
+        IRQ pin. Then polling backs off from min_wait to max_wait
+        seconds, doubling each time. Generator stops when no payload
+        is received for timeout seconds, or never if timeout is None.
+        Pipe configuration is read once on start, unless width is given
+        as returned by rx_widths(), which saves up to 9 register reads
+        when stream is restarted often. Without dynamic payload length,
+        payloads on pipes with RX_PW_Pn of 0 (pipe not used) are
+        dropped.
+
+        If stat dict is given, number of SPI commands ('xfers'), empty
+        polls ('polls') and payloads ('packets') are counted into it.
+
+        With copy=False, payloads are read into a reused buffer and
+        yielded as memoryview, which is only valid until next payload.
+        """
+        if stat is None:
+            stat = {}
+        for k in ('xfers', 'polls', 'packets'):
+            stat.setdefault(k, 0)
+
+        # payload width of each enabled pipe, None if dynamic
+        if width is None:
+            width = self.rx_widths()
+        dynamic = None in width.values()
+        spec = max([w for w in width.values() if w] or [32])
+        out = None if copy else bytearray(max(spec, 32))
+
+        wait = min_wait
+        idle = self.clock()
+        while True:
+            stat['xfers'] += 1
+            if dynamic:
+                st, length = self.R_RX_PL_WID()
+            else:
+                st, data = self.R_RX_PAYLOAD(spec, out)
+
+            pipe = st.RX_P_NO
+            if pipe not in width:
+                # RX FIFO empty
+                if st.RX_DR:
+                    stat['xfers'] += 1
+                    st = self.W_REGISTER(STATUS, RX_DR=1)
+                    if st.RX_P_NO in width:
+                        # payload arrived meanwhile
+                        continue
+                stat['polls'] += 1
+                now = self.clock()
+                if timeout is not None and now - idle >= timeout:
+                    return
+                self.sleep(wait)
+                wait = min(wait * 2, max_wait)
+                continue
+
+            if dynamic:
+                length = width[pipe] or length
+                stat['xfers'] += 1
+                if length > 32:
+                    # corrupted width, must be flushed
+                    self.FLUSH_RX()
+                    continue
+                st, data = self.R_RX_PAYLOAD(length, out)
+            elif not width[pipe]:
+                continue
+            elif width[pipe] < spec:
+                # payload is at the end as bytes are reversed
+                data = data[spec - width[pipe]:]
+
+            stat['packets'] += 1
+            idle = self.clock()
+            wait = min_wait
+            yield pipe, data, idle
+
+    def sweep(self, channels=None, dwell=170e-6, count=None):
+        """Yields (timestamp, hits) for each sweep over channels, where
+        hits is bytearray of RPD (CD) bit read on each channel.
+
+        Radio is put in RX mode with all pipes disabled, so nothing is
+        received or acknowledged while scanning. On each channel, CE is
+        held high for dwell seconds (130us to settle, and 40us until
+        RPD gets valid), and dropped to latch RPD. Then RPD is read and
+        next channel is written with prebuilt commands, so each step
+        costs 2 SPI transactions and 2 CE toggles, with no register
+        decoding.
+
+        These 4 bus operations per channel are the minimum: RPD is
+        only latched when CE goes low, and nRF24 takes one command per
+        CSN assertion, so RPD read and RF_CH write cannot share a
+        transaction. Over USB bridge, sweep rate is thus bound by
+        round trip latency, to about 240 channels/s at 1ms.
+
+        Sweeps all 126 channels if channels is not given, and forever
+        if count is None. Pipes must be enabled again to receive.
+        """
+        channels = list(range(126) if channels is None else channels)
+        for ch in channels:
+            if not 0 <= ch < 126:
+                raise Exception("ERROR: Invalid channel: %d" % ch)
+        nr = len(channels)
+
+        self.CE = 0
+        self.EN_RXADDR = 0
+        config = self.get_reg(CONFIG).uint
+        if ~config & (CONFIG.PWR_UP | CONFIG.PRIM_RX):
+            self.W_REGISTER(CONFIG, config | CONFIG.PWR_UP | CONFIG.PRIM_RX)
+            if not config & CONFIG.PWR_UP:
+                self.sleep(1.5/1000.0)
+
+        send, ce = self.spi.send, self.__ce
+        clock, sleep = self.clock, self.sleep
+        rd = pack("<B1x", R_REGISTER | CD)
+        wr = [pack("<BB", W_REGISTER | RF_CH, ch) for ch in channels]
+        wr = wr[1:] + wr[:1]
+
+        send(wr[-1])
+        try:
+            n = 0
+            while count is None or n < count:
+                hits = bytearray(nr)
+                for i in range(nr):
+                    ce.set(1)
+                    sleep(dwell)
+                    ce.set(0)
+                    hits[i] = send(rd)[1] & 1
+                    send(wr[i])
+                n += 1
+                yield clock(), hits
+        finally:
+            # channel was written behind shadow cache
+            self.invalidate(RF_CH)
+
 def add_register(cls):
     def makeprop(reg):
         def fget(self):
-            tmp = self.R_REGISTER(reg)[1]
+            tmp = self.load_reg(reg)
             #
             # Here, a hook is registered to support following usage:
             #
@@ -473,11 +1098,11 @@ def add_register(cls):
             # observer pattern. Not sure if this is "Pythonic".
             #
             def update_hook(v):
-                self.W_REGISTER(reg, v)
+                self.store_reg(reg, v)
             tmp.subscribe(update_hook)
             return tmp
         def fset(self, v):
-            self.W_REGISTER(reg, v)
+            self.store_reg(reg, v)
         return property(fget, fset)
 
     for name, reg in globals().items():
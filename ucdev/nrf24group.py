@@ -0,0 +1,307 @@
+# -*- coding: utf-8-unix -*-
+"""Runs several nRF24 radios concurrently, one thread per radio.
+
+Each radio is usually on its own CY7C6521x bridge. As each SPI/GPIO
+access waits for USB round trip in libcyusbserial, which cffi calls
+without holding GIL, radios on separate bridges are driven in
+parallel, and throughput scales with number of radios:
+
+  group = nRF24Group()
+  for i, rf in enumerate(nRF24Group.find(lib)):
+      rf.reset(MODE_ESB|DIR_RECV)
+      rf.RX_ADDR_P1 = 0xE7E7E7E7E7
+      group.add(rf, DIR_RECV, ch=10 + i * 20)
+
+  group.start()
+  while True:
+      ts, name, pipe, data = group.recv()
+  group.stop()
+
+Each radio has a role given to add():
+
+- DIR_RECV: polls RX FIFO with nRF24.recv_stream(). Received payloads
+  of all receivers are merged into one stream ordered by timestamp,
+  as returned by recv(). As a payload is only returned once all other
+  receivers have polled past its timestamp, stream is delayed by up
+  to max_wait (polling interval of idle radio).
+- DIR_SEND: sends payloads given to send() with nRF24.send_stream().
+
+Radio is configured (reset(), addresses) by caller, and group only
+sets channel. Channel can be changed while running with retune(),
+which is applied by the thread of the radio. Radios should be created
+with cache=True (as find() does), as configuration registers are read
+each time RX FIFO gets empty.
+
+Exception in thread of a radio (e.g. bridge unplugged) is logged, and
+kept in error of its nRF24Node and counted in stat['errors']. Failed
+receiver stops, and no longer holds back recv(). Failed sender drops
+payload being sent, and goes on with the next one, so flush() returns.
+"""
+
+import sys, os
+import heapq
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from ucdev.nrf24 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+class nRF24Node(object):
+    """Radio in nRF24Group, with its thread and counters."""
+
+    def __init__(self, rf, role, ch=None, name=None, policy='flush'):
+        self.rf = rf
+        self.role = role
+        self.ch = ch
+        self.name = name
+        self.policy = policy
+
+        self.thread = None
+        self.queue = Queue()
+        self.retune = None
+
+        # last exception raised in thread of the radio
+        self.error = None
+
+        # timestamp all payloads before which have been merged
+        self.mark = float('-inf')
+        self.stat = dict(packets=0, polls=0, xfers=0, sent=0, max_rt=0,
+                         flushed=0, timeouts=0, failed=0, errors=0)
+
+    def __repr__(self):
+        return "{0}({1}, {2}, ch={3})".format(
+            self.__class__.__name__, self.name,
+            "RECV" if self.role == DIR_RECV else "SEND", self.ch)
+
+    # called from own thread
+    def apply(self):
+        ch, self.retune = self.retune, None
+        if ch is not None:
+            self.rf.CE = 0
+            self.rf.RF_CH = ch
+            self.ch = ch
+            if self.role == DIR_RECV:
+                self.rf.CE = 1
+
+class nRF24Group(object):
+    def __init__(self, min_wait=0.001, max_wait=0.01):
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.nodes = []
+        self.running = False
+
+        # merged RX payloads, as heap of (ts, name, pipe, data)
+        self.heap = []
+        self.cond = threading.Condition()
+        self.next_tx = 0
+
+    @staticmethod
+    def find(lib, vid=None, pid=None, CE=0, IRQ=1):
+        """Yields nRF24 on each bridge found, with shadow cache."""
+        from ucdev.cy7c65211 import CyGPIO, CySPI
+        for dev in lib.find(vid=vid, pid=pid):
+            io = CyGPIO(dev)
+            yield nRF24(CySPI(dev), CE=io.pin(CE), IRQ=io.pin(IRQ), cache=True)
+
+    def add(self, rf, role=DIR_RECV, ch=None, name=None, policy='flush'):
+        """Adds radio with given role (DIR_RECV or DIR_SEND), and sets
+        channel if given. Returns nRF24Node."""
+        if self.running:
+            raise Exception("ERROR: Cannot add radio while running")
+        if name is None:
+            name = "rf%d" % len(self.nodes)
+        node = nRF24Node(rf, role, ch, name, policy)
+        if ch is not None:
+            rf.RF_CH = ch
+        self.nodes.append(node)
+        return node
+
+    def node(self, name):
+        for node in self.nodes:
+            if node.name == name:
+                return node
+        raise Exception("ERROR: No such radio: %s" % name)
+
+    @property
+    def receivers(self):
+        return [i for i in self.nodes if i.role == DIR_RECV]
+
+    @property
+    def senders(self):
+        return [i for i in self.nodes if i.role == DIR_SEND]
+
+    def start(self):
+        self.running = True
+        for node in self.nodes:
+            loop = self.__recv_loop if node.role == DIR_RECV else self.__send_loop
+            node.thread = threading.Thread(target=loop, args=(node,),
+                                           name=node.name)
+            node.thread.daemon = True
+            node.thread.start()
+
+    def stop(self):
+        """Stops all threads, after senders have sent queued payloads."""
+        for node in self.senders:
+            node.queue.put(None)
+        for node in self.senders:
+            node.thread.join()
+
+        self.running = False
+        for node in self.receivers:
+            node.thread.join()
+
+    def retune(self, name, ch):
+        """Changes channel of radio, in its own thread."""
+        node = self.node(name)
+        node.retune = ch
+        if node.role == DIR_SEND:
+            # applied by sender thread between streams
+            node.queue.put(None)
+
+    ##################################################################
+    # RX
+
+    def __recv_loop(self, node):
+        rf = node.rf
+        stat = node.stat
+        wait = self.min_wait
+        try:
+            rf.CE = 1
+            while self.running:
+                node.apply()
+                got = []
+                for pipe, data, ts in rf.recv_stream(timeout=0, min_wait=0, stat=stat):
+                    got.append((ts, node.name, pipe, bytes(data)))
+                mark = rf.clock()
+
+                with self.cond:
+                    for i in got:
+                        heapq.heappush(self.heap, i)
+                    node.mark = mark
+                    self.cond.notify_all()
+
+                if got:
+                    wait = self.min_wait
+                else:
+                    rf.sleep(wait)
+                    wait = min(wait * 2, self.max_wait)
+            rf.CE = 0
+        except Exception as e:
+            self.__failed(node, e)
+        finally:
+            # stop holding back payloads of other receivers
+            with self.cond:
+                node.mark = float('inf')
+                self.cond.notify_all()
+
+    def recv(self, timeout=None):
+        """Returns next (timestamp, name, pipe, data) received by any
+        radio in timestamp order, or None on timeout."""
+        with self.cond:
+            deadline = None
+            while True:
+                heap = self.heap
+                marks = [i.mark for i in self.receivers]
+                if heap and heap[0][0] <= min(marks or [0]):
+                    return heapq.heappop(heap)
+                if not self.running:
+                    return heapq.heappop(heap) if heap else None
+
+                if timeout is not None:
+                    now = self.__clock()
+                    if deadline is None:
+                        deadline = now + timeout
+                    if now >= deadline:
+                        return None
+                    self.cond.wait(deadline - now)
+                else:
+                    self.cond.wait()
+
+    def __clock(self):
+        return self.nodes[0].rf.clock() if self.nodes else 0
+
+    ##################################################################
+    # TX
+
+    def send(self, data, name=None):
+        """Queues payload for sender of given name, or for each sender
+        in turn if name is not given."""
+        if name is None:
+            senders = self.senders
+            node = senders[self.next_tx % len(senders)]
+            self.next_tx += 1
+        else:
+            node = self.node(name)
+        node.queue.put(data)
+
+    def flush(self):
+        """Waits until all queued payloads are written to TX FIFO."""
+        for node in self.senders:
+            node.queue.join()
+
+    def __send_loop(self, node):
+        rf = node.rf
+        last = []
+
+        # payload taken from queue, and not yet marked done
+        pending = [None]
+
+        # payloads queued so far, so that send_stream() ends (and
+        # handles MAX_RT of last payloads) before waiting for more
+        def payloads():
+            while pending[0] is not None:
+                yield pending[0]
+                node.queue.task_done()
+                pending[0] = None
+                try:
+                    data = node.queue.get_nowait()
+                except Empty:
+                    return
+                if data is None:
+                    last.append(data)
+                    return
+                pending[0] = data
+
+        # None is queued by stop() or retune()
+        while True:
+            data = last.pop() if last else node.queue.get()
+            if data is None:
+                node.queue.task_done()
+                if node.retune is None:
+                    break
+                node.apply()
+                continue
+
+            pending[0] = data
+            try:
+                ret = rf.send_stream(payloads(), policy=node.policy)
+            except Exception as e:
+                # payload being sent is dropped
+                if pending[0] is not None:
+                    pending[0] = None
+                    node.queue.task_done()
+                self.__failed(node, e)
+                continue
+            for k in ('sent', 'max_rt', 'flushed', 'timeouts', 'failed'):
+                node.stat[k] += ret[k]
+
+    def __failed(self, node, e):
+        log.exception("%s: %s", node.name, e)
+        node.error = e
+        node.stat['errors'] += 1
+
+    ##################################################################
+
+    def stats(self):
+        """Returns dict of counters of each radio by name."""
+        return dict((i.name, dict(i.stat, ch=i.ch)) for i in self.nodes)
+
+######################################################################
+
+__all__ = ['nRF24Group', 'nRF24Node']
@@ -0,0 +1,90 @@
+# -*- coding: utf-8-unix -*-
+"""2.4GHz channel activity scanner over nRF24L01+.
+
+Sweeps channels repeatedly with nRF24.sweep(), and counts how many
+times carrier (RPD, received power above -64dBm) was detected on each
+channel in NumPy array:
+
+  scan = nRF24Scanner(rf)
+  for ts, occ in scan.waterfall(sweeps=10):
+      print(render(occ))     # one line per 10 sweeps
+
+  print(scan.occupancy())    # ratio of sweeps busy, of each channel
+  print(scan.rate())         # channels swept per second
+
+Requires NumPy.
+"""
+
+import sys, os
+import numpy as np
+
+import logging
+log = logging.getLogger(__name__)
+
+# characters for occupancy 0 to 1 in render()
+SHADES = " .:-=+*#%@"
+
+"""
+Returns occupancy array as a string of one character per channel.
+Any nonzero occupancy is shown as a visible character.
+"""
+def render(occ, shades=SHADES):
+    idx = np.ceil(np.asarray(occ) * (len(shades) - 1)).astype(int)
+    return "".join(shades[i] for i in idx.clip(0, len(shades) - 1))
+
+"""
+Returns channel header lines (tens and ones digits) for render().
+"""
+def header(channels):
+    return ["".join(str(ch // 10 % 10) for ch in channels),
+            "".join(str(ch % 10) for ch in channels)]
+
+class nRF24Scanner(object):
+    def __init__(self, rf, channels=None, dwell=170e-6):
+        self.rf = rf
+        self.channels = np.arange(126) if channels is None else np.asarray(channels)
+        self.dwell = dwell
+
+        # number of sweeps each channel was busy, in all sweeps
+        self.hits = np.zeros(len(self.channels), dtype=np.uint32)
+        self.sweeps = 0
+        self.t0 = self.t1 = None
+
+    def run(self, count=None):
+        """Yields (timestamp, hits) of each sweep, where hits is uint8
+        array of RPD on each channel. Accumulates into self.hits."""
+        self.t0 = self.rf.clock()
+        for ts, hits in self.rf.sweep(self.channels.tolist(), self.dwell, count):
+            row = np.frombuffer(hits, dtype=np.uint8)
+            self.hits += row
+            self.sweeps += 1
+            self.t1 = ts
+            yield ts, row
+
+    def waterfall(self, sweeps=10, count=None):
+        """Yields (timestamp, occupancy) for every given number of
+        sweeps, where occupancy is ratio of sweeps busy on each channel.
+        Stops after count rows, or never if count is None."""
+        acc = np.zeros(len(self.channels), dtype=np.uint32)
+        n = 0
+        for ts, row in self.run(None if count is None else count * sweeps):
+            acc += row
+            n += 1
+            if n == sweeps:
+                yield ts, acc / float(n)
+                acc[:] = 0
+                n = 0
+
+    def occupancy(self):
+        """Returns ratio of sweeps busy on each channel."""
+        return self.hits / float(max(self.sweeps, 1))
+
+    def rate(self):
+        """Returns channels swept per second."""
+        if not self.t1 or self.t1 <= self.t0:
+            return 0.0
+        return self.sweeps * len(self.channels) / (self.t1 - self.t0)
+
+######################################################################
+
+__all__ = ['nRF24Scanner', 'render', 'header']
@@ -0,0 +1,625 @@
+# -*- coding: utf-8-unix -*-
+"""Behavioral model of Nordic Semiconductor nRF24L01+.
+
+This module models nRF24L01+ register file, 3-deep TX/RX FIFOs, STATUS
+semantics, pipes and addresses, and Enhanced ShockBurst auto-ack and
+retransmit with ARD/ARC. Radios are connected through a shared virtual
+air, which delivers packets between radios on the same channel and
+datarate, with modeled airtime, loss and collisions.
+
+Model can be used in place of SPI bus and GPIO given to nRF24, so
+driver code runs without hardware:
+
+  from ucdev.nrf24 import *
+  from ucdev.nrf24sim import *
+
+  air = nRF24Air(loss=0.01)
+  tx_chip = nRF24Sim(air)
+  rx_chip = nRF24Sim(air)
+
+  tx = nRF24(tx_chip, CE=tx_chip.pin(PIN_CE), IRQ=tx_chip.pin(PIN_IRQ))
+  rx = nRF24(rx_chip, CE=rx_chip.pin(PIN_CE), IRQ=rx_chip.pin(PIN_IRQ))
+
+  tx.reset(MODE_ESB|DIR_SEND)
+  rx.reset(MODE_ESB|DIR_RECV)
+  ...
+
+Time only advances on virtual clock (air.clock), by SPI transfer
+time on each send() (SPI bit time, plus per-transfer latency if given)
+and by gpio_latency on each pin set(), so results are deterministic.
+All radios on the same air share one clock, as if a single host drives
+all of them in turn. To drive radios from multiple threads, give
+nRF24Air(clock=WallClock()) (see ucdev.common), so that each transfer
+waits in real time, and time is shared.
+
+Model can also be attached to simulated Cypress bridge as its SPI
+slave, in which case time is advanced by the bridge model:
+
+  sim = CySim()
+  sdev = sim.add_device()
+  chip = nRF24Sim(nRF24Air(clock=sim.clock))
+  sdev.spi = chip
+  sdev.gpio_watch.append(chip.gpio_watch)
+
+Packet format is not modeled in bits. Sender and receiver need to
+agree on channel, datarate, address width, CRC length, ESB/SB format
+and dynamic/static payload length for packet to be received.
+"""
+
+import sys, os
+import heapq
+import random
+import threading
+
+from ucdev.common import SPI, GPIO, SimClock
+from ucdev.nrf24 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+# GPIO pin numbers of nRF24Sim (same as wiring used by bin/nrf24-*.py)
+PIN_CE  = 0
+PIN_IRQ = 1
+
+# timing parameters [s]
+TIME_SETTLE   = 130e-6  # RX/TX settling
+TIME_AGC      = 40e-6   # RX settled -> valid RPD
+TIME_POWER_UP = 1.5e-3  # power down -> standby
+
+FIFO_DEPTH = 3
+
+# register values on power-on reset
+RESET_VALUES = {
+    CONFIG: 0x08, EN_AA: 0x3F, EN_RXADDR: 0x03, SETUP_AW: 0x03,
+    SETUP_RETR: 0x03, RF_CH: 0x02, RF_SETUP: 0x0E, STATUS: 0x0E,
+    RX_ADDR_P0: 0xE7E7E7E7E7, RX_ADDR_P1: 0xC2C2C2C2C2,
+    RX_ADDR_P2: 0xC3, RX_ADDR_P3: 0xC4, RX_ADDR_P4: 0xC5, RX_ADDR_P5: 0xC6,
+    TX_ADDR: 0xE7E7E7E7E7, FIFO_STATUS: 0x11,
+}
+
+# multi-byte address registers
+ADDR_REGISTERS = (RX_ADDR_P0, RX_ADDR_P1, TX_ADDR)
+
+RX_PW = (RX_PW_P0, RX_PW_P1, RX_PW_P2, RX_PW_P3, RX_PW_P4, RX_PW_P5)
+RX_ADDR = (RX_ADDR_P0, RX_ADDR_P1, RX_ADDR_P2, RX_ADDR_P3, RX_ADDR_P4, RX_ADDR_P5)
+
+# STATUS bits cleared by writing 1
+STATUS_IRQ = STATUS.RX_DR | STATUS.TX_DS | STATUS.MAX_RT
+
+class nRF24Packet(object):
+    """Packet on air, with parameters receiver needs to agree on."""
+
+    def __init__(self, src, payload, pid, noack):
+        self.src = src
+        self.payload = payload
+        self.pid = pid
+        self.noack = noack
+
+        self.ch   = src.channel
+        self.rate = src.rate
+        self.addr = src.address(TX_ADDR)
+        self.crc  = src.crc
+        self.esb  = src.esb
+        self.dpl  = src.dpl(0)
+
+        self.collided = False
+        self.t0 = self.t1 = None
+
+    def bits(self):
+        nr = 1 + len(self.addr) + len(self.payload) + self.crc
+        return nr * 8 + (9 if self.esb else 0)
+
+class nRF24Air(object):
+    """Shared medium connecting modeled radios."""
+
+    # on-air bitrate of each datarate
+    BITRATE = {RATE_250K: 250e3, RATE_1M: 1e6, RATE_2M: 2e6}
+
+    def __init__(self, clock=None, loss=0.0, seed=0):
+        self.clock  = clock if clock else SimClock()
+        self.loss   = loss
+        self.random = random.Random(seed)
+        self.radios = []
+        self.active = []
+        self.events = []
+        self.seq    = 0
+        self.stats  = dict(tx=0, rx=0, ack=0, lost=0, collided=0, dup=0, overflow=0)
+
+        # held while radio state is accessed, so that radios can be
+        # driven by multiple threads (see WallClock)
+        self.lock = threading.RLock()
+
+    def attach(self, radio):
+        self.radios.append(radio)
+
+    def airtime(self, pkt):
+        return pkt.bits() / self.BITRATE[pkt.rate]
+
+    def schedule(self, t, func, *args):
+        self.seq += 1
+        heapq.heappush(self.events, (t, self.seq, func, args))
+
+    def run(self):
+        """Processes all events scheduled up to current time."""
+        now = self.clock.now
+        events = self.events
+        while events and events[0][0] <= now:
+            t, seq, func, args = heapq.heappop(events)
+            func(t, *args)
+
+    def is_lost(self):
+        return self.loss > 0 and self.random.random() < self.loss
+
+    def transmit(self, t, pkt):
+        """Puts packet on air from time t. Returns end time of packet."""
+        pkt.t0 = t
+        pkt.t1 = t + self.airtime(pkt)
+        self.stats['tx'] += 1
+
+        # collide with packets overlapping on the same channel
+        self.active = [i for i in self.active if i.t1 > t]
+        for i in self.active:
+            if i.ch == pkt.ch:
+                i.collided = pkt.collided = True
+        self.active.append(pkt)
+
+        for radio in self.radios:
+            if radio is not pkt.src:
+                radio.carrier(t, pkt)
+
+        self.schedule(pkt.t1, self.deliver, pkt)
+        return pkt.t1
+
+    def deliver(self, t, pkt):
+        if pkt.collided:
+            self.stats['collided'] += 1
+            return pkt.src.tx_result(t, pkt, None)
+        if self.is_lost():
+            self.stats['lost'] += 1
+            return pkt.src.tx_result(t, pkt, None)
+
+        ack = None
+        for radio in self.radios:
+            if radio is not pkt.src:
+                ret = radio.receive(t, pkt)
+                if ret is not None and ack is None:
+                    ack = ret
+
+        # ACK packet is subject to loss, but not to collision
+        if ack is not None and self.is_lost():
+            self.stats['lost'] += 1
+            ack = None
+        pkt.src.tx_result(t, pkt, ack)
+
+class nRF24Sim(SPI, GPIO):
+    """Model of single nRF24L01+ chip, accessed by SPI and CE/IRQ pins."""
+
+    MOTOROLA = 0
+
+    def __init__(self, air, latency=0.0, gpio_latency=0.0):
+        self.air = air
+        self.clock = air.clock
+        self.latency = latency
+        self.gpio_latency = gpio_latency
+        self.config = {'frequency': 1000000}
+        self.nr_xfer = 0
+        air.attach(self)
+        self.reset()
+
+    def reset(self):
+        self.regs = dict(RESET_VALUES)
+        for reg in (OBSERVE_TX, CD, DYNPD, FEATURE) + RX_PW:
+            self.regs.setdefault(reg, 0)
+
+        self.tx_fifo = []   # [(pipe, payload, noack, pid)]
+        self.rx_fifo = []   # [(pipe, payload)]
+        self.tx_last = None
+        self.tx_reuse = False
+        self.tx_busy = False
+        self.tx_retry = 0
+        self.pid = 0
+        self.last_rx = {}
+        self.ce = 0
+        self.ready_at = 0.0
+        self.rx_since = None
+        self.heard = {}     # {channel: end time of latest packet}
+
+    ##################################################################
+    # SPI interface (compatible with CySPI and sim slave)
+
+    def set_config(self, config):
+        self.config.update(config)
+        return 0
+
+    def get_config(self):
+        return dict(self.config)
+
+    def send(self, data):
+        with self.air.lock:
+            ret = self.transfer(data)
+        self.clock.advance(self.latency + len(data) * 8.0 / self.config['frequency'])
+        return ret
+
+    def send_into(self, data, out=None):
+        ret = self.send(data)
+        if out is None:
+            return memoryview(ret)
+        out[:len(ret)] = ret
+        return memoryview(out)[:len(ret)]
+
+    def transfer(self, data):
+        self.air.run()
+        self.nr_xfer += 1
+
+        data = bytearray(data)
+        ret = bytearray(len(data))
+        ret[0] = self.status()
+        cmd, arg = data[0], data[1:]
+
+        if cmd < W_REGISTER:
+            val = self.read_reg(cmd & 0x1F)
+            nr = min(len(arg), len(val))
+            ret[1:1 + nr] = val[:nr]
+        elif cmd < W_REGISTER + 0x20:
+            self.write_reg(cmd & 0x1F, arg)
+        elif cmd == R_RX_PAYLOAD:
+            if self.rx_fifo:
+                pipe, payload = self.rx_fifo.pop(0)
+                nr = min(len(arg), len(payload))
+                ret[1:1 + nr] = payload[:nr]
+        elif cmd == R_RX_PL_WID:
+            if self.rx_fifo and len(arg):
+                ret[1] = len(self.rx_fifo[0][1])
+        elif cmd in (W_TX_PAYLOAD, W_TX_PAYLOAD_NOACK):
+            noack = cmd == W_TX_PAYLOAD_NOACK and self.regs[FEATURE] & FEATURE.EN_DYN_ACK
+            self.push_tx(None, arg, bool(noack))
+        elif W_ACK_PAYLOAD <= cmd <= W_ACK_PAYLOAD + 5:
+            self.push_tx(cmd - W_ACK_PAYLOAD, arg, False)
+        elif cmd == FLUSH_TX:
+            self.tx_fifo = []
+            self.tx_reuse = False
+        elif cmd == FLUSH_RX:
+            self.rx_fifo = []
+        elif cmd == REUSE_TX_PL:
+            self.tx_reuse = self.tx_last is not None
+            self.kick_tx(self.clock.now)
+        return ret
+
+    ##################################################################
+    # GPIO interface for CE and IRQ pins
+
+    def get(self, nr):
+        with self.air.lock:
+            self.air.run()
+            if nr == PIN_CE:
+                return self.ce
+            if nr == PIN_IRQ:
+                # active low
+                return 0 if self.status() & STATUS_IRQ & ~self.regs[CONFIG] else 1
+            return 0
+
+    def set(self, nr, val):
+        if nr == PIN_CE:
+            with self.air.lock:
+                self.set_ce(val)
+        self.clock.advance(self.gpio_latency)
+
+    # watcher function for CySimDevice.gpio_watch
+    def gpio_watch(self, nr, val):
+        self.set(nr, val)
+
+    def set_ce(self, val):
+        self.air.run()
+        val = 1 if val else 0
+        rising = val and not self.ce
+        self.ce = val
+        self.update_mode()
+        if rising:
+            self.kick_tx(self.clock.now)
+
+    ##################################################################
+    # register file
+
+    def read_reg(self, reg):
+        val = self.regs.get(reg, 0)
+        if reg == STATUS:
+            val = self.status()
+        elif reg == FIFO_STATUS:
+            val = self.fifo_status()
+        elif reg == CD and self.rx_since is not None:
+            self.update_cd()
+            val = self.regs[CD]
+
+        nr = self.aw if reg in ADDR_REGISTERS else 1
+        return bytearray((val >> (8 * i)) & 0xFF for i in range(nr))
+
+    def write_reg(self, reg, data):
+        if not data or reg not in self.regs:
+            return
+
+        # LSByte first
+        nr = self.aw if reg in ADDR_REGISTERS else 1
+        val = 0
+        for i, b in enumerate(bytearray(data[:nr])):
+            val |= b << (8 * i)
+
+        if reg == STATUS:
+            cleared = self.regs[STATUS] & val & STATUS_IRQ
+            self.regs[STATUS] &= ~cleared
+            if cleared & STATUS.MAX_RT:
+                self.kick_tx(self.clock.now)
+            return
+        if reg in (FIFO_STATUS, OBSERVE_TX, CD):
+            return
+        if reg in ADDR_REGISTERS:
+            # keep upper bytes beyond address width
+            mask = (1 << (8 * nr)) - 1
+            val = (self.regs[reg] & ~mask) | val
+        if reg == RF_CH:
+            self.regs[OBSERVE_TX] &= ~OBSERVE_TX.PLOG_CNT
+
+        old = self.regs[reg]
+        self.regs[reg] = val
+
+        if reg == CONFIG:
+            if val & CONFIG.PWR_UP and not old & CONFIG.PWR_UP:
+                self.ready_at = self.clock.now + TIME_POWER_UP
+            self.update_mode()
+            self.kick_tx(self.clock.now)
+
+    def status(self):
+        val = self.regs[STATUS] & STATUS_IRQ
+        pipe = self.rx_fifo[0][0] if self.rx_fifo else 0b111
+        val |= pipe << STATUS.RX_P_NO.offset
+        if len(self.tx_fifo) >= FIFO_DEPTH:
+            val |= STATUS.TX_FULL
+        return val
+
+    def fifo_status(self):
+        val = 0
+        if self.tx_reuse:
+            val |= FIFO_STATUS.TX_REUSE
+        if len(self.tx_fifo) >= FIFO_DEPTH:
+            val |= FIFO_STATUS.TX_FULL
+        if not self.tx_fifo:
+            val |= FIFO_STATUS.TX_EMPTY
+        if len(self.rx_fifo) >= FIFO_DEPTH:
+            val |= FIFO_STATUS.RX_FULL
+        if not self.rx_fifo:
+            val |= FIFO_STATUS.RX_EMPTY
+        return val
+
+    ##################################################################
+    # radio configuration
+
+    @property
+    def aw(self):
+        return max(self.regs[SETUP_AW] & SETUP_AW.AW, 1) + 2
+
+    @property
+    def channel(self):
+        return self.regs[RF_CH] & RF_CH.RF_CH
+
+    @property
+    def rate(self):
+        val = self.regs[RF_SETUP]
+        if val & RF_SETUP.RF_DR_LOW:
+            return RATE_250K
+        return RATE_2M if val & RF_SETUP.RF_DR_HIGH else RATE_1M
+
+    @property
+    def crc(self):
+        # EN_CRC is forced high if auto-ack is enabled on any pipe
+        val = self.regs[CONFIG]
+        if not (val & CONFIG.EN_CRC or self.regs[EN_AA] & 0x3F):
+            return 0
+        return 2 if val & CONFIG.CRCO else 1
+
+    @property
+    def esb(self):
+        return bool(self.regs[EN_AA] & 0x3F or self.regs[SETUP_RETR] & SETUP_RETR.ARC
+                    or self.regs[FEATURE] & FEATURE.EN_DPL)
+
+    def dpl(self, pipe):
+        return bool(self.regs[FEATURE] & FEATURE.EN_DPL and self.regs[DYNPD] & (1 << pipe))
+
+    def address(self, reg):
+        aw = self.aw
+        if reg in (RX_ADDR_P2, RX_ADDR_P3, RX_ADDR_P4, RX_ADDR_P5):
+            val = (self.regs[RX_ADDR_P1] & ~0xFF) | self.regs[reg]
+        else:
+            val = self.regs[reg]
+        return bytearray((val >> (8 * i)) & 0xFF for i in range(aw))
+
+    @property
+    def powered(self):
+        return self.regs[CONFIG] & CONFIG.PWR_UP
+
+    @property
+    def is_rx(self):
+        return self.regs[CONFIG] & CONFIG.PRIM_RX
+
+    def update_mode(self):
+        now = self.clock.now
+        if self.powered and self.is_rx and self.ce:
+            if self.rx_since is None:
+                self.rx_since = max(now, self.ready_at) + TIME_SETTLE
+                self.regs[CD] = 0
+        elif self.rx_since is not None:
+            # RPD stays latched after leaving RX mode
+            self.update_cd()
+            self.rx_since = None
+
+    def update_cd(self):
+        """Sets RPD if any packet was on air on the channel since RPD
+        got valid in current RX mode."""
+        start = self.rx_since + TIME_AGC
+        if self.clock.now >= start and self.heard.get(self.channel, 0) > start:
+            self.regs[CD] = 1
+
+    ##################################################################
+    # TX
+
+    def push_tx(self, pipe, data, noack):
+        if len(self.tx_fifo) >= FIFO_DEPTH:
+            return
+        # PID is incremented for each new payload, not for retransmit
+        self.pid = (self.pid + 1) & 3
+        self.tx_fifo.append((pipe, bytearray(data[:32]), noack, self.pid))
+        self.tx_reuse = False
+        self.kick_tx(self.clock.now)
+
+    def next_tx(self):
+        for i, (pipe, payload, noack, pid) in enumerate(self.tx_fifo):
+            if pipe is None:
+                return i
+        return None
+
+    def kick_tx(self, t):
+        """Starts transmission if there is a payload and CE is high."""
+        if self.tx_busy or not self.ce or not self.powered or self.is_rx:
+            return
+        if self.regs[STATUS] & STATUS.MAX_RT:
+            return
+        if not self.tx_reuse and self.next_tx() is None:
+            return
+
+        self.tx_busy = True
+        self.tx_retry = 0
+        self.regs[OBSERVE_TX] &= ~OBSERVE_TX.ARC_CNT
+        self.air.schedule(max(t, self.ready_at) + TIME_SETTLE, self.tx_start)
+
+    def tx_start(self, t):
+        if self.tx_reuse:
+            payload, noack, pid = self.tx_last
+        else:
+            i = self.next_tx()
+            if i is None:
+                self.tx_busy = False
+                return
+            pipe, payload, noack, pid = self.tx_fifo[i]
+
+        pkt = nRF24Packet(self, payload, pid, noack)
+        self.air.transmit(t, pkt)
+
+    def want_ack(self, pkt):
+        return pkt.esb and not pkt.noack and self.regs[EN_AA] & 1
+
+    def tx_result(self, t, pkt, ack):
+        if not self.want_ack(pkt):
+            return self.tx_done(t, pkt)
+
+        ard = ((self.regs[SETUP_RETR] & SETUP_RETR.ARD) >> SETUP_RETR.ARD.offset) + 1
+        ard *= 250e-6
+
+        # ACK is received on pipe 0, and needs to arrive within ARD
+        if ack is not None and self.address(RX_ADDR_P0) == pkt.addr:
+            t_ack = TIME_SETTLE + self.air.airtime(ack)
+            if t_ack <= ard:
+                self.air.stats['ack'] += 1
+                return self.air.schedule(t + t_ack, self.tx_done, pkt, ack)
+
+        arc = self.regs[SETUP_RETR] & SETUP_RETR.ARC
+        if self.tx_retry < arc:
+            self.tx_retry += 1
+            self.regs[OBSERVE_TX] = (self.regs[OBSERVE_TX] & ~OBSERVE_TX.ARC_CNT) | self.tx_retry
+            self.air.schedule(t + ard, self.tx_start)
+        else:
+            plos = min((self.regs[OBSERVE_TX] >> OBSERVE_TX.PLOG_CNT.offset) + 1, 15)
+            self.regs[OBSERVE_TX] = (plos << OBSERVE_TX.PLOG_CNT.offset) | self.tx_retry
+            self.regs[STATUS] |= STATUS.MAX_RT
+            self.tx_busy = False
+
+    def tx_done(self, t, pkt, ack=None):
+        self.tx_busy = False
+        self.regs[STATUS] |= STATUS.TX_DS
+
+        if not self.tx_reuse:
+            i = self.next_tx()
+            if i is not None:
+                self.tx_fifo.pop(i)
+            self.tx_last = (pkt.payload, pkt.noack, pkt.pid)
+
+        if ack is not None and ack.payload:
+            self.rx_push(0, ack.payload)
+
+        # continue with next payload while CE is high
+        if self.ce:
+            self.kick_tx(t)
+
+    ##################################################################
+    # RX
+
+    def carrier(self, t, pkt):
+        # only latest one is needed, as earlier ones end before it
+        if pkt.t1 > self.heard.get(pkt.ch, 0):
+            self.heard[pkt.ch] = pkt.t1
+
+    def rx_push(self, pipe, payload):
+        if len(self.rx_fifo) >= FIFO_DEPTH:
+            self.air.stats['overflow'] += 1
+            return False
+        self.rx_fifo.append((pipe, bytearray(payload)))
+        self.regs[STATUS] |= STATUS.RX_DR
+        return True
+
+    def match_pipe(self, pkt):
+        if pkt.ch != self.channel or pkt.rate != self.rate:
+            return None
+        if pkt.crc != self.crc or pkt.esb != self.esb or len(pkt.addr) != self.aw:
+            return None
+
+        for pipe in range(6):
+            if not self.regs[EN_RXADDR] & (1 << pipe):
+                continue
+            if self.address(RX_ADDR[pipe]) != pkt.addr:
+                continue
+            if pkt.dpl != self.dpl(pipe):
+                return None
+            if not pkt.dpl and self.regs[RX_PW[pipe]] != len(pkt.payload):
+                return None
+            return pipe
+        return None
+
+    def receive(self, t, pkt):
+        """Receives packet ending at time t.
+
+        Returns ACK packet to send back, or None if not acked.
+        """
+        if self.rx_since is None or self.rx_since > pkt.t0:
+            return None
+        pipe = self.match_pipe(pkt)
+        if pipe is None:
+            return None
+
+        # discard retransmitted packet already received
+        key = (pkt.pid, bytes(pkt.payload))
+        if pkt.esb and self.last_rx.get(pipe) == key:
+            self.air.stats['dup'] += 1
+        elif self.rx_push(pipe, pkt.payload):
+            self.air.stats['rx'] += 1
+            self.last_rx[pipe] = key
+        else:
+            # no ACK when RX FIFO is full
+            return None
+
+        if not pkt.esb or pkt.noack or not self.regs[EN_AA] & (1 << pipe):
+            return None
+
+        # ACK, with payload queued for this pipe if any
+        payload = bytearray()
+        if self.regs[FEATURE] & FEATURE.EN_ACK_PAY:
+            for i, (p, data, noack, pid) in enumerate(self.tx_fifo):
+                if p == pipe:
+                    payload = data
+                    self.tx_fifo.pop(i)
+                    self.regs[STATUS] |= STATUS.TX_DS
+                    break
+
+        ack = nRF24Packet(self, payload, pkt.pid, True)
+        ack.addr = pkt.addr
+        return ack
+
+######################################################################
+
+__all__ = ['PIN_CE', 'PIN_IRQ', 'nRF24Air', 'nRF24Sim', 'nRF24Packet']
@@ -0,0 +1,334 @@
+# -*- coding: utf-8-unix -*-
+"""Packet sniffer for nRF24L01+ (Enhanced) ShockBurst traffic.
+
+Puts radio in "promiscuous" mode (2-byte address 0x0055 matching
+preamble and background noise, no CRC, 32-byte static payload), as
+done by bin/nrf24-dump.py, and decodes frames from raw captures:
+
+  sniff = nRF24Sniffer(rf, pcap=PcapWriter("out.pcap"))
+  sniff.setup(ch=5, rate=RATE_2M)
+  for frame in sniff.run():
+      print(frame)
+
+Each capture starts with address of sniffed packet (if any), followed
+by 9-bit packet control field (ESB only), payload, and CRC-16:
+
+  +---------+-----------------------+---------+--------+
+  | address | PCF (LEN:6 PID:2 NA:1)| payload | CRC-16 |  noise ...
+  +---------+-----------------------+---------+--------+
+
+As nothing tells where the frame ends, all candidate address widths
+(aw) and payload sizes are tried, and one with matching CRC is taken.
+ESB payload size is taken from PCF, and static sizes given by sizes
+are tried in addition. CRC of every prefix of a capture is computed
+once (table-driven), so each candidate only costs a compare.
+Candidates are tried from shortest, and frames with CRC of 0 are not
+taken (see decode()). SB frames
+(no PCF) are only tried if sb=True, as trying all sizes raises chance
+of noise passing CRC (about 1/65536 for each candidate).
+
+ESB retransmissions (same address, PID and CRC as one of last two
+frames of the address, within dedup seconds) are dropped.
+
+Frames are written to pcap file with LINKTYPE_USER0, as below:
+
+  +-------+----+----+---------+---------+------------+
+  | flags | ch | aw | address | payload | CRC-16(BE) |
+  +-------+----+----+---------+---------+------------+
+
+  flags: bit0 = ESB, bit1 = NO_ACK, bit2-3 = PID
+
+All bytes are in on-air order. Note that R_RX_PAYLOAD/W_TX_PAYLOAD of
+ucdev.nrf24 reverse payload bytes, so payload sent by nRF24.send()
+appears reversed.
+"""
+
+import sys, os
+import time
+from struct import pack
+from binascii import hexlify, unhexlify
+from collections import deque
+
+from ucdev.nrf24 import *
+
+import logging
+log = logging.getLogger(__name__)
+
+CAPTURE_SIZE = 32
+
+LINKTYPE_USER0 = 147
+
+FLAG_ESB   = 0x01
+FLAG_NOACK = 0x02
+
+# CRC-16-CCITT as used by nRF24 (x^16+x^12+x^5+1, initial 0xFFFF)
+CRC_POLY = 0x1021
+CRC_INIT = 0xFFFF
+
+def make_crc_table():
+    ret = []
+    for i in range(256):
+        crc = i << 8
+        for j in range(8):
+            crc = ((crc << 1) ^ (CRC_POLY if crc & 0x8000 else 0)) & 0xFFFF
+        ret.append(crc)
+    return ret
+
+CRC_TABLE = make_crc_table()
+
+"""
+Returns CRC-16 of data, continuing from given crc.
+"""
+def crc16(data, crc=CRC_INIT):
+    table = CRC_TABLE
+    for b in bytearray(data):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+"""
+Updates CRC-16 with lowest nbits of val, MSBit first.
+"""
+def crc16_bits(val, nbits, crc=CRC_INIT):
+    for i in range(nbits - 1, -1, -1):
+        bit = (val >> i) & 1
+        crc = ((crc << 1) & 0xFFFF) ^ (CRC_POLY if (crc >> 15) ^ bit else 0)
+    return crc
+
+def to_bytes(val, nr):
+    return unhexlify("%0*x" % (int(nr) * 2, val)) if nr else b""
+
+"""
+Returns on-air bytes of a frame (zero-padded to byte boundary), as it
+appears in capture. Used to generate test captures.
+"""
+def encode(addr, payload, pid=0, noack=0, esb=True):
+    addr, payload = bytearray(addr), bytearray(payload)
+    nr = len(addr) * 8
+    val = int(hexlify(addr), 16) if addr else 0
+    if esb:
+        pcf = (len(payload) << 3) | ((pid & 3) << 1) | (noack & 1)
+        val = (val << 9) | pcf
+        nr += 9
+    if payload:
+        val = (val << (8 * len(payload))) | int(hexlify(payload), 16)
+    nr += 8 * len(payload)
+
+    crc = crc16(to_bytes(val >> (nr & 7), nr >> 3))
+    crc = crc16_bits(val, nr & 7, crc)
+    val = (val << 16) | crc
+    nr += 16
+
+    pad = -nr % 8
+    return bytearray(to_bytes(val << pad, (nr + pad) // 8))
+
+class nRF24Frame(object):
+    __slots__ = ('ts', 'ch', 'esb', 'addr', 'pid', 'noack', 'payload', 'crc')
+
+    def __init__(self, ts, ch, esb, addr, pid, noack, payload, crc):
+        self.ts = ts
+        self.ch = ch
+        self.esb = esb
+        self.addr = addr
+        self.pid = pid
+        self.noack = noack
+        self.payload = payload
+        self.crc = crc
+
+    def __repr__(self):
+        return "{0}(ch={1}, {2}, addr={3}, pid={4}, noack={5}, payload={6})".format(
+            self.__class__.__name__, self.ch, "ESB" if self.esb else "SB",
+            hexlify(self.addr).decode(), self.pid, self.noack,
+            hexlify(self.payload).decode())
+
+    def tobytes(self):
+        """Returns frame in pcap record format."""
+        flags = (FLAG_ESB if self.esb else 0) | (FLAG_NOACK if self.noack else 0)
+        flags |= (self.pid & 3) << 2
+        return (pack("BBB", flags, self.ch or 0, len(self.addr)) +
+                bytes(self.addr) + bytes(self.payload) + pack(">H", self.crc))
+
+######################################################################
+
+class PcapWriter(object):
+    """Writes pcap file of given link type."""
+
+    def __init__(self, f, linktype=LINKTYPE_USER0, snaplen=256):
+        self.fp = open(f, "wb") if isinstance(f, str) else f
+        self.fp.write(pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, snaplen, linktype))
+
+    def write(self, ts, data):
+        sec = int(ts)
+        usec = int((ts - sec) * 1e6)
+        self.fp.write(pack("<IIII", sec, usec, len(data), len(data)))
+        self.fp.write(data)
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+######################################################################
+
+class nRF24Sniffer(object):
+    def __init__(self, rf, aw=(5, 4, 3), sizes=(), esb=True, sb=False,
+                 dedup=0.1, pcap=None):
+        self.rf = rf
+        self.ch = None
+        self.dedup = dedup
+        self.pcap = pcap
+
+        # (aw, ESB or not, payload size or None to take it from PCF)
+        self.candidates = []
+        for n in aw:
+            if esb:
+                self.candidates += [(n, True, None)]
+                self.candidates += [(n, True, i) for i in sizes]
+            if sb:
+                self.candidates += [(n, False, i)
+                                    for i in (sizes or range(CAPTURE_SIZE - 2 - n, -1, -1))]
+
+        # {address: [(pid, crc, ts), ...]} of last 2 ESB frames
+        self.recent = {}
+        self.stat = dict(captures=0, frames=0, dups=0, noise=0)
+
+    def setup(self, ch, rate=None, prefix=0x0055, freq=100000):
+        """Configures radio to capture all packets on channel."""
+        rf = self.rf
+        mode = MODE_SB | DIR_RECV
+        if rate:
+            mode |= rate
+        rf.reset(mode, freq)
+        rf.CE = 0
+        rf.FEATURE = 0
+        rf.DYNPD = 0
+        rf.RF_CH = ch
+
+        # 2-byte address, and no CRC (see bin/nrf24-dump.py)
+        rf.SETUP_AW = 0
+        rf.RX_ADDR_P0 = prefix
+        rf.RX_PW_P0 = CAPTURE_SIZE
+        rf.EN_RXADDR = 0x01
+        rf.CONFIG = rf.CONFIG(EN_CRC=0)
+        rf.FLUSH_RX()
+        rf.CE = 1
+        self.ch = ch
+
+    def decode(self, cap, ts=None):
+        """Returns nRF24Frame found in capture (in on-air order), or None."""
+        cap = bytes(cap)
+        bits = len(cap) * 8
+        val = int(hexlify(cap), 16)
+
+        # CRC of each prefix of capture
+        table = CRC_TABLE
+        crc = CRC_INIT
+        crcs = [crc]
+        for b in bytearray(cap):
+            crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+            crcs.append(crc)
+
+        # frame length of each candidate
+        found = []
+        for aw, esb, size in self.candidates:
+            head = aw * 8
+            pcf = 0
+            if esb:
+                head += 9
+                pcf = (val >> (bits - head)) & 0x1FF
+            length = (pcf >> 3) if size is None else size
+            nr = head + length * 8
+            if nr + 16 <= bits:
+                found.append((nr, -aw, esb, length, pcf))
+
+        # Shortest first, as candidate ending within CRC of real frame
+        # also matches if followed by zeros. For the same reason, zero
+        # CRC (candidate covering whole frame and CRC) is not taken.
+        # Of the same length (which share CRC), wider address is taken.
+        found.sort()
+        for nr, aw, esb, length, pcf in found:
+            aw = -aw
+            crc = crcs[nr >> 3]
+            if nr & 7:
+                crc = crc16_bits(val >> (bits - nr), nr & 7, crc)
+            if crc != (val >> (bits - nr - 16)) & 0xFFFF or crc == 0:
+                continue
+
+            if esb:
+                payload = to_bytes((val >> (bits - nr)) & ((1 << (length * 8)) - 1), length)
+            else:
+                payload = cap[aw:aw + length]
+            return nRF24Frame(ts, self.ch, esb, cap[:aw], (pcf >> 1) & 3,
+                              pcf & 1, payload, crc)
+        return None
+
+    def is_dup(self, frame):
+        if not frame.esb:
+            return False
+        recent = self.recent.setdefault(frame.addr, deque(maxlen=2))
+        for pid, crc, ts in recent:
+            if pid == frame.pid and crc == frame.crc and frame.ts - ts < self.dedup:
+                return True
+        recent.append((frame.pid, frame.crc, frame.ts))
+        return False
+
+    def feed(self, ts, cap):
+        """Decodes capture (in on-air order), and returns new frame in
+        it, or None if noise or retransmission."""
+        self.stat['captures'] += 1
+        frame = self.decode(cap, ts)
+        if frame is None:
+            self.stat['noise'] += 1
+            return None
+        if self.is_dup(frame):
+            self.stat['dups'] += 1
+            return None
+
+        self.stat['frames'] += 1
+        if self.pcap:
+            self.pcap.write(ts, frame.tobytes())
+        return frame
+
+    def run(self, timeout=None, min_wait=0.001, max_wait=0.1, batch=64):
+        """Yields new frames captured, until no capture arrives for
+        timeout seconds (or forever if None).
+
+        Captures are read with single prebuilt R_RX_PAYLOAD command each,
+        taking FIFO state from STATUS, and are decoded only when RX FIFO
+        gets empty (or after batch captures), so reading is not delayed
+        by decoding while packets keep arriving.
+        """
+        send = self.rf.spi.send
+        clock, sleep = self.rf.clock, self.rf.sleep
+        cmd = pack("<B%dx" % CAPTURE_SIZE, R_RX_PAYLOAD)
+
+        pending = []
+        wait = min_wait
+        idle = clock()
+        while True:
+            ret = send(cmd)
+            # RX_P_NO is 7 if RX FIFO was empty
+            if ret[0] & 0x0E != 0x0E:
+                pending.append((clock(), ret[1:]))
+                if len(pending) < batch:
+                    continue
+
+            if pending:
+                for ts, cap in pending:
+                    frame = self.feed(ts, cap)
+                    if frame:
+                        yield frame
+                pending = []
+                wait = min_wait
+                idle = clock()
+                continue
+
+            if timeout is not None and clock() - idle >= timeout:
+                return
+            sleep(wait)
+            wait = min(wait * 2, max_wait)
+
+######################################################################
+
+__all__ = ['nRF24Sniffer', 'nRF24Frame', 'PcapWriter', 'crc16', 'encode',
+           'LINKTYPE_USER0', 'CAPTURE_SIZE']
@@ -0,0 +1,364 @@
+# -*- coding: utf-8-unix -*-
+"""Reliable message transport over nRF24L01+.
+
+Splits messages larger than 32-byte payload into sequence-numbered
+fragments, keeps a window of them in flight, and reassembles them on
+the other end:
+
+  tx = nRF24Sender(tx_rf)
+  rx = nRF24Receiver(rx_rf)
+
+  tx.send(b"..." * 100)      # blocks until acknowledged
+  msg = rx.recv(timeout=1)   # blocks until whole message arrives
+
+Both radios must be in ESB mode (auto-ack), with sender RX_ADDR_P0
+same as TX_ADDR, and must be set up with the same ack_payload option.
+
+Each fragment carries 2-byte header of flags and length, and sequence
+number, followed by up to 30 bytes of data:
+
+  +-------+-----+-----+---------+-----+
+  | START | END | POLL| LEN:5   | SEQ |  data ...
+  +-------+-----+-----+---------+-----+
+
+Acknowledgement works in one of two ways:
+
+- ack_payload=True (default): receiver returns cumulative ack (next
+  expected sequence number) in ACK payload. Sender keeps up to window
+  fragments unacknowledged, and on MAX_RT flushes TX FIFO and resends
+  from the oldest unacknowledged fragment (go-back-N). As ACK payload
+  rides on ACK of the next packet, sender sends empty POLL fragment
+  to fetch it when nothing else is left to send. Requires dynamic
+  payload length, which is enabled on all pipes.
+
+- ack_payload=False: ESB auto-ack is the only acknowledgement, and
+  window is TX FIFO itself. Fragments are never flushed, and MAX_RT
+  is cleared to retransmit. Receiver uses sequence numbers to drop
+  duplicates, and drops a partial message on gap.
+
+Both ends are driven by poll(), which does as much as possible without
+waiting, so a pair can be run in a single thread:
+
+  tx.write(msg)
+  while tx.busy:
+      tx.poll()
+      rx.poll()
+
+send() and recv() simply repeat poll() until done. Each end must be
+started fresh together, as there is no handshake to sync sequence.
+
+"""
+
+import sys, os
+from collections import deque
+
+from ucdev.nrf24 import *
+from ucdev.nrf24 import to_buffer
+
+import logging
+log = logging.getLogger(__name__)
+
+# header flags
+FLAG_START = 0x80
+FLAG_END   = 0x40
+FLAG_POLL  = 0x20
+LEN_MASK   = 0x1F
+
+HEAD_SIZE = 2
+DATA_SIZE = 32 - HEAD_SIZE
+
+def has_dpl(rf, pipe):
+    """Returns True if radio has dynamic payload length enabled on pipe."""
+    return bool(rf.FEATURE.EN_DPL and rf.DYNPD.uint & (1 << pipe))
+
+def enable_ack_payload(rf):
+    """Enables dynamic payload length on all pipes, and ACK payload."""
+    rf.FEATURE = rf.FEATURE(EN_DPL=1, EN_ACK_PAY=1)
+    rf.DYNPD = 0x3F
+
+def fragment(data, seq=0, size=None):
+    """Returns list of fragment frames for given message, each padded
+    to size if given."""
+    data = bytearray(to_buffer(data))
+    ret = []
+    for off in range(0, max(len(data), 1), DATA_SIZE):
+        chunk = data[off:off + DATA_SIZE]
+        flags = len(chunk)
+        if off == 0:
+            flags |= FLAG_START
+        if off + DATA_SIZE >= len(data):
+            flags |= FLAG_END
+
+        frame = bytearray([flags, (seq + len(ret)) & 0xFF]) + chunk
+        if size:
+            frame += bytearray(size - len(frame))
+        ret.append(frame)
+    return ret
+
+######################################################################
+
+class nRF24Sender(object):
+    def __init__(self, rf, window=32, ack_payload=True, retries=15):
+        if not 0 < window < 128:
+            raise Exception("ERROR: window must be in 1..127: %d" % window)
+
+        self.rf = rf
+        self.window = window
+        self.ack_payload = ack_payload
+        self.retries = retries
+
+        if ack_payload:
+            enable_ack_payload(rf)
+        self.size = None if has_dpl(rf, 0) else 32
+
+        # fragments not yet acknowledged, with seq of the first one,
+        # next one to write, and the highest one ever written
+        self.frags = deque()
+        self.base = 0
+        self.next = 0
+        self.high = 0
+
+        self.active = False
+        self.retry = 0
+        self.t0 = self.t1 = None
+        self.stat = dict(messages=0, bytes=0, frames=0, retransmits=0,
+                         polls=0, acks=0, max_rt=0)
+
+    @property
+    def busy(self):
+        return len(self.frags) > 0
+
+    def write(self, data):
+        """Queues message for sending."""
+        seq = self.base + len(self.frags)
+        frames = fragment(data, seq, self.size)
+        for i, frame in enumerate(frames):
+            # (frame, message bytes, end of message)
+            nr = frame[0] & LEN_MASK
+            self.frags.append((frame, nr, i == len(frames) - 1))
+
+        if self.t0 is None:
+            self.t0 = self.rf.clock()
+
+    def poll(self):
+        """Sends queued fragments while window and TX FIFO have room,
+        and processes acknowledgements. Returns without waiting.
+        """
+        rf = self.rf
+        if not self.frags:
+            return
+        if not self.active:
+            rf.W_REGISTER(STATUS, TX_DS=1, MAX_RT=1)
+            rf.CE = 1
+            self.active = True
+
+        st = None
+        end = self.base + min(len(self.frags), self.window)
+        while self.next < end:
+            frame = self.frags[self.next - self.base][0]
+            st = rf.W_TX_PAYLOAD(frame)
+            # payload written to full FIFO is ignored
+            if st.TX_FULL:
+                break
+            if self.next < self.high:
+                self.stat['retransmits'] += 1
+            else:
+                self.stat['frames'] += 1
+                self.high = self.next + 1
+            self.next += 1
+            if not self.ack_payload:
+                # frames pushed out of 3-deep FIFO were acked
+                self.__acked(self.next - 3)
+            if st.MAX_RT or st.RX_P_NO != 7:
+                break
+
+        if st is None or not (st.TX_FULL or st.MAX_RT or st.RX_P_NO != 7):
+            # nothing more can be written now
+            st = self.__stalled()
+        self.__handle(st)
+
+    # called when no fragment could be written, returns STATUS
+    def __stalled(self):
+        rf = self.rf
+        st, fifo = rf.R_REGISTER(FIFO_STATUS)
+        if not fifo.TX_EMPTY:
+            return st
+
+        if not self.ack_payload:
+            self.__acked(self.next)
+        elif self.next > self.base:
+            # fetch ACK payload with empty fragment
+            rf.W_TX_PAYLOAD(bytearray([FLAG_POLL, self.next & 0xFF]) +
+                            bytearray((self.size or 2) - 2))
+            self.stat['polls'] += 1
+        return st
+
+    def __handle(self, st):
+        rf = self.rf
+        if st.RX_P_NO != 7:
+            st, data = rf.R_RX_PAYLOAD(1)
+            if self.ack_payload:
+                self.stat['acks'] += 1
+                delta = (data[0] - self.base) & 0xFF
+                if delta <= self.high - self.base:
+                    self.__acked(self.base + delta)
+
+        if st.TX_DS:
+            self.retry = 0
+        if st.MAX_RT:
+            self.stat['max_rt'] += 1
+            self.retry += 1
+            if self.retry > self.retries:
+                raise Exception("ERROR: MAX_RT %d times at seq %d" %
+                                (self.retry, self.base))
+            if self.ack_payload:
+                # go back to oldest fragment not acknowledged
+                rf.FLUSH_TX()
+                self.next = self.base
+            # clearing MAX_RT resumes transmission
+            rf.W_REGISTER(STATUS, TX_DS=1, MAX_RT=1)
+
+    # marks fragments before given seq as acknowledged
+    def __acked(self, seq):
+        while self.base < seq and self.frags:
+            frame, nr, end = self.frags.popleft()
+            self.base += 1
+            self.stat['bytes'] += nr
+            if end:
+                self.stat['messages'] += 1
+            self.retry = 0
+            self.t1 = self.rf.clock()
+
+        # ack may arrive for fragments sent before going back
+        self.next = max(self.next, self.base)
+
+        if not self.frags and self.active:
+            self.rf.CE = 0
+            self.active = False
+
+    def flush(self, timeout=None):
+        """Polls until all messages are acknowledged. Returns stats()."""
+        t0 = self.rf.clock()
+        while self.busy:
+            self.poll()
+            if timeout is not None and self.rf.clock() - t0 >= timeout:
+                raise Exception("ERROR: Timeout with %d fragments unacked" %
+                                len(self.frags))
+        return self.stats()
+
+    def send(self, data, timeout=None):
+        self.write(data)
+        return self.flush(timeout)
+
+    def stats(self):
+        """Returns dict of counters, elapsed time from first write to
+        last acknowledgement ('time') and goodput in bytes/s."""
+        ret = dict(self.stat)
+        ret['time'] = (self.t1 - self.t0) if self.t1 else 0
+        ret['goodput'] = ret['bytes'] / ret['time'] if ret['time'] > 0 else 0
+        return ret
+
+######################################################################
+
+class nRF24Receiver(object):
+    def __init__(self, rf, ack_payload=True, ack_every=8):
+        self.rf = rf
+        self.ack_payload = ack_payload
+        self.ack_every = ack_every
+
+        if ack_payload:
+            enable_ack_payload(rf)
+
+        # pipe config for recv_stream(), so each poll reads no register
+        # (create receiver again if pipes are reconfigured)
+        self.width = rf.rx_widths()
+
+        self.expected = 0
+        self.acked = 0
+        self.partial = None
+        self.messages = deque()
+        self.stat = dict(messages=0, bytes=0, frames=0, dups=0, gaps=0,
+                         dropped=0, acks=0)
+
+    def poll(self):
+        """Reads all fragments in RX FIFO. Returns number of messages
+        ready to read()."""
+        rx = self.rf.recv_stream(timeout=0, min_wait=0, width=self.width)
+        for pipe, data, ts in rx:
+            self.__on_frame(pipe, data)
+        return len(self.messages)
+
+    def read(self):
+        """Returns next received message, or None."""
+        return self.messages.popleft() if self.messages else None
+
+    def recv(self, timeout=None):
+        """Polls until a message is received, or timeout."""
+        rf = self.rf
+        t0 = rf.clock()
+        while not self.poll():
+            if timeout is not None and rf.clock() - t0 >= timeout:
+                return None
+        return self.read()
+
+    def __on_frame(self, pipe, data):
+        flags, seq = data[0], data[1]
+        if flags & FLAG_POLL:
+            return self.__ack(pipe)
+
+        delta = (seq - self.expected) & 0xFF
+        if delta >= 128:
+            # retransmitted fragment already received
+            self.stat['dups'] += 1
+            return self.__ack(pipe)
+        if delta > 0:
+            if self.ack_payload:
+                # go-back-N: wait for sender to resend missing one
+                self.stat['dups'] += 1
+                return self.__ack(pipe)
+            # fragments were lost, so drop partial message
+            self.stat['gaps'] += 1
+            self.expected = seq
+            self.__drop()
+
+        self.expected = (self.expected + 1) & 0xFF
+        self.stat['frames'] += 1
+
+        if flags & FLAG_START:
+            self.__drop()
+            self.partial = bytearray()
+        if self.partial is not None:
+            self.partial += data[HEAD_SIZE:HEAD_SIZE + (flags & LEN_MASK)]
+            if flags & FLAG_END:
+                self.messages.append(bytes(self.partial))
+                self.stat['messages'] += 1
+                self.stat['bytes'] += len(self.partial)
+                self.partial = None
+
+        self.__ack(pipe, force=flags & FLAG_END)
+
+    def __drop(self):
+        if self.partial is not None:
+            self.stat['dropped'] += 1
+            self.partial = None
+
+    # queues cumulative ack in ACK payload for next packet on pipe
+    def __ack(self, pipe, force=True):
+        if not self.ack_payload:
+            return
+        if not force and (self.expected - self.acked) & 0xFF < self.ack_every:
+            return
+
+        rf = self.rf
+        st = rf.W_ACK_PAYLOAD(bytearray([self.expected]), pipe)
+        if st.TX_FULL:
+            # replace stale acks
+            rf.FLUSH_TX()
+            rf.W_ACK_PAYLOAD(bytearray([self.expected]), pipe)
+        self.acked = self.expected
+        self.stat['acks'] += 1
+
+######################################################################
+
+__all__ = ['nRF24Sender', 'nRF24Receiver', 'fragment', 'enable_ack_payload',
+           'DATA_SIZE']
@@ -24,6 +24,7 @@ print foo == 0xA0
 """
 import sys, os
 from bitstring import Bits, BitArray
+from ucdev.common import Value
 
 """
 Convert various typed values into BitArray value.
@@ -37,31 +38,33 @@ def to_bits(val, bitlen):
         return Bits(bytes=val.value.bytes, length=bitlen)
     return Bits(uint=val, length=bitlen)
 
+# {original class: protected subclass} generated by protect_object()
+PROTECTED_CLASSES = {}
+
 """
 Installs filter function to limit access to non-existing attribute.
 
 NOTE:
 This replaces belonging class of passed object to dynamically
-generated subclass of the original class.
+generated subclass of the original class. The subclass is generated
+once per original class and reused.
 """
 def protect_object(obj):
-    sub = type("Protected" + type(obj).__name__, (type(obj),), {})
+    sub = PROTECTED_CLASSES.get(type(obj))
 
-    fset = sub.__setattr__
-    def fset_wrap(self, key, val):
-        if not hasattr(self, key):
-            raise AttributeError("Access denied for key: %s" % key)
-        return fset(self, key, val)
-    sub.__setattr__ = fset_wrap
+    if not sub:
+        sub = type("Protected" + type(obj).__name__, (type(obj),), {})
 
-    obj.__class__ = sub
+        fset = sub.__setattr__
+        def fset_wrap(self, key, val):
+            if not hasattr(self, key):
+                raise AttributeError("Access denied for key: %s" % key)
+            return fset(self, key, val)
+        sub.__setattr__ = fset_wrap
 
-"""
-Generic class to wrap built-in types with custom attributes.
-"""
-class Value(object):
-    def __new__(cls, arg, **kw):
-        return type(cls.__name__, (type(arg), cls, ), kw)(arg)
+        PROTECTED_CLASSES[type(obj)] = sub
+
+    obj.__class__ = sub
 
 class Field(Bits):
     # NOTE:
@@ -83,6 +86,9 @@ class Field(Bits):
         return self.__bitlen
 
 class Register(int):
+    # generated classes, keyed on register layout
+    __cache = {}
+
     def __new__(cls, desc, address):
         r_fields = []
         r_bitlen = 0
@@ -99,6 +105,14 @@ class Register(int):
             r_fields.append((f_name, f_bitlen))
             r_bitlen += f_bitlen
 
+        # reuse class generated for the same layout
+        key = (cls, tuple(r_fields))
+        sub = cls.__cache.get(key)
+        if sub:
+            obj = int.__new__(sub, address)
+            protect_object(obj)
+            return obj
+
         # returns bitmask implemented as readonly property
         def makeprop(r_bitlen, f_bitlen, f_offset):
             value = ((1 << f_bitlen) - 1) << f_offset
@@ -119,6 +133,7 @@ class Register(int):
         sub = type(cls.__name__, (cls, ), kw)
         sub.__fields = [k for k,v in r_fields if k]
         sub.__length = r_bitlen
+        cls.__cache[key] = sub
 
         obj = int.__new__(sub, address)
         protect_object(obj)
@@ -144,10 +159,27 @@ class Register(int):
         return reg
 
 class RegisterValue(object):
+    # generated classes, keyed on register class
+    __cache = {}
+
     def __new__(cls, reg, value):
         if cls is not RegisterValue:
             return object.__new__(cls)
 
+        sub = cls.__cache.get(type(reg))
+        if not sub:
+            sub = cls.__cache[type(reg)] = cls.create(reg)
+
+        obj = sub(reg, value)
+        obj.__reg = reg
+        obj.__mon = {}
+        obj.value = value
+
+        protect_object(obj)
+        return obj
+
+    @classmethod
+    def create(cls, reg):
         def makeprop(field):
             def fget(self):
                 fval = (self.__value & field) >> field.offset
@@ -165,13 +197,7 @@ class RegisterValue(object):
             field = getattr(reg, f_name)
             kw[f_name] = makeprop(field)
 
-        obj = type(cls.__name__, (cls, ), kw)(reg, value)
-        obj.__reg = reg
-        obj.__mon = {}
-        obj.value = value
-
-        protect_object(obj)
-        return obj
+        return type(cls.__name__, (cls, ), kw)
 
     @property
     def length(self):
@@ -13,12 +13,12 @@ sequence to enter I2C mode. So this driver is not well tested.
 """
 
 from struct import pack, unpack
-from ucdev.register import Value, Register
+from ucdev.common import Value, RegisterDevice
+from ucdev.intregister import Register
 
 import logging
 log = logging.getLogger(__name__)
 
-from IPython import embed
 
 ######################################################################
 # Si4702 registers
@@ -48,7 +48,7 @@ RDSD       = Register("RDSD:16", 0x0F)
 
 ######################################################################
 
-class SI4702(object):
+class SI4702(RegisterDevice):
     def __init__(self, i2c, address=0b0010000):
         self.i2c = i2c
 
@@ -96,7 +96,7 @@ class SI4702(object):
 
     def set_reg(self, reg, *arg, **kw):
         # update shadow buffer
-        newval = reg(*arg, **kw).value.uint
+        newval = reg(*arg, **kw).uint
 
         self.sreg = self.get_all_regs()
         self.sreg[reg] = newval
@@ -122,16 +122,27 @@ class SI4702(object):
             # do a full writeback to 02h - 09h
             return self.write(pack('>8H', *self.sreg[0x2:(0x9 + 1)]))
 
+    def flush_batch(self, items):
+        # every write covers 02h and up, so merge all into single write
+        self.sreg = self.get_all_regs()
+        for reg, val in items:
+            self.sreg[reg] = val
+
+        if all(reg == 0x2 for reg, val in items):
+            return self.write(pack('>H', self.sreg[0x2]))
+        else:
+            return self.write(pack('>8H', *self.sreg[0x2:(0x9 + 1)]))
+
 def add_register(cls):
     def makeprop(reg):
         def fget(self):
-            tmp = self.get_reg(reg)
+            tmp = self.load_reg(reg)
             def update_hook(v):
-                self.set_reg(reg, v)
+                self.store_reg(reg, v)
             tmp.subscribe(update_hook)
             return tmp
         def fset(self, v):
-            self.set_reg(reg, v)
+            self.store_reg(reg, v)
         return property(fget, fset)
 
     for name, reg in globals().items():
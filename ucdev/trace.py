@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8-unix -*-
+
+"""
+Transfer tracing into a fixed-size binary ring buffer.
+
+Tracing is disabled by default, and costs a single attribute check per
+transfer in that case. To enable, attach a Tracer to the device:
+
+  dev = next(CyUSBSerial().find())
+  dev.trace = Tracer(slots=4096, snaplen=32)
+  ...
+  dev.trace.dump("spi.trace")
+
+Each transfer is recorded as a fixed-size binary record of timestamp,
+duration, bus, direction, I2C slave address, return code, length and
+up to snaplen bytes of data. Nothing is formatted while recording, and
+once the buffer is full, oldest records are overwritten.
+
+Dumped file can be decoded offline with
+
+  $ python -m ucdev.trace spi.trace
+
+"""
+
+import sys, os
+import time
+import struct
+import binascii
+
+import logging
+log = logging.getLogger(__name__)
+
+BUS_SPI = 1
+BUS_I2C = 2
+
+DIR_WRITE = 1
+DIR_READ  = 2
+
+BUS_NAMES = {BUS_SPI: "SPI", BUS_I2C: "I2C"}
+DIR_NAMES = {DIR_WRITE: "W", DIR_READ: "R"}
+
+# file header: magic, version, snaplen, number of records, dropped records
+FILE_HEAD = struct.Struct("<4sHHII")
+FILE_MAGIC = b"UCTR"
+FILE_VERSION = 1
+
+# record header: timestamp, duration, bus, dir, addr, rc, length, captured length
+REC_HEAD = struct.Struct("<dfBBBxiHH")
+
+class Tracer(object):
+    # clock used for timestamp and duration
+    clock = staticmethod(time.time)
+
+    def __init__(self, slots=4096, snaplen=32):
+        self.slots = slots
+        self.snaplen = snaplen
+        self.recsize = REC_HEAD.size + snaplen
+        self.buf = bytearray(slots * self.recsize)
+        self.pos = 0
+        self.count = 0
+
+    def record(self, bus, dir, addr, data, rc, t0, t1):
+        """Records one transfer. data can be any buffer object."""
+        nr = len(data)
+        cap = min(nr, self.snaplen)
+
+        off = self.pos * self.recsize
+        REC_HEAD.pack_into(self.buf, off, t0, t1 - t0, bus, dir, addr, rc, nr, cap)
+        off += REC_HEAD.size
+        self.buf[off:off + cap] = data[:cap]
+
+        self.pos = (self.pos + 1) % self.slots
+        self.count += 1
+
+    def clear(self):
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.slots)
+
+    # tracer stays enabled even when empty
+    def __nonzero__(self):
+        return True
+
+    __bool__ = __nonzero__
+
+    def raw_records(self):
+        """Returns raw records in chronological order."""
+        nr = len(self)
+        start = (self.pos - nr) % self.slots
+        for i in range(nr):
+            off = ((start + i) % self.slots) * self.recsize
+            yield self.buf[off:off + self.recsize]
+
+    def records(self):
+        """Returns decoded records in chronological order."""
+        for rec in self.raw_records():
+            yield decode_record(rec)
+
+    def dump(self, file):
+        """Writes records to given path or file object."""
+        if not hasattr(file, 'write'):
+            with open(file, "wb") as f:
+                return self.dump(f)
+
+        nr = len(self)
+        file.write(FILE_HEAD.pack(FILE_MAGIC, FILE_VERSION, self.snaplen,
+                                  nr, self.count - nr))
+        for rec in self.raw_records():
+            file.write(rec)
+        return nr
+
+"""
+Decodes raw record into tuple of
+(timestamp, duration, bus, dir, addr, rc, length, data).
+"""
+def decode_record(rec):
+    ts, dt, bus, dir, addr, rc, nr, cap = REC_HEAD.unpack_from(rec)
+    data = bytes(rec[REC_HEAD.size:REC_HEAD.size + cap])
+    return ts, dt, bus, dir, addr, rc, nr, data
+
+"""
+Reads records from file dumped by Tracer.dump().
+"""
+def load(file):
+    if not hasattr(file, 'read'):
+        with open(file, "rb") as f:
+            for rec in load(f):
+                yield rec
+        return
+
+    head = file.read(FILE_HEAD.size)
+    magic, version, snaplen, nr, dropped = FILE_HEAD.unpack(head)
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise Exception("ERROR: Not a trace file (version %d)" % FILE_VERSION)
+    if dropped:
+        log.warning("%d records were overwritten before dump", dropped)
+
+    recsize = REC_HEAD.size + snaplen
+    for i in range(nr):
+        yield decode_record(bytearray(file.read(recsize)))
+
+def format_record(rec):
+    ts, dt, bus, dir, addr, rc, nr, data = rec
+    hexdata = binascii.hexlify(data).decode()
+    return "{0:.6f} {1:9.1f}us {2} {3} 0x{4:02x} rc={5} len={6}: {7}{8}".format(
+        ts, dt * 1e6, BUS_NAMES.get(bus, bus), DIR_NAMES.get(dir, dir),
+        addr, rc, nr, " ".join(hexdata[i:i+2] for i in range(0, len(hexdata), 2)),
+        " ..." if nr > len(data) else "")
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    for path in sys.argv[1:]:
+        for rec in load(path):
+            print(format_record(rec))